@@ -221,87 +221,60 @@ class _ConfirmOrderPayPageState extends State<ConfirmOrderPayPage> {
       print('💵 Amount: $paymentAmount (Order: $totalAmount + Tip: $tipAmount)');
       print('💬 Message: ${_messageController.text}');
 
-      // Step 1: Process the payment
+      // Pay and mark the order paid in a single request (safe to retry)
       final paymentResponse = await http.post(
-        Uri.parse('$baseUrl/process-payment/'),
+        Uri.parse('$baseUrl/pay-order/'),
         headers: {'Content-Type': 'application/json'},
         body: json.encode({
+          'order_id': orderId,
           'sender_paycode': senderPaycode,
-          'receiver_paycode': merchantPaycode,
           'pin': _pinController.text,
-          'amount': paymentAmount.toString(), // Ensure string for JSON
+          'tip_amount': tipAmount.toString(),
+          'message': _messageController.text.trim(),
         }),
       ).timeout(const Duration(seconds: 30));
 
       print('📡 Payment response status: ${paymentResponse.statusCode}');
       print('📄 Payment response body: ${paymentResponse.body}');
 
-      if (paymentResponse.statusCode == 200) {
-        final paymentData = json.decode(paymentResponse.body);
-
-        if (paymentData['success'] == true) {
-          final transactionId = paymentData['transaction_id'];
-          final charge = _parseAmount(paymentData['charge'] ?? 20.0);
-          final total = paymentAmount + charge;
-          final senderBalance = _parseAmount(paymentData['sender_balance'] ?? 0);
-          final receiverName = merchantName;
-          final receiverType = 'merchant';
-
-          print('✅ Payment successful! Transaction ID: $transactionId');
-
-          // Step 2: Mark order as paid
-          final markPaidResponse = await http.post(
-            Uri.parse('$baseUrl/mark-order-paid/'),
-            headers: {'Content-Type': 'application/json'},
-            body: json.encode({
-              'order_id': orderId,
-              'transaction_id': transactionId?.toString() ?? '',
-              'tip_amount': tipAmount.toString(),
-              'message': _messageController.text.trim(),
-            }),
-          );
-
-          print('📡 Mark paid response: ${markPaidResponse.statusCode}');
-          print('📄 Mark paid body: ${markPaidResponse.body}');
-
-          if (markPaidResponse.statusCode == 200) {
-            final markPaidData = json.decode(markPaidResponse.body);
-
-            if (markPaidData['success'] == true) {
-              print('✅ Order marked as paid');
-
-              // Update local user balance
-              updateLocalUserBalance(senderBalance);
-
-              // Navigate to success page
-              Navigator.pushReplacement(
-                context,
-                MaterialPageRoute(
-                  builder: (_) => TransactionResultPage(
-                    receiverName: receiverName,
-                    receiverType: receiverType,
-                    amount: paymentAmount,
-                    charge: charge,
-                    total: total,
-                    balance: senderBalance,
-                    transactionId: transactionId ?? 0,
-                    senderType: userType,
-                    date: DateTime.now(),
-                  ),
-                ),
-              );
-            } else {
-              _showError(markPaidData['error']?.toString() ?? 'Failed to mark order as paid');
-            }
-          } else {
-            _showError('Failed to update order status: ${markPaidResponse.statusCode}');
-          }
-        } else {
-          final errorMsg = paymentData['error']?.toString() ?? 'Payment failed';
-          _showError(errorMsg);
+      final paymentData = json.decode(paymentResponse.body);
+
+      if (paymentResponse.statusCode == 200 && paymentData['success'] == true) {
+        final transactionId = paymentData['transaction_id'];
+        final charge = _parseAmount(paymentData['charge'] ?? 20.0);
+        final total = paymentAmount + charge;
+        final receiverName = merchantName;
+        final receiverType = 'merchant';
+
+        print('✅ Order paid! Transaction ID: $transactionId');
+
+        // A retried request finds the order already paid and returns no balance
+        double senderBalance = 0;
+        if (paymentData['sender_balance'] != null) {
+          senderBalance = _parseAmount(paymentData['sender_balance']);
+          updateLocalUserBalance(senderBalance);
         }
+
+        // Navigate to success page
+        Navigator.pushReplacement(
+          context,
+          MaterialPageRoute(
+            builder: (_) => TransactionResultPage(
+              receiverName: receiverName,
+              receiverType: receiverType,
+              amount: paymentAmount,
+              charge: charge,
+              total: total,
+              balance: senderBalance,
+              transactionId: transactionId ?? 0,
+              senderType: userType,
+              date: DateTime.now(),
+            ),
+          ),
+        );
       } else {
-        _showError('Payment failed with status ${paymentResponse.statusCode}');
+        final errorMsg = paymentData['error']?.toString() ?? 'Payment failed with status ${paymentResponse.statusCode}';
+        _showError(errorMsg);
       }
     } on http.ClientException catch (e) {
       _showError('Network error. Please check your connection.');
@@ -76,25 +76,38 @@ class _HomePageState extends State<HomePage> {
       final email = user['email'] as String;
       print('💰 Loading spending data for: $email');
 
-      // Get user transactions
-      final uri = Uri.parse("http://localhost:8000/api/get-user-transactions/")
-          .replace(queryParameters: {
-        'email': email,
-      });
+      // Every transaction since local midnight 4 days ago. The bound is sent
+      // as a UTC instant and pages are followed until next_cursor runs out,
+      // so busy accounts still get complete totals.
+      final now = DateTime.now();
+      final since = DateTime(now.year, now.month, now.day - 4).toUtc().toIso8601String();
+      final List<dynamic> transactions = [];
+      String? cursor;
+      http.Response response;
+      do {
+        final uri = Uri.parse("http://localhost:8000/api/get-user-transactions/")
+            .replace(queryParameters: {
+          'email': email,
+          'since': since,
+          'limit': '200',
+          if (cursor != null) 'cursor': cursor,
+        });
 
-      final response = await http.get(
-        uri,
-        headers: {"Content-Type": "application/json"},
-      ).timeout(const Duration(seconds: 10));
+        response = await http.get(
+          uri,
+          headers: {"Content-Type": "application/json"},
+        ).timeout(const Duration(seconds: 10));
+        if (response.statusCode != 200) break;
 
-      if (response.statusCode == 200) {
         final data = jsonDecode(response.body);
-        final List<dynamic> transactions = data['transactions'] ?? [];
+        transactions.addAll(data['transactions'] ?? []);
+        cursor = data['next_cursor'];
+      } while (cursor != null);
 
+      if (response.statusCode == 200) {
         print('📊 Found ${transactions.length} transactions for spending analysis');
 
         // Process transactions for last 5 days
-        final now = DateTime.now();
         final Map<String, double> dayAmounts = {};
 
         // Initialize last 5 days with 0 amounts
@@ -116,7 +129,8 @@ class _HomePageState extends State<HomePage> {
                 if (dateStr.contains(' ')) {
                   // Format: "01 January 2024 14:30"
                   try {
-                    transDate = DateFormat('dd MMMM yyyy HH:mm').parse(dateStr);
+                    // The server formats dates in UTC
+                    transDate = DateFormat('dd MMMM yyyy HH:mm').parse(dateStr, true).toLocal();
                   } catch (e) {
                     transDate = DateTime.tryParse(dateStr);
                   }
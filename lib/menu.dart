@@ -173,6 +173,14 @@ class _MenuPageState extends State<MenuPage> {
             ),
           ),
         );
+      } else if (result['out_of_stock'] == true) {
+        ScaffoldMessenger.of(context).showSnackBar(
+          SnackBar(
+            content: Text('${result['error']}. Please adjust your order.'),
+            backgroundColor: Colors.orange,
+            duration: const Duration(seconds: 5),
+          ),
+        );
       } else {
         ScaffoldMessenger.of(context).showSnackBar(
           SnackBar(
@@ -236,6 +244,14 @@ class _MenuPageState extends State<MenuPage> {
       if (response.statusCode == 201) {
         final data = jsonDecode(response.body);
         return {'success': true, 'order_id': data['order_id']};
+      } else if (response.statusCode == 409) {
+        // Not enough stock: nothing was ordered, the server names what is short
+        final error = jsonDecode(response.body);
+        return {
+          'success': false,
+          'out_of_stock': true,
+          'error': error['error'] ?? 'Some items are out of stock',
+        };
       } else {
         final error = jsonDecode(response.body);
         return {'success': false, 'error': error['error'] ?? 'Unknown error'};
@@ -256,21 +256,36 @@ class _MerchantHomePageState extends State<MerchantHomePage> {
 
       print('💰 Loading transactions for merchant: $merchantId, email: $email');
 
-      // Get transactions for this merchant
-      final uri = Uri.parse("http://localhost:8000/api/get-user-transactions/")
-          .replace(queryParameters: {
-        'email': email, // Use email to get transactions
-      });
+      // All of today's transactions for this merchant. "Today" is the local
+      // day, sent as UTC instants; pages are followed until next_cursor runs out.
+      final now = DateTime.now();
+      final since = DateTime(now.year, now.month, now.day).toUtc().toIso8601String();
+      final until = DateTime(now.year, now.month, now.day + 1).toUtc().toIso8601String();
+      final List<dynamic> transactions = [];
+      String? cursor;
+      http.Response response;
+      do {
+        final uri = Uri.parse("http://localhost:8000/api/get-user-transactions/")
+            .replace(queryParameters: {
+          'email': email, // Use email to get transactions
+          'since': since,
+          'until': until,
+          'limit': '200',
+          if (cursor != null) 'cursor': cursor,
+        });
 
-      final response = await http.get(
-        uri,
-        headers: {"Content-Type": "application/json"},
-      ).timeout(const Duration(seconds: 10));
+        response = await http.get(
+          uri,
+          headers: {"Content-Type": "application/json"},
+        ).timeout(const Duration(seconds: 10));
+        if (response.statusCode != 200) break;
 
-      if (response.statusCode == 200) {
         final data = jsonDecode(response.body);
-        final transactions = data['transactions'] ?? [];
+        transactions.addAll(data['transactions'] ?? []);
+        cursor = data['next_cursor'];
+      } while (cursor != null);
 
+      if (response.statusCode == 200) {
         print('📊 Found ${transactions.length} total transactions');
 
         // Filter for today's transactions
@@ -288,7 +303,8 @@ class _MerchantHomePageState extends State<MerchantHomePage> {
                   // Format: "01 January 2024 14:30"
                   final parts = dateStr.split(' ');
                   if (parts.length >= 3) {
-                    transDate = DateFormat('dd MMMM yyyy HH:mm').parse(dateStr);
+                    // The server formats dates in UTC
+                    transDate = DateFormat('dd MMMM yyyy HH:mm').parse(dateStr, true).toLocal();
                   }
                 } else {
                   // Try ISO format
@@ -147,9 +147,9 @@ class _PayPageState extends State<PayPage> {
           .replaceAll('l', '1');
 
       // Check if paycode matches expected format for both users and merchants
-      // User: UP followed by 6 digits (UP123456)
+      // User: UP followed by 6 digits (UP123456) or, for newer accounts, 8 digits (UP12345678)
       // Merchant: MP followed by any alphanumeric characters (MP001, MP20259796, MP20255276, etc.)
-      bool isValidUserCode = RegExp(r'^UP\d{6}$').hasMatch(searchPayCode);
+      bool isValidUserCode = RegExp(r'^UP(\d{6}|\d{8})$').hasMatch(searchPayCode);
       bool isValidMerchantCode = RegExp(r'^MP[0-9A-Z]+$').hasMatch(searchPayCode);
 
       if (!isValidUserCode && !isValidMerchantCode) {
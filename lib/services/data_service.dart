@@ -756,10 +756,29 @@ Future<Map<String, dynamic>> getUserTransactions({
   String? year,
   String? month,
   String? day,
+  int? limit,
+  String? cursor,
+  DateTime? since,
+  DateTime? until,
 }) async {
   try {
     String url = '$baseUrl/get-user-transactions/?email=$email';
 
+    // With a limit the server returns one page plus next_cursor
+    if (limit != null) {
+      url += '&limit=$limit';
+    }
+    if (cursor != null) {
+      url += '&cursor=${Uri.encodeQueryComponent(cursor)}';
+    }
+    // Time bounds go out as UTC instants, so local days map to the right rows
+    if (since != null) {
+      url += '&since=${Uri.encodeQueryComponent(since.toUtc().toIso8601String())}';
+    }
+    if (until != null) {
+      url += '&until=${Uri.encodeQueryComponent(until.toUtc().toIso8601String())}';
+    }
+
     if (year != null) {
       url += '&year=$year';
     }
@@ -0,0 +1,191 @@
+import csv
+import json
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+from django.utils.dateparse import parse_date
+
+from . import paycodes
+from .models import User, Merchant
+
+# Rows validated, given paycodes and inserted per transaction
+DEFAULT_CHUNK_SIZE = 1000
+
+# Columns every row needs, whatever the account type
+REQUIRED_FIELDS = ('national_id', 'email', 'username', 'phone', 'password')
+
+# UNIQUE columns of the user and merchant tables: import column -> model field
+UNIQUE_FIELDS = {'national_id': 'nationalid', 'email': 'email', 'username': 'username', 'phone': 'phonenumber'}
+
+MODELS = {'user': User, 'merchant': Merchant}
+
+
+def read_rows(stream, fmt='csv'):
+    """
+    Yield (line_number, row dict) from a text stream of CSV (with header) or
+    NDJSON. An NDJSON line that isn't a JSON object yields a None row.
+    """
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, {key.strip(): (value or '').strip() for key, value in row.items() if key}
+    elif fmt == 'ndjson':
+        for line_number, line in enumerate(stream, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                yield line_number, None
+                continue
+            if not isinstance(row, dict):
+                yield line_number, None
+                continue
+            yield line_number, {key: str(value).strip() if value is not None else '' for key, value in row.items()}
+    else:
+        raise ValueError(f"Unsupported format: {fmt}")
+
+
+def _build_account(account_type, row):
+    """Unsaved User/Merchant from an import row, or raise ValueError with the reason"""
+    missing = [field for field in REQUIRED_FIELDS if not row.get(field)]
+    if missing:
+        raise ValueError(f"Missing fields: {', '.join(missing)}")
+
+    try:
+        balance = Decimal(row.get('balance') or '5000.00')
+    except InvalidOperation:
+        raise ValueError("Invalid balance")
+
+    pin = row.get('pin') or '123456'
+    if not pin.isdigit() or len(pin) > 6:
+        raise ValueError("PIN must be up to 6 digits")
+
+    date_value = row.get('date_of_birth') if account_type == 'user' else row.get('date_of_creation')
+    date = parse_date(date_value) if date_value else None
+    if date_value and date is None:
+        raise ValueError("Invalid date, expected YYYY-MM-DD")
+
+    fields = {
+        'nationalid': row['national_id'],
+        'email': row['email'],
+        'username': row['username'],
+        'phonenumber': row['phone'],
+        'password': row['password'],
+        'balance': balance,
+        'pin': pin,
+    }
+    if account_type == 'user':
+        fields.update(accounttype='normal', dateofbirth=date)
+    else:
+        fields.update(accounttype='merchant', dateofcreation=date, businesstype=row.get('business_type', ''))
+    return MODELS[account_type](**fields)
+
+
+class AccountImporter:
+    """
+    Streams rows into User/Merchant tables in chunks. Each chunk is checked
+    for duplicates (in the file and in the database) with one IN query per
+    unique column, gets its paycodes in one allocation and is written with a
+    single bulk_create inside a transaction. Rows that fail are reported by
+    line number and skipped, the rest of the chunk still goes in.
+    """
+
+    def __init__(self, default_type=None, chunk_size=DEFAULT_CHUNK_SIZE, dry_run=False):
+        self.default_type = default_type
+        self.chunk_size = chunk_size
+        self.dry_run = dry_run
+        self.created = {'user': 0, 'merchant': 0}
+        self.errors = []
+        # Unique values already seen in this file, per account type
+        self.seen = {account_type: {column: set() for column in UNIQUE_FIELDS} for account_type in MODELS}
+
+    def run(self, rows):
+        chunk = []
+        for line_number, row in rows:
+            chunk.append((line_number, row))
+            if len(chunk) == self.chunk_size:
+                self._import_chunk(chunk)
+                chunk = []
+        if chunk:
+            self._import_chunk(chunk)
+        return self.report()
+
+    def report(self):
+        return {
+            'created_users': self.created['user'],
+            'created_merchants': self.created['merchant'],
+            'failed': len(self.errors),
+            'errors': self.errors,
+            'dry_run': self.dry_run,
+        }
+
+    def _error(self, line_number, message):
+        self.errors.append({'line': line_number, 'error': message})
+
+    def _import_chunk(self, chunk):
+        by_type = {'user': [], 'merchant': []}
+        for line_number, row in chunk:
+            if row is None:
+                self._error(line_number, "Invalid JSON, expected one object per line")
+                continue
+            account_type = row.get('type') or self.default_type
+            if account_type not in MODELS:
+                self._error(line_number, "type must be 'user' or 'merchant'")
+                continue
+            try:
+                account = _build_account(account_type, row)
+            except ValueError as e:
+                self._error(line_number, str(e))
+                continue
+            by_type[account_type].append((line_number, row, account))
+
+        for account_type, accounts in by_type.items():
+            accounts = self._drop_duplicates(account_type, accounts)
+            if accounts and not self.dry_run:
+                self._insert(account_type, accounts)
+            elif accounts:
+                self.created[account_type] += len(accounts)
+
+    def _drop_duplicates(self, account_type, accounts):
+        """Remove rows clashing with earlier rows or existing accounts"""
+        model = MODELS[account_type]
+        seen = self.seen[account_type]
+
+        existing = {}
+        for column, field in UNIQUE_FIELDS.items():
+            values = {row[column] for _, row, _ in accounts}
+            existing[column] = set(
+                model.objects.filter(**{f'{field}__in': values}).values_list(field, flat=True)
+            )
+
+        kept = []
+        for line_number, row, account in accounts:
+            clashes = [column for column in UNIQUE_FIELDS
+                       if row[column] in existing[column] or row[column] in seen[column]]
+            if clashes:
+                self._error(line_number, f"Already taken: {', '.join(clashes)}")
+                continue
+            for column in UNIQUE_FIELDS:
+                seen[column].add(row[column])
+            kept.append((line_number, row, account))
+        return kept
+
+    def _insert(self, account_type, accounts):
+        allocator = paycodes.ALLOCATORS[account_type]
+        for (_, _, account), code in zip(accounts, allocator.allocate_many(len(accounts))):
+            setattr(account, allocator.field, code)
+
+        try:
+            with transaction.atomic():
+                MODELS[account_type].objects.bulk_create([account for _, _, account in accounts])
+            self.created[account_type] += len(accounts)
+        except IntegrityError:
+            # Something changed under us (a concurrent registration): go row by row to find it
+            for line_number, _, account in accounts:
+                try:
+                    with transaction.atomic():
+                        account.save(force_insert=True)
+                    self.created[account_type] += 1
+                except IntegrityError as e:
+                    self._error(line_number, f"Database rejected row: {e}")
@@ -0,0 +1,114 @@
+import re
+
+from . import paycodes
+from .models import User, Merchant, Order, Transaction, Product, ExtraMenu, Menu
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+# A complete paycode (UP12345678, MP2025123456); "upton" is a username
+PAYCODE_PATTERN = re.compile(rf'^({paycodes.USER_PAYCODE_PREFIX}|{paycodes.MERCHANT_PAYCODE_PREFIX})\d+$')
+
+
+class AdminTable:
+    """
+    How one entity is listed: its columns, the columns `q` can prefix-search
+    (each backed by an index, so a search is a single index range scan) and
+    the columns that can be filtered on exactly.
+    """
+
+    def __init__(self, model, pk, columns, search=(), filters=()):
+        self.model = model
+        self.pk = pk
+        self.columns = columns
+        self.search = search
+        self.filters = filters
+
+    def guess_search_field(self, query):
+        """Pick the column a query most likely targets, from what it looks like"""
+        paycode_field = next((field for field in self.search if field.endswith('paycode')), None)
+        if paycode_field and PAYCODE_PATTERN.match(query.upper()):
+            return paycode_field
+        if '@' in query and 'email' in self.search:
+            return 'email'
+        if query.lstrip('+').isdigit() and 'phonenumber' in self.search:
+            return 'phonenumber'
+        return self.search[0]
+
+
+ADMIN_TABLES = {
+    'users': AdminTable(
+        User, 'userid',
+        ('userid', 'username', 'email', 'phonenumber', 'balance', 'paycode', 'accounttype', 'dateofbirth'),
+        search=('username', 'paycode', 'email', 'phonenumber'),
+        filters=('accounttype',),
+    ),
+    'merchants': AdminTable(
+        Merchant, 'merchantid',
+        ('merchantid', 'username', 'email', 'phonenumber', 'businesstype', 'balance', 'merchantpaycode', 'dateofcreation'),
+        search=('username', 'merchantpaycode', 'email', 'phonenumber'),
+        filters=('businesstype',),
+    ),
+    'orders': AdminTable(
+        Order, 'orderid',
+        ('orderid', 'order_number', 'customer_id', 'customer_type', 'customer_name', 'merchant_id', 'merchant_name',
+         'table_name', 'total_amount', 'status', 'is_paid', 'tip_amount', 'created_at', 'updated_at'),
+        search=('customer_name', 'order_number'),
+        filters=('status', 'is_paid', 'merchant_id', 'customer_id', 'customer_type'),
+    ),
+    'transactions': AdminTable(
+        Transaction, 'transactionid',
+        ('transactionid', 'date', 'transfertype', 'senderid', 'sender_type', 'receiverid', 'receiver_type',
+         'amount', 'charge', 'status'),
+        filters=('transactionid', 'sender_type', 'senderid', 'receiver_type', 'receiverid', 'status', 'transfertype'),
+    ),
+    'products': AdminTable(
+        Product, 'productid',
+        ('productid', 'productname', 'merchantid', 'price', 'amountinstock', 'category', 'productpicture'),
+        search=('productname',),
+        filters=('merchantid', 'category'),
+    ),
+    'services': AdminTable(ExtraMenu, 'id', ('id', 'merchantid', 'fieldname'), filters=('merchantid',)),
+    'menus': AdminTable(Menu, 'menuid', ('menuid', 'merchantid', 'productid', 'availability'),
+                        filters=('merchantid', 'productid', 'availability')),
+}
+
+
+def page(entity, before=None, page_size=DEFAULT_PAGE_SIZE, query=None, search_field=None, filters=None):
+    """
+    One page of an admin table, newest first, keyset-paginated on the
+    primary key: pass the returned `next_before` to get the next page.
+    `query` is a case-insensitive prefix match on `search_field` (guessed
+    from the query when not given); `filters` are exact column matches,
+    names that aren't filterable columns are ignored.
+    Raises KeyError for unknown entities and ValueError for bad arguments.
+    """
+    table = ADMIN_TABLES[entity]
+    page_size = max(1, min(page_size, MAX_PAGE_SIZE))
+
+    rows = table.model.objects.order_by(f'-{table.pk}')
+    for field, value in (filters or {}).items():
+        if field not in table.filters:
+            continue
+        if field in ('is_paid', 'availability'):
+            value = str(value).lower() in ('1', 'true', 'yes')
+        rows = rows.filter(**{field: value})
+
+    if query:
+        if not table.search:
+            raise ValueError(f"{entity} cannot be searched, use filters")
+        search_field = search_field or table.guess_search_field(query)
+        if search_field not in table.search:
+            raise ValueError(f"Cannot search {entity} on {search_field}")
+        rows = rows.filter(**{f'{search_field}__istartswith': query})
+
+    if before is not None:
+        rows = rows.filter(**{f'{table.pk}__lt': before})
+    rows = list(rows.values(*table.columns)[:page_size + 1])
+
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
+    return {
+        'results': rows,
+        'next_before': rows[-1][table.pk] if has_more else None,
+        'search_field': search_field if query else None,
+    }
@@ -0,0 +1,94 @@
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.utils import timezone
+
+from . import stats
+from .models import User, Merchant, Order, Transaction, Product, Notification
+
+SNAPSHOT_KEY = 'dashboard:snapshot'
+DEFAULT_INTERVAL = 60
+# Rows of each table shown on the dashboard before the admin pages through it
+RECENT_ROWS = 10
+
+_refresh_lock = threading.Lock()
+_refreshing = False
+
+
+def interval():
+    """Seconds a snapshot is served before it gets refreshed"""
+    return getattr(settings, 'DASHBOARD_SNAPSHOT_INTERVAL', DEFAULT_INTERVAL)
+
+
+def build():
+    """
+    Everything the admin dashboard shows, as plain data. Costs a fixed
+    number of queries: counts and rollup reads from api.stats plus the
+    newest RECENT_ROWS rows of each table.
+    """
+    today = timezone.localdate()
+    snapshot = {}
+    snapshot.update(stats.totals())
+    snapshot.update(stats.activity(today))
+    snapshot.update({
+        'today': today,
+        'daily_revenue': stats.daily_revenue(7, today),
+        'user_growth': stats.user_growth(7, today),
+        'top_merchants': stats.top_merchants(10),
+        'order_status_counts': stats.order_status_counts(),
+        'recent_users': list(User.objects.order_by('-userid').values(
+            'userid', 'username', 'email', 'phonenumber', 'balance', 'paycode', 'dateofbirth')[:RECENT_ROWS]),
+        'recent_merchants': list(Merchant.objects.order_by('-merchantid').values(
+            'merchantid', 'username', 'email', 'businesstype', 'balance', 'merchantpaycode', 'dateofcreation')[:RECENT_ROWS]),
+        'recent_orders': list(Order.objects.order_by('-orderid').values(
+            'orderid', 'order_number', 'customer_name', 'merchant_name', 'total_amount', 'status', 'is_paid', 'created_at')[:RECENT_ROWS]),
+        'recent_transactions': list(Transaction.objects.order_by('-transactionid').values(
+            'transactionid', 'date', 'transfertype', 'senderid', 'sender_type', 'receiverid', 'receiver_type', 'amount', 'status')[:RECENT_ROWS]),
+        'recent_products': list(Product.objects.order_by('-productid').values(
+            'productid', 'productname', 'merchantid', 'price', 'amountinstock', 'category')[:RECENT_ROWS]),
+        'system_notifications': list(Notification.objects.order_by('-notificationid').values(
+            'notificationid', 'title', 'content', 'urgency', 'designated_to', 'date')[:20]),
+        'generated_at': time.time(),
+    })
+    return snapshot
+
+
+def refresh():
+    """Build a new snapshot and store it; used by the background thread and the command"""
+    snapshot = build()
+    # Kept well past its interval so a slow refresh never leaves the dashboard empty
+    cache.set(SNAPSHOT_KEY, snapshot, interval() * 10)
+    return snapshot
+
+
+def _refresh_in_background():
+    global _refreshing
+    try:
+        refresh()
+    except Exception as e:
+        print(f"⚠️ Dashboard snapshot refresh failed: {e}")
+    finally:
+        _refreshing = False
+        connection.close()
+
+
+def get():
+    """
+    The current dashboard snapshot. Only the very first request (or one
+    after the cache was cleared) builds it inline; a stale snapshot is
+    served as is while a background thread builds the next one.
+    """
+    global _refreshing
+    snapshot = cache.get(SNAPSHOT_KEY)
+    if snapshot is None:
+        return refresh()
+
+    if time.time() - snapshot['generated_at'] > interval():
+        with _refresh_lock:
+            if not _refreshing:
+                _refreshing = True
+                threading.Thread(target=_refresh_in_background, daemon=True).start()
+    return snapshot
@@ -0,0 +1,137 @@
+import functools
+import hashlib
+import json
+import random
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.response import Response
+
+from .models import IdempotencyKey
+
+# How long a stored response is replayed for
+DEFAULT_TTL = timedelta(hours=24)
+# How long a request may hold a key without finishing before it's considered dead;
+# keep it above the worker timeout so a slow request is never run twice
+DEFAULT_CLAIM_LEASE = timedelta(minutes=2)
+# Claim attempts when the key keeps disappearing between our insert and our read
+CLAIM_ATTEMPTS = 3
+# Roughly one request in PURGE_EVERY also deletes a batch of expired keys
+PURGE_EVERY = 100
+PURGE_BATCH = 1000
+
+
+def _ttl():
+    return getattr(settings, 'IDEMPOTENCY_KEY_TTL', DEFAULT_TTL)
+
+
+def _claim_lease():
+    return getattr(settings, 'IDEMPOTENCY_CLAIM_LEASE', DEFAULT_CLAIM_LEASE)
+
+
+def _fingerprint(request):
+    data = request.data.dict() if hasattr(request.data, 'dict') else request.data
+    body = json.dumps(data, sort_keys=True, default=str)
+    return hashlib.sha256(f"{request.method}|{request.path}|{body}".encode()).hexdigest()
+
+
+def _purge_expired():
+    expired = list(
+        IdempotencyKey.objects.filter(expires_at__lt=timezone.now())
+        .values_list('key', flat=True)[:PURGE_BATCH]
+    )
+    if expired:
+        IdempotencyKey.objects.filter(key__in=expired).delete()
+
+
+def _replay(record, fingerprint):
+    """Response for a key we've seen before"""
+    if record.fingerprint != fingerprint:
+        return Response({
+            "success": False,
+            "error": "Idempotency-Key was already used for a different request"
+        }, status=422)
+    if record.status_code is None:
+        return Response({
+            "success": False,
+            "error": "A request with this Idempotency-Key is still being processed"
+        }, status=409)
+    response = Response(json.loads(record.response_body), status=record.status_code)
+    response['Idempotent-Replayed'] = 'true'
+    return response
+
+
+def _claim(key, fingerprint):
+    """
+    Reserve `key` for this request. Returns (None, claimed_at) when we own
+    it, or (record, None) when another request got there first.
+    """
+    for attempt in range(CLAIM_ATTEMPTS):
+        now = timezone.now()
+        # An expired key, or one whose request died before storing a response, is free to reuse
+        abandoned = Q(status_code__isnull=True) & (
+            Q(claimed_at__lt=now - _claim_lease()) | Q(claimed_at__isnull=True)
+        )
+        IdempotencyKey.objects.filter(key=key).filter(Q(expires_at__lt=now) | abandoned).delete()
+        try:
+            with transaction.atomic():
+                IdempotencyKey.objects.create(
+                    key=key, fingerprint=fingerprint, expires_at=now + _ttl(), claimed_at=now
+                )
+            return None, now
+        except IntegrityError:
+            existing = IdempotencyKey.objects.filter(key=key).first()
+            if existing is not None:
+                return existing, None
+            # Released between our insert and our read (the owner failed), try again
+
+    # Still contended: report it as in progress so the client retries later
+    return IdempotencyKey(key=key, fingerprint=fingerprint), None
+
+
+def idempotent(view):
+    """
+    Let clients safely retry a money-moving POST by sending an
+    Idempotency-Key header. The first response (anything below 500) is
+    stored and replayed for later requests with the same key without
+    running the view again. Requests without the header run as before.
+    Goes below @api_view so it sees DRF's Request and Response.
+    """
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.META.get('HTTP_IDEMPOTENCY_KEY', '').strip()
+        if not key:
+            return view(request, *args, **kwargs)
+        if len(key) > 64:
+            return Response({"success": False, "error": "Idempotency-Key is too long (max 64)"}, status=400)
+
+        if random.randrange(PURGE_EVERY) == 0:
+            _purge_expired()
+
+        fingerprint = _fingerprint(request)
+        existing, claimed_at = _claim(key, fingerprint)
+        if existing is not None:
+            return _replay(existing, fingerprint)
+
+        # Only touch our own claim, in case it outlived the lease and was taken over
+        claim = IdempotencyKey.objects.filter(key=key, claimed_at=claimed_at)
+        try:
+            response = view(request, *args, **kwargs)
+        except Exception:
+            claim.delete()
+            raise
+
+        if response.status_code >= 500 or not hasattr(response, 'data'):
+            # Let the client retry failures for real
+            claim.delete()
+        else:
+            claim.update(
+                status_code=response.status_code,
+                response_body=json.dumps(response.data, default=str)
+            )
+        return response
+
+    return wrapper
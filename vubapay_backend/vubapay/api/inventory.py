@@ -0,0 +1,116 @@
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, Value, When
+
+from . import menu_cache
+from .models import Product, Menu
+
+
+class InsufficientStock(Exception):
+    """Raised when an order asks for more than is in stock, nothing is changed"""
+
+    def __init__(self, shortages):
+        self.shortages = shortages
+        names = ', '.join(f"{name} (available: {available})" for name, available in shortages)
+        self.message = f"Insufficient stock for: {names}"
+        super().__init__(self.message)
+
+
+class InvalidOrderItems(Exception):
+    """Raised when an order line has a quantity or product id that isn't a whole number"""
+
+    def __init__(self, message):
+        self.message = message
+        super().__init__(message)
+
+
+def _whole_number(value, what, item):
+    # "2" is fine, 2.5, "2.5" and "abc" are not
+    try:
+        if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+            raise ValueError
+        return int(value)
+    except (TypeError, ValueError):
+        name = item.get('productname') or item.get('productid') or 'item'
+        raise InvalidOrderItems(f"Invalid {what} for {name}: {value!r}")
+
+
+def _ordered_quantities(items):
+    """
+    Sum quantities per product id, ignoring lines without a product or
+    quantity. Raises InvalidOrderItems for values that aren't whole numbers.
+    """
+    if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+        raise InvalidOrderItems("items must be a list of order lines")
+
+    quantities = {}
+    for item in items:
+        product_id = item.get('productid')
+        quantity = _whole_number(item.get('quantity', 0) or 0, 'quantity', item)
+        if quantity < 0:
+            raise InvalidOrderItems(f"Invalid quantity for {item.get('productname') or product_id}: {quantity}")
+        if product_id and quantity > 0:
+            product_id = _whole_number(product_id, 'product id', item)
+            quantities[product_id] = quantities.get(product_id, 0) + quantity
+    return quantities
+
+
+def reserve_stock(items, merchant_id):
+    """
+    Take the ordered quantities out of stock in a fixed number of queries,
+    whatever the number of order lines:
+      1. lock all ordered products (SELECT ... FOR UPDATE, primary key order)
+      2. one UPDATE decrementing every product's stock
+      3. one UPDATE of the matching menu rows' availability
+    Products the merchant doesn't have are skipped. Raises InsufficientStock
+    if any product can't cover its quantity and InvalidOrderItems for
+    malformed lines, before anything is locked.
+    """
+    quantities = _ordered_quantities(items)
+    if not quantities:
+        return {}
+
+    with transaction.atomic():
+        locked = list(
+            Product.objects.select_for_update()
+            .filter(productid__in=quantities.keys(), merchantid=merchant_id)
+            .order_by('productid')
+            .values_list('productid', 'productname', 'amountinstock')
+        )
+
+        missing = set(quantities) - {product_id for product_id, _, _ in locked}
+        for product_id in missing:
+            print(f"⚠️ Product {product_id} not found")
+
+        shortages = [
+            (name, stock) for product_id, name, stock in locked
+            if stock < quantities[product_id]
+        ]
+        if shortages:
+            raise InsufficientStock(shortages)
+
+        if not locked:
+            return {}
+
+        new_stock = {product_id: stock - quantities[product_id] for product_id, _, stock in locked}
+
+        # The stock >= qty guard repeats the check above in SQL
+        decrement = Case(
+            *[When(productid=product_id, then=Value(quantities[product_id])) for product_id in new_stock],
+            default=Value(0),
+            output_field=IntegerField(),
+        )
+        Product.objects.filter(
+            productid__in=new_stock.keys(), amountinstock__gte=decrement
+        ).update(amountinstock=F('amountinstock') - decrement)
+
+        sold_out = [product_id for product_id, stock in new_stock.items() if stock <= 0]
+        Menu.objects.filter(merchantid=merchant_id, productid__in=new_stock.keys()).update(
+            availability=Case(
+                When(productid__in=sold_out, then=Value(False)),
+                default=Value(True),
+            )
+        )
+
+        menu_cache.invalidate(merchant_id)
+
+    return new_stock
@@ -0,0 +1,174 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import F
+
+from . import rollups
+from .models import User, Merchant, Transaction
+from .paycodes import candidate_types
+from .utils import generate_id
+
+# Flat fee charged to the sender on every transfer
+TRANSFER_CHARGE = Decimal('20.0')
+
+# account type -> (model, paycode field); the order here is also the lock order
+PARTY_MODELS = (
+    ('user', User, 'paycode'),
+    ('merchant', Merchant, 'merchantpaycode'),
+)
+
+
+class LedgerError(Exception):
+    """Base error for ledger operations, carries the HTTP status to return"""
+    status_code = 400
+
+    def __init__(self, message, status_code=None):
+        super().__init__(message)
+        self.message = message
+        if status_code is not None:
+            self.status_code = status_code
+
+
+class PartyNotFound(LedgerError):
+    status_code = 404
+
+
+class InvalidPin(LedgerError):
+    pass
+
+
+class InsufficientFunds(LedgerError):
+    pass
+
+
+class Party:
+    """A locked sender or receiver account"""
+
+    def __init__(self, account, account_type):
+        self.account = account
+        self.type = account_type
+
+    @property
+    def id(self):
+        return self.account.pk
+
+    @property
+    def username(self):
+        return self.account.username
+
+    @property
+    def model(self):
+        return type(self.account)
+
+
+class TransferResult:
+    """Outcome of a transfer, balances are computed from the locked rows"""
+
+    def __init__(self, trans, sender, receiver, amount, charge, sender_balance, receiver_balance):
+        self.transaction = trans
+        self.sender = sender
+        self.receiver = receiver
+        self.amount = amount
+        self.charge = charge
+        self.total = amount + charge
+        self.sender_balance = sender_balance
+        self.receiver_balance = receiver_balance
+
+    @property
+    def transaction_id(self):
+        return self.transaction.transactionid
+
+
+def lock_parties(*paycodes):
+    """
+    Resolve paycodes to accounts and lock them with SELECT ... FOR UPDATE.
+    Rows are locked user table first, then merchant table, each in primary key
+    order, so two concurrent transfers between the same accounts can't deadlock.
+    Must be called inside transaction.atomic().
+    """
+    wanted = set(paycodes)
+    found = {}
+
+    for account_type, model, paycode_field in PARTY_MODELS:
+        # The UP/MP prefix tells us which table to look in, so merchant
+        # payments don't pay for a failed user lookup
+        candidates = {code for code in wanted if account_type in candidate_types(code)}
+        if not candidates:
+            continue
+        rows = (model.objects
+                .select_for_update()
+                .filter(**{f'{paycode_field}__in': candidates})
+                .order_by('pk'))
+        for row in rows:
+            paycode = getattr(row, paycode_field)
+            found[paycode] = Party(row, account_type)
+            wanted.discard(paycode)
+
+    return found
+
+
+def transfer(sender_paycode, receiver_paycode, amount, pin, charge=TRANSFER_CHARGE,
+             transfertype='Normal transfer'):
+    """
+    Move `amount` from sender to receiver and record the Transaction.
+    The sender pays `amount + charge`, the receiver gets `amount`.
+    Raises a LedgerError subclass when the payment can't go through.
+    """
+    if sender_paycode == receiver_paycode:
+        raise LedgerError("Cannot send money to yourself")
+
+    total = amount + charge
+
+    with transaction.atomic():
+        parties = lock_parties(sender_paycode, receiver_paycode)
+
+        sender = parties.get(sender_paycode)
+        if sender is None:
+            raise PartyNotFound("Sender not found")
+
+        receiver = parties.get(receiver_paycode)
+        if receiver is None:
+            raise PartyNotFound("Receiver not found")
+
+        if str(sender.account.pin) != str(pin):
+            raise InvalidPin("Invalid PIN")
+
+        sender_balance = sender.account.balance
+        if sender_balance < total:
+            raise InsufficientFunds(
+                f"Insufficient balance. Available: {sender_balance} RWF, Required: {total} RWF"
+            )
+
+        # Conditional debit guards the balance even if a caller forgets to lock
+        debited = (sender.model.objects
+                   .filter(pk=sender.id, balance__gte=total)
+                   .update(balance=F('balance') - total))
+        if not debited:
+            raise InsufficientFunds(
+                f"Insufficient balance. Available: {sender_balance} RWF, Required: {total} RWF"
+            )
+
+        receiver.model.objects.filter(pk=receiver.id).update(balance=F('balance') + amount)
+
+        trans = Transaction.objects.create(
+            transactionid=generate_id(),
+            transfertype=transfertype,
+            senderid=sender.id,
+            receiverid=receiver.id,
+            amount=amount,
+            charge=charge,
+            status='success',
+            sender_type=sender.type,
+            receiver_type=receiver.type
+        )
+        rollups.record_transaction(trans)
+
+    return TransferResult(
+        trans=trans,
+        sender=sender,
+        receiver=receiver,
+        amount=amount,
+        charge=charge,
+        sender_balance=sender_balance - total,
+        receiver_balance=receiver.account.balance + amount,
+    )
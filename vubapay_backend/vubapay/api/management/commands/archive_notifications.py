@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from api.notification_archive import DEFAULT_BATCH_SIZE, archive_old_notifications, retention_days
+
+
+class Command(BaseCommand):
+    help = "Move notifications older than the retention period into the archive"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int,
+                            help="Archive notifications older than this (default NOTIFICATION_RETENTION_DAYS)")
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE,
+                            help="Rows moved per transaction")
+        parser.add_argument('--to', choices=['table', 'jsonl'], default='table',
+                            help="notification_archive table, or gzipped JSONL in NOTIFICATION_ARCHIVE_DIR")
+        parser.add_argument('--dry-run', action='store_true', help="Only count what would be archived")
+
+    def handle(self, *args, **options):
+        days = options['days'] if options['days'] is not None else retention_days()
+        if days < 1:
+            raise CommandError("--days must be at least 1")
+        if options['batch_size'] < 1:
+            raise CommandError("--batch-size must be at least 1")
+
+        archived = archive_old_notifications(
+            days=days,
+            batch_size=options['batch_size'],
+            to=options['to'],
+            dry_run=options['dry_run'],
+            log=self.stdout.write,
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f"{archived} notifications are older than {days} days")
+        else:
+            self.stdout.write(self.style.SUCCESS(
+                f"Archived {archived} notifications older than {days} days to {options['to']}"
+            ))
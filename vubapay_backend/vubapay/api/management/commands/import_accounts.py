@@ -0,0 +1,48 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+from api.account_import import AccountImporter, DEFAULT_CHUNK_SIZE, read_rows
+
+
+class Command(BaseCommand):
+    help = "Bulk import users/merchants from a CSV or NDJSON file"
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help="CSV (with header row) or NDJSON file")
+        parser.add_argument('--format', choices=['csv', 'ndjson'],
+                            help="Defaults to ndjson for .ndjson/.jsonl files, csv otherwise")
+        parser.add_argument('--type', choices=['user', 'merchant'],
+                            help="Account type for rows without a `type` column")
+        parser.add_argument('--chunk-size', type=int, default=DEFAULT_CHUNK_SIZE)
+        parser.add_argument('--dry-run', action='store_true', help="Validate only, create nothing")
+        parser.add_argument('--report', help="Write the JSON error report to this file")
+
+    def handle(self, *args, **options):
+        path = options['path']
+        fmt = options['format'] or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+        if options['chunk_size'] < 1:
+            raise CommandError("--chunk-size must be at least 1")
+
+        importer = AccountImporter(
+            default_type=options['type'],
+            chunk_size=options['chunk_size'],
+            dry_run=options['dry_run'],
+        )
+        try:
+            with open(path, encoding='utf-8-sig', newline='') as stream:
+                report = importer.run(read_rows(stream, fmt))
+        except OSError as e:
+            raise CommandError(str(e))
+
+        if options['report']:
+            with open(options['report'], 'w') as out:
+                json.dump(report, out, indent=2)
+        else:
+            for error in report['errors']:
+                self.stderr.write(f"line {error['line']}: {error['error']}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Created {report['created_users']} users and {report['created_merchants']} merchants, "
+            f"{report['failed']} rows failed" + (" (dry run)" if report['dry_run'] else "")
+        ))
@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_date
+
+from api.rollups import rebuild
+
+
+class Command(BaseCommand):
+    help = "Backfill or rebuild the daily, per-merchant and order status rollup tables"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--since', help="Only rebuild days from this date (YYYY-MM-DD) on")
+
+    def handle(self, *args, **options):
+        since = None
+        if options['since']:
+            since = parse_date(options['since'])
+            if since is None:
+                raise CommandError("--since must be a date in YYYY-MM-DD format")
+
+        counts = rebuild(since)
+        self.stdout.write(self.style.SUCCESS(
+            f"Rebuilt {counts['days']} days, {counts['merchant_days']} merchant days "
+            f"and {counts['statuses']} order status counts"
+        ))
@@ -0,0 +1,26 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from api import dashboard_snapshot
+
+
+class Command(BaseCommand):
+    help = ("Refresh the cached admin dashboard snapshot. Only useful with a cache shared "
+            "between processes (Redis, Memcached, database); with LocMemCache the web "
+            "process refreshes its own snapshot in a background thread.")
+
+    def add_arguments(self, parser):
+        parser.add_argument('--loop', action='store_true', help="Keep refreshing until interrupted")
+        parser.add_argument('--interval', type=int,
+                            help="Seconds between refreshes with --loop (default DASHBOARD_SNAPSHOT_INTERVAL)")
+
+    def handle(self, *args, **options):
+        interval = options['interval'] or dashboard_snapshot.interval()
+        while True:
+            started = time.monotonic()
+            dashboard_snapshot.refresh()
+            self.stdout.write(f"📊 Dashboard snapshot refreshed in {time.monotonic() - started:.2f}s")
+            if not options['loop']:
+                break
+            time.sleep(max(0, interval - (time.monotonic() - started)))
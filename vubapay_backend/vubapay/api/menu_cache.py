@@ -0,0 +1,56 @@
+import json
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+from .conditional import make_etag
+
+# Cached payloads expire on their own after this long even without a write
+MENU_CACHE_TIMEOUT = 60 * 60
+
+
+def _version_key(merchant_id):
+    return f"menu:version:{merchant_id}"
+
+
+def get_version(merchant_id):
+    """Current cache version of a merchant's menu data"""
+    version = cache.get(_version_key(merchant_id))
+    if version is None:
+        version = time.time_ns()
+        # add() so two concurrent readers agree on the same starting version
+        if not cache.add(_version_key(merchant_id), version, None):
+            version = cache.get(_version_key(merchant_id), version)
+    return version
+
+
+def get_or_build(kind, merchant_id, builder):
+    """
+    Return (payload, etag) for one of a merchant's menu reads.
+    `kind` names the payload (menu, products, custom_fields), `builder` is
+    called to produce it on a miss. Entries are keyed by the merchant's
+    version, so invalidate() makes every old entry unreachable at once.
+    """
+    key = f"menu:{kind}:{merchant_id}:{get_version(merchant_id)}"
+    entry = cache.get(key)
+    if entry is None:
+        payload = builder()
+        etag = make_etag(json.dumps(payload, sort_keys=True, default=str))
+        entry = (payload, etag)
+        cache.set(key, entry, MENU_CACHE_TIMEOUT)
+    return entry
+
+
+def invalidate(merchant_id):
+    """
+    Drop every cached read for a merchant once the current DB transaction
+    commits, so readers can't re-cache rows that are about to change.
+    """
+    if merchant_id is None:
+        return
+    merchant_id = int(merchant_id)
+    transaction.on_commit(
+        lambda: cache.set(_version_key(merchant_id), time.time_ns(), None)
+    )
+
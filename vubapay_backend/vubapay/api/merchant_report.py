@@ -0,0 +1,335 @@
+import tempfile
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+
+from django.db.models import Avg, Case, Count, DecimalField, Q, Sum, Value, When
+from django.utils import timezone
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
+
+from .models import Order, Product, Sales, Transaction
+
+# The PDF is written to memory up to this size, then to a temporary file
+SPOOL_MAX_SIZE = 5 * 1024 * 1024
+# Long tables are split into tables of this many rows; reportlab re-measures
+# a table every time it splits it over a page, so one huge table is quadratic
+ROWS_PER_TABLE = 200
+# Order rows listed in the report when the period has only a few orders
+ORDER_ROWS = 10
+ORDER_LIST_LIMIT = 20
+
+ZERO = Decimal('0.00')
+
+
+def period_filter(field, year=None, month=None, day=None):
+    """
+    Q restricting `field` to the requested year/month/day. With a year this
+    is a plain range, so the date indexes can be used; month or day without
+    a year fall back to matching those parts of the date.
+    """
+    if not year:
+        period = Q()
+        if month:
+            period &= Q(**{f'{field}__month': month})
+        if day:
+            period &= Q(**{f'{field}__day': day})
+        return period
+
+    start = date(year, month or 1, day or 1)
+    if day:
+        end = start + timedelta(days=1)
+    elif month:
+        end = date(year + month // 12, month % 12 + 1, 1)
+    else:
+        end = date(year + 1, 1, 1)
+    tz = timezone.get_current_timezone()
+    return Q(**{
+        f'{field}__gte': timezone.make_aware(datetime.combine(start, time.min), tz),
+        f'{field}__lt': timezone.make_aware(datetime.combine(end, time.min), tz),
+    })
+
+
+def _money(value):
+    return f"{float(value or 0):,.2f}"
+
+
+def financial_summary(merchant, period):
+    """Income and expenses as two aggregates, one per side of the transfer index"""
+    transactions = Transaction.objects.filter(period_filter('date', **period))
+    received = transactions.filter(receiver_type='merchant', receiverid=merchant.merchantid).aggregate(
+        amount=Sum('amount'))
+    sent = transactions.filter(sender_type='merchant', senderid=merchant.merchantid).exclude(
+        receiver_type='merchant', receiverid=merchant.merchantid).aggregate(
+        amount=Sum('amount'), charges=Sum('charge'))
+
+    income = received['amount'] or ZERO
+    total_sent = sent['amount'] or ZERO
+    expenses = total_sent + (sent['charges'] or ZERO)
+    return {
+        'balance': merchant.balance or ZERO,
+        'income': income,
+        'expenses': expenses,
+        'net': income - expenses,
+        'received': income,
+        'sent': total_sent,
+    }
+
+
+def product_sales(merchant, period):
+    """Sales grouped by product name in SQL, best sellers first"""
+    return list(
+        Sales.objects.filter(merchantid=merchant.merchantid)
+        .filter(period_filter('date', **period))
+        .values('productname')
+        .annotate(quantity=Sum('quantity'), amount=Sum('amount'))
+        .order_by('-amount')
+    )
+
+
+def order_summary(merchant, period):
+    """Order counts and values per status from a single GROUP BY"""
+    orders = Order.objects.filter(merchant_id=merchant.merchantid).filter(period_filter('created_at', **period))
+    by_status = orders.values('status').annotate(
+        count=Count('orderid'),
+        value=Sum('total_amount'),
+        paid_value=Sum(Case(
+            When(is_paid=True, then='total_amount'),
+            default=Value(0),
+            output_field=DecimalField(max_digits=12, decimal_places=2),
+        )),
+    ).order_by()
+
+    summary = {'total': 0, 'statuses': {}, 'value': ZERO, 'paid_value': ZERO, 'recent': []}
+    for row in by_status:
+        summary['statuses'][row['status']] = row['count']
+        summary['total'] += row['count']
+        summary['value'] += row['value'] or ZERO
+        summary['paid_value'] += row['paid_value'] or ZERO
+
+    if 0 < summary['total'] <= ORDER_LIST_LIMIT:
+        summary['recent'] = list(orders.order_by('-created_at').values(
+            'order_number', 'customer_name', 'total_amount', 'status', 'is_paid')[:ORDER_ROWS])
+    return summary
+
+
+def chunked_tables(header, rows, col_widths, style):
+    """
+    Yield `rows` as tables of at most ROWS_PER_TABLE rows, each repeating
+    the header. `style` holds row-range commands (ROWBACKGROUNDS etc.), so
+    every table is styled once however many rows it has.
+    """
+    for start in range(0, max(len(rows), 1), ROWS_PER_TABLE):
+        table = Table([header] + rows[start:start + ROWS_PER_TABLE], colWidths=col_widths, repeatRows=1)
+        table.setStyle(style)
+        yield table
+
+
+def _header_style(background, font_size=9, padding=6, grid=(0.5, colors.grey)):
+    return [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(background)),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), font_size),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), padding),
+        ('GRID', (0, 0), (-1, -1), *grid),
+    ]
+
+
+def build_elements(merchant, period, styles):
+    title_style = ParagraphStyle('CustomTitle', parent=styles['Heading1'], fontSize=24, spaceAfter=30,
+                                 alignment=TA_CENTER, textColor=colors.HexColor('#FF8A00'))
+    normal_style = ParagraphStyle('Normal', parent=styles['Normal'], fontSize=10)
+    section_style = ParagraphStyle('Section', parent=styles['Heading3'], fontSize=12, spaceAfter=10,
+                                   spaceBefore=20, textColor=colors.HexColor('#2C3E50'))
+    now = datetime.now().strftime('%d %B %Y %H:%M:%S')
+
+    elements = [Paragraph("MERCHANT BUSINESS REPORT", title_style)]
+    merchant_info = f"""
+    <b>Merchant:</b> {merchant.username}<br/>
+    <b>Email:</b> {merchant.email}<br/>
+    <b>Phone:</b> {merchant.phonenumber or 'N/A'}<br/>
+    <b>Business Type:</b> {merchant.businesstype or 'N/A'}<br/>
+    <b>Merchant ID:</b> {merchant.merchantid}<br/>
+    <b>Report Date:</b> {now}<br/>
+    """
+    for label in ('year', 'month', 'day'):
+        if period.get(label):
+            merchant_info += f"<b>{label.title()}:</b> {period[label]}<br/>"
+    elements += [Paragraph(merchant_info, normal_style), Spacer(1, 20)]
+
+    # ================ SECTION 1: FINANCIAL SUMMARY ================
+    elements.append(Paragraph("1. FINANCIAL SUMMARY", section_style))
+    finance = financial_summary(merchant, period)
+    financial_table = Table([
+        ['Description', 'Amount (RWF)'],
+        ['Current Balance', _money(finance['balance'])],
+        ['Total Income', _money(finance['income'])],
+        ['Total Expenses', _money(finance['expenses'])],
+        ['Net Profit/Loss', _money(finance['net'])],
+        ['Total Received', _money(finance['received'])],
+        ['Total Sent', _money(finance['sent'])],
+    ], colWidths=[3*inch, 2*inch])
+    financial_table.setStyle(TableStyle(_header_style('#FF8A00', 10, 12, (1, colors.black)) + [
+        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+        ('ALIGN', (0, 1), (0, -1), 'LEFT'),
+        ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
+        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ]))
+    elements += [financial_table, Spacer(1, 20)]
+
+    # ================ SECTION 2: PRODUCTS SALES SUMMARY ================
+    elements.append(Paragraph("2. PRODUCTS SALES SUMMARY", section_style))
+    sales = product_sales(merchant, period)
+    if sales:
+        total_quantity = sum(row['quantity'] or 0 for row in sales)
+        total_amount = sum((row['amount'] or ZERO for row in sales), ZERO)
+        rows = [[
+            (row['productname'] or 'N/A')[:25],
+            str(row['quantity'] or 0),
+            _money(row['amount']),
+            _money(row['amount'] / row['quantity'] if row['quantity'] else 0),
+        ] for row in sales]
+        rows.append(['TOTAL', str(total_quantity), _money(total_amount), ''])
+
+        sales_style = TableStyle(_header_style('#8E44AD', 10, 12, (1, colors.black)) + [
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#F8F9FA')]),
+            ('ALIGN', (1, 1), (1, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (3, -1), 'RIGHT'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('PADDING', (0, 1), (-1, -1), (6, 4)),
+        ])
+        tables = list(chunked_tables(['Product Name', 'Quantity Sold', 'Total Amount (RWF)', 'Avg. Price'],
+                                     rows, [2.5*inch, 1*inch, 1.5*inch, 1*inch], sales_style))
+        # Totals row is the last row of the last table
+        tables[-1].setStyle(TableStyle([
+            ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#F39C12')),
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.whitesmoke),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+        ]))
+        elements += tables
+
+        average = total_amount / total_quantity if total_quantity else 0
+        elements += [Spacer(1, 10), Paragraph(f"""
+        <b>Sales Statistics:</b><br/>
+        • Total Products Sold: {total_quantity}<br/>
+        • Total Sales Value: {_money(total_amount)} RWF<br/>
+        • Average Sale Value: {_money(average)} RWF per unit<br/>
+        • Number of Products Sold: {len(sales)}<br/>
+        """, normal_style)]
+    else:
+        elements.append(Paragraph("No sales data found for the selected period.", normal_style))
+    elements.append(Spacer(1, 20))
+
+    # ================ SECTION 3: ORDERS SUMMARY ================
+    elements.append(Paragraph("3. ORDERS SUMMARY", section_style))
+    orders = order_summary(merchant, period)
+    if orders['total']:
+        elements.append(Paragraph(f"""
+        <b>Total Orders:</b> {orders['total']}<br/>
+        <b>Pending Orders:</b> {orders['statuses'].get('pending', 0)}<br/>
+        <b>Completed Orders:</b> {orders['statuses'].get('delivered', 0)}<br/>
+        <b>Cancelled Orders:</b> {orders['statuses'].get('cancelled', 0)}<br/>
+        <b>Total Order Value:</b> {_money(orders['value'])} RWF<br/>
+        <b>Paid Orders Value:</b> {_money(orders['paid_value'])} RWF<br/>
+        <b>Unpaid Orders Value:</b> {_money(orders['value'] - orders['paid_value'])} RWF<br/>
+        """, normal_style))
+
+        if orders['recent']:
+            order_table = Table([['Order #', 'Customer', 'Amount', 'Status', 'Paid']] + [[
+                (order['order_number'] or 'N/A')[:8],
+                (order['customer_name'] or 'N/A')[:15],
+                _money(order['total_amount']),
+                order['status'] or 'N/A',
+                '✓' if order['is_paid'] else '✗',
+            ] for order in orders['recent']], colWidths=[1*inch, 1.5*inch, 1*inch, 1*inch, 0.5*inch])
+            order_table.setStyle(TableStyle(_header_style('#27AE60') + [
+                ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+                ('ALIGN', (4, 1), (4, -1), 'CENTER'),
+                ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ]))
+            elements.append(order_table)
+    else:
+        elements.append(Paragraph("No orders found for the selected period.", normal_style))
+    elements.append(Spacer(1, 20))
+
+    # ================ SECTION 4: PRODUCTS IN MENU ================
+    elements.append(Paragraph("4. PRODUCTS IN MENU", section_style))
+    products = Product.objects.filter(merchantid=merchant.merchantid)
+    product_stats = products.aggregate(count=Count('productid'), stock=Sum('amountinstock'), avg_price=Avg('price'))
+    if product_stats['count']:
+        rows = [[
+            (product['productname'] or 'N/A')[:25],
+            _money(product['price']),
+            str(product['amountinstock'] or 0),
+            (product['category'] or 'N/A')[:15],
+        ] for product in products.order_by('productid').values(
+            'productname', 'price', 'amountinstock', 'category').iterator(chunk_size=ROWS_PER_TABLE)]
+        product_style = TableStyle(_header_style('#3498DB') + [
+            ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+            ('ALIGN', (2, 1), (2, -1), 'CENTER'),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ])
+        elements += chunked_tables(['Product', 'Price (RWF)', 'In Stock', 'Category'], rows,
+                                   [2*inch, 1*inch, 0.8*inch, 1.2*inch], product_style)
+        elements += [Spacer(1, 10), Paragraph(f"""
+        <b>Product Statistics:</b><br/>
+        • Total Products in Menu: {product_stats['count']}<br/>
+        • Total Items in Stock: {product_stats['stock'] or 0}<br/>
+        • Average Product Price: {_money(product_stats['avg_price'])} RWF<br/>
+        """, normal_style)]
+    else:
+        elements.append(Paragraph("No products found in menu.", normal_style))
+    elements.append(Spacer(1, 20))
+
+    # ================ SECTION 5: TOP PERFORMING PRODUCTS ================
+    if sales:
+        elements.append(Paragraph("5. TOP PERFORMING PRODUCTS", section_style))
+        top_table = Table([['Rank', 'Product', 'Sales (RWF)', 'Quantity']] + [[
+            str(rank),
+            (row['productname'] or 'N/A')[:20],
+            _money(row['amount']),
+            str(row['quantity'] or 0),
+        ] for rank, row in enumerate(sales[:5], 1)], colWidths=[0.5*inch, 2.5*inch, 1.5*inch, 1*inch])
+        medals = [colors.HexColor('#FFD700'), colors.HexColor('#C0C0C0'), colors.HexColor('#CD7F32')]
+        top_table.setStyle(TableStyle(_header_style('#E74C3C', 10, 12, (1, colors.black)) + [
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            *[('BACKGROUND', (0, rank), (-1, rank), medal) for rank, medal in enumerate(medals[:len(sales)], 1)],
+            ('ALIGN', (0, 1), (0, -1), 'CENTER'),
+            ('ALIGN', (2, 1), (2, -1), 'RIGHT'),
+            ('ALIGN', (3, 1), (3, -1), 'CENTER'),
+            ('FONTSIZE', (0, 1), (-1, -1), 9),
+            ('PADDING', (0, 1), (-1, -1), (6, 4)),
+        ]))
+        elements += [top_table, Spacer(1, 20)]
+
+    # ================ FOOTER ================
+    elements.append(Paragraph(f"""
+    <b>Report Generated:</b> {now}<br/>
+    <b>For Internal Use Only</b><br/>
+    <i>This report provides a summary of {merchant.username}'s business performance.</i>
+    """, ParagraphStyle('Footer', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.grey)))
+    return elements
+
+
+def render(merchant, year=None, month=None, day=None):
+    """
+    Write the merchant's report PDF to a spooled temporary file and return
+    it rewound, ready to be streamed. Only aggregates and the product list
+    are loaded; transactions, sales and orders are summed in the database.
+    """
+    period = {'year': year, 'month': month, 'day': day}
+    spool = tempfile.SpooledTemporaryFile(max_size=SPOOL_MAX_SIZE)
+    try:
+        doc = SimpleDocTemplate(spool, pagesize=A4, rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=72)
+        doc.build(build_elements(merchant, period, getSampleStyleSheet()))
+    except Exception:
+        spool.close()
+        raise
+    spool.seek(0)
+    return spool
@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0003_idempotencykey'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='notification',
+            name='recipient_type',
+            field=models.CharField(blank=True, choices=[('user', 'User'), ('merchant', 'Merchant')], max_length=10, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='recipient_id',
+            field=models.IntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='notification',
+            name='read_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddIndex(
+            model_name='notification',
+            index=models.Index(fields=['recipient_type', 'recipient_id', 'date'], name='idx_notif_recipient'),
+        ),
+    ]
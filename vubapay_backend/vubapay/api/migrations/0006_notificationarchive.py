@@ -0,0 +1,30 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_notificationreadmarker'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='NotificationArchive',
+            fields=[
+                ('notificationid', models.IntegerField(primary_key=True, serialize=False)),
+                ('title', models.CharField(max_length=100)),
+                ('content', models.TextField()),
+                ('urgency', models.CharField(max_length=10)),
+                ('designated_to', models.CharField(max_length=10)),
+                ('date', models.DateTimeField()),
+                ('recipient_type', models.CharField(blank=True, max_length=10, null=True)),
+                ('recipient_id', models.IntegerField(blank=True, null=True)),
+                ('read_at', models.DateTimeField(blank=True, null=True)),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+            ],
+            options={
+                'db_table': 'notification_archive',
+                'indexes': [models.Index(fields=['recipient_type', 'recipient_id', 'date'], name='idx_notif_archive_recipient')],
+            },
+        ),
+    ]
@@ -0,0 +1,60 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0006_notificationarchive'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(unique=True)),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('charges', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('orders_created', models.IntegerField(default=0)),
+                ('orders_paid', models.IntegerField(default=0)),
+                ('order_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('tips', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'db_table': 'rollup_daily',
+            },
+        ),
+        migrations.CreateModel(
+            name='MerchantDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant_id', models.IntegerField()),
+                ('day', models.DateField()),
+                ('revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('transaction_count', models.IntegerField(default=0)),
+                ('orders_created', models.IntegerField(default=0)),
+                ('orders_paid', models.IntegerField(default=0)),
+                ('order_revenue', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+                ('tips', models.DecimalField(decimal_places=2, default=0, max_digits=16)),
+            ],
+            options={
+                'db_table': 'rollup_merchant_daily',
+                'unique_together': {('merchant_id', 'day')},
+                'indexes': [models.Index(fields=['day'], name='idx_rollup_merchant_day')],
+            },
+        ),
+        migrations.CreateModel(
+            name='OrderStatusRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('merchant_id', models.IntegerField()),
+                ('status', models.CharField(max_length=20)),
+                ('count', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'rollup_order_status',
+                'unique_together': {('merchant_id', 'status')},
+            },
+        ),
+    ]
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0008_idempotencykey_claimed_at'),
+    ]
+
+    operations = [
+        # archived_feed pages on notificationid, not date
+        migrations.RemoveIndex(
+            model_name='notificationarchive',
+            name='idx_notif_archive_recipient',
+        ),
+        migrations.AddIndex(
+            model_name='notificationarchive',
+            index=models.Index(fields=['recipient_type', 'recipient_id', 'notificationid'], name='idx_notif_archive_recipient'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models import Exists, OuterRef, Subquery
 
 
 class User(models.Model):
@@ -53,9 +54,17 @@ class Notification(models.Model):
     urgency = models.CharField(max_length=10, choices=[('low', 'Low'), ('medium', 'Medium'), ('high', 'High')])
     designated_to = models.CharField(max_length=10, choices=[('user', 'User'), ('merchant', 'Merchant'), ('all', 'All')])
     date = models.DateTimeField(auto_now_add=True)
+    # Set when the notification is for one account; broadcasts leave them NULL
+    recipient_type = models.CharField(max_length=10, choices=[('user', 'User'), ('merchant', 'Merchant')], null=True, blank=True)
+    recipient_id = models.IntegerField(null=True, blank=True)
+    read_at = models.DateTimeField(null=True, blank=True)
     
     class Meta:
         db_table = 'notification'
+        indexes = [
+            # An account's feed is a range scan; broadcasts sit under (NULL, NULL)
+            models.Index(fields=['recipient_type', 'recipient_id', 'date'], name='idx_notif_recipient'),
+        ]
 
     def __str__(self):
         return self.title
@@ -77,33 +86,58 @@ class Transaction(models.Model):
     class Meta:
         managed = False
         db_table = 'transaction'
+        indexes = [
+            models.Index(fields=['sender_type', 'senderid', 'date'], name='idx_txn_sender'),
+            models.Index(fields=['receiver_type', 'receiverid', 'date'], name='idx_txn_receiver'),
+            # Dashboard revenue series: a range scan over recent days
+            models.Index(fields=['date'], name='idx_txn_date'),
+            # Admin browser status filter, newest first (InnoDB appends the pk)
+            models.Index(fields=['status'], name='idx_txn_status'),
+        ]
         
     def __str__(self):
         return f"Transaction {self.transactionid}: {self.senderid} -> {self.receiverid} ({self.amount})"
     
-    def get_sender_name(self):
+    def get_sender_name(self, names=None):
         """Get sender name based on sender_type"""
-        try:
-            if self.sender_type == 'user':
-                sender = User.objects.get(userid=self.senderid)
-                return sender.username
-            else:
-                sender = Merchant.objects.get(merchantid=self.senderid)
-                return sender.username
-        except (User.DoesNotExist, Merchant.DoesNotExist):
-            return f"Unknown {self.sender_type}"
+        key = (self.sender_type, self.senderid)
+        if names is None:
+            names = resolve_account_names([key])
+        if key in names:
+            return names[key][1]
+        return f"Unknown {self.sender_type}"
     
-    def get_receiver_name(self):
+    def get_receiver_name(self, names=None):
         """Get receiver name based on receiver_type"""
-        try:
-            if self.receiver_type == 'user':
-                receiver = User.objects.get(userid=self.receiverid)
-                return receiver.username
-            else:
-                receiver = Merchant.objects.get(merchantid=self.receiverid)
-                return receiver.username
-        except (User.DoesNotExist, Merchant.DoesNotExist):
-            return f"Unknown {self.receiver_type}"
+        key = (self.receiver_type, self.receiverid)
+        if names is None:
+            names = resolve_account_names([key])
+        if key in names:
+            return names[key][1]
+        return f"Unknown {self.receiver_type}"
+
+
+def resolve_account_names(accounts):
+    """
+    Resolve (account_type, id) pairs to (account_type, username) with at most
+    one query per table, however many pairs are passed in.
+    Pairs with an unknown type are looked up as a user first, then a merchant.
+    Pairs that match no account are left out of the result.
+    """
+    accounts = set(accounts)
+    user_ids = {account_id for account_type, account_id in accounts if account_type != 'merchant'}
+    merchant_ids = {account_id for account_type, account_id in accounts if account_type != 'user'}
+
+    users = dict(User.objects.filter(userid__in=user_ids).values_list('userid', 'username')) if user_ids else {}
+    merchants = dict(Merchant.objects.filter(merchantid__in=merchant_ids).values_list('merchantid', 'username')) if merchant_ids else {}
+
+    names = {}
+    for account_type, account_id in accounts:
+        if account_type != 'merchant' and account_id in users:
+            names[(account_type, account_id)] = ('user', users[account_id])
+        elif account_type != 'user' and account_id in merchants:
+            names[(account_type, account_id)] = ('merchant', merchants[account_id])
+    return names
 
 
 class Product(models.Model):
@@ -118,17 +152,38 @@ class Product(models.Model):
     class Meta:
         managed = False
         db_table = 'product'
+        indexes = [
+            # Admin browser prefix search
+            models.Index(fields=['productname'], name='idx_product_name'),
+        ]
         
     def __str__(self):
         return self.productname
 
 
+class MenuQuerySet(models.QuerySet):
+    # Product columns copied onto each menu row by with_product()
+    PRODUCT_FIELDS = ('productname', 'price', 'amountinstock', 'category', 'productpicture')
+
+    def with_product(self):
+        """
+        Annotate menu rows with their product's fields so the whole menu comes
+        back in one query. Menu rows whose product no longer exists are skipped.
+        """
+        product = Product.objects.filter(productid=OuterRef('productid'))
+        return self.filter(Exists(product)).annotate(**{
+            field: Subquery(product.values(field)[:1]) for field in self.PRODUCT_FIELDS
+        })
+
+
 class Menu(models.Model):
     menuid = models.AutoField(primary_key=True)
     merchantid = models.IntegerField()
     productid = models.BigIntegerField()
     availability = models.BooleanField()
 
+    objects = MenuQuerySet.as_manager()
+
     class Meta:
         managed = False
         db_table = 'menu'
@@ -155,6 +210,10 @@ class Sales(models.Model):
     class Meta:
         managed = False
         db_table = 'sales'
+        indexes = [
+            # Merchant report: one merchant's sales over a date range
+            models.Index(fields=['merchantid', 'date'], name='idx_sales_merchant_date'),
+        ]
 
 from django.db import models
 import json
@@ -203,6 +262,8 @@ class Order(models.Model):
             models.Index(fields=['payment_date']),
             models.Index(fields=['created_at']),
             models.Index(fields=['transaction_id']),
+            # Admin browser prefix search
+            models.Index(fields=['customer_name'], name='idx_orders_customer_name'),
         ]
         
     def __str__(self):
@@ -224,4 +285,113 @@ class Order(models.Model):
                 return json.loads(self.custom_fields)
             return self.custom_fields
         except:
-            return {}
\ No newline at end of file
+            return {}
+
+
+class IdempotencyKey(models.Model):
+    """Stored outcome of a POST sent with an Idempotency-Key header"""
+    key = models.CharField(max_length=64, primary_key=True)
+    fingerprint = models.CharField(max_length=64)  # sha256 of method, path and body
+    status_code = models.PositiveSmallIntegerField(null=True)  # null while the first request is running
+    response_body = models.TextField(blank=True, default='')
+    expires_at = models.DateTimeField(db_index=True)
+    # When the running request claimed the key; a claim older than the lease is abandoned
+    claimed_at = models.DateTimeField(null=True)
+
+    class Meta:
+        db_table = 'idempotency_key'
+
+    def __str__(self):
+        return self.key
+
+
+class NotificationReadMarker(models.Model):
+    """Newest notification id an account has read; anything above it is unread"""
+    account_type = models.CharField(max_length=10, choices=[('user', 'User'), ('merchant', 'Merchant')])
+    account_id = models.IntegerField()
+    last_read_id = models.IntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        db_table = 'notification_read_marker'
+        unique_together = [('account_type', 'account_id')]
+
+    def __str__(self):
+        return f"{self.account_type} {self.account_id} read up to {self.last_read_id}"
+
+
+class NotificationArchive(models.Model):
+    """Notifications moved out of the live table by archive_notifications, ids kept"""
+    notificationid = models.IntegerField(primary_key=True)
+    title = models.CharField(max_length=100)
+    content = models.TextField()
+    urgency = models.CharField(max_length=10)
+    designated_to = models.CharField(max_length=10)
+    date = models.DateTimeField()
+    recipient_type = models.CharField(max_length=10, null=True, blank=True)
+    recipient_id = models.IntegerField(null=True, blank=True)
+    read_at = models.DateTimeField(null=True, blank=True)
+    archived_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        db_table = 'notification_archive'
+        indexes = [
+            models.Index(fields=['recipient_type', 'recipient_id', 'notificationid'], name='idx_notif_archive_recipient'),
+        ]
+
+    def __str__(self):
+        return self.title
+
+
+class DailyRollup(models.Model):
+    """Money and order totals for one day, kept current by api.rollups"""
+    day = models.DateField(unique=True)
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # sum of transaction amounts
+    charges = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+    orders_created = models.IntegerField(default=0)
+    orders_paid = models.IntegerField(default=0)
+    order_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)  # totals of orders paid that day
+    tips = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'rollup_daily'
+
+    def __str__(self):
+        return f"Rollup {self.day}"
+
+
+class MerchantDailyRollup(models.Model):
+    """Per-merchant totals for one day: money received, orders and tips"""
+    merchant_id = models.IntegerField()
+    day = models.DateField()
+    revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    transaction_count = models.IntegerField(default=0)
+    orders_created = models.IntegerField(default=0)
+    orders_paid = models.IntegerField(default=0)
+    order_revenue = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+    tips = models.DecimalField(max_digits=16, decimal_places=2, default=0)
+
+    class Meta:
+        db_table = 'rollup_merchant_daily'
+        unique_together = [('merchant_id', 'day')]
+        indexes = [
+            models.Index(fields=['day'], name='idx_rollup_merchant_day'),
+        ]
+
+    def __str__(self):
+        return f"Rollup merchant {self.merchant_id} {self.day}"
+
+
+class OrderStatusRollup(models.Model):
+    """How many of a merchant's orders are currently in each status"""
+    merchant_id = models.IntegerField()
+    status = models.CharField(max_length=20)
+    count = models.IntegerField(default=0)
+
+    class Meta:
+        db_table = 'rollup_order_status'
+        unique_together = [('merchant_id', 'status')]
+
+    def __str__(self):
+        return f"Merchant {self.merchant_id} {self.status}: {self.count}"
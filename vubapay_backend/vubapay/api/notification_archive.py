@@ -0,0 +1,132 @@
+import glob
+import gzip
+import heapq
+import json
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import notifications
+from .models import Notification, NotificationArchive
+
+DEFAULT_RETENTION_DAYS = 90
+DEFAULT_BATCH_SIZE = 1000
+
+# Columns copied into the archive (table or JSONL)
+ARCHIVED_FIELDS = (
+    'notificationid', 'title', 'content', 'urgency', 'designated_to',
+    'date', 'recipient_type', 'recipient_id', 'read_at',
+)
+
+
+def retention_days():
+    return getattr(settings, 'NOTIFICATION_RETENTION_DAYS', DEFAULT_RETENTION_DAYS)
+
+
+def archive_dir():
+    return getattr(settings, 'NOTIFICATION_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'notification_archive'))
+
+
+def _jsonl_path(cutoff):
+    os.makedirs(archive_dir(), exist_ok=True)
+    return os.path.join(archive_dir(), f"notifications-{cutoff:%Y%m%d%H%M%S}.jsonl.gz")
+
+
+def _next_batch(cutoff, batch_size):
+    return list(
+        Notification.objects.filter(date__lt=cutoff)
+        .order_by('notificationid')
+        .values(*ARCHIVED_FIELDS)[:batch_size]
+    )
+
+
+def archive_old_notifications(days=None, batch_size=DEFAULT_BATCH_SIZE, to='table', dry_run=False, log=print):
+    """
+    Move notifications older than `days` out of the live table, oldest
+    first, `batch_size` rows per transaction so locks stay short.
+    `to` is 'table' (notification_archive) or 'jsonl' (gzipped JSONL,
+    one file per run). Returns the number of rows archived.
+    """
+    days = retention_days() if days is None else days
+    cutoff = timezone.now() - timedelta(days=days)
+
+    if dry_run:
+        return Notification.objects.filter(date__lt=cutoff).count()
+
+    path = _jsonl_path(cutoff) if to == 'jsonl' else None
+    archived = 0
+    while True:
+        with transaction.atomic():
+            rows = _next_batch(cutoff, batch_size)
+            if not rows:
+                break
+
+            if to == 'jsonl':
+                # Appending gzip members keeps each batch durable before its delete
+                with gzip.open(path, 'at', encoding='utf-8') as out:
+                    for row in rows:
+                        out.write(json.dumps(row, default=str) + '\n')
+            else:
+                # ignore_conflicts: a batch that was copied but not deleted can be re-run
+                NotificationArchive.objects.bulk_create(
+                    [NotificationArchive(**row) for row in rows], ignore_conflicts=True
+                )
+
+            Notification.objects.filter(notificationid__in=[row['notificationid'] for row in rows]).delete()
+            notifications.forget_cached(rows)
+
+        archived += len(rows)
+        log(f"📦 Archived {archived} notifications so far (up to id {rows[-1]['notificationid']})")
+
+    return archived
+
+
+def _newest_first(row):
+    # Same order as the before_id cursor, so pages never skip or repeat rows
+    return row['notificationid']
+
+
+def _jsonl_rows(account_type, account_id):
+    """Archived rows for an account from the JSONL files, newest file first"""
+    for path in sorted(glob.glob(os.path.join(archive_dir(), 'notifications-*.jsonl.gz')), reverse=True):
+        with gzip.open(path, 'rt', encoding='utf-8') as archive:
+            for line in archive:
+                row = json.loads(line)
+                own = row['recipient_type'] == account_type and row['recipient_id'] == account_id
+                broadcast = row['recipient_type'] is None and row['designated_to'] in (account_type, 'all')
+                if own or broadcast:
+                    row['date'] = parse_datetime(row['date'])
+                    yield row
+
+
+def archived_feed(account_type, account_id, limit=50, before_id=None, include_files=False):
+    """
+    An account's archived notifications, newest (highest id) first: its
+    own rows and the broadcasts it would have seen. The archive table is an index range
+    scan; JSONL files are only scanned when `include_files` is set.
+    """
+    own = NotificationArchive.objects.filter(recipient_type=account_type, recipient_id=account_id)
+    broadcasts = NotificationArchive.objects.filter(
+        recipient_type__isnull=True, recipient_id__isnull=True, designated_to__in=[account_type, 'all']
+    )
+    if before_id is not None:
+        own = own.filter(notificationid__lt=before_id)
+        broadcasts = broadcasts.filter(notificationid__lt=before_id)
+
+    rows = list(own.order_by('-notificationid').values(*ARCHIVED_FIELDS)[:limit])
+    rows += list(broadcasts.order_by('-notificationid').values(*ARCHIVED_FIELDS)[:limit])
+
+    if include_files:
+        file_rows = (
+            row for row in _jsonl_rows(account_type, account_id)
+            if before_id is None or row['notificationid'] < before_id
+        )
+        rows += heapq.nlargest(limit, file_rows, key=_newest_first)
+
+    # A batch re-run after a failed delete can leave the same row in two places
+    rows = {row['notificationid']: row for row in rows}.values()
+    return heapq.nlargest(limit, rows, key=_newest_first)
@@ -0,0 +1,212 @@
+import heapq
+import uuid
+from bisect import bisect_right
+from itertools import islice
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Max
+from django.utils import timezone
+
+from .models import Notification, NotificationReadMarker
+
+# Cached unread counters and read markers; writes invalidate them
+UNREAD_CACHE_TIMEOUT = 24 * 60 * 60
+# Broadcast timelines per audience, rebuilt at least this often so rows
+# inserted straight into the table are picked up
+BROADCAST_TIMELINE_TIMEOUT = 5 * 60
+# Newest broadcasts kept per audience; feeds and unread counts look no further back
+BROADCAST_TIMELINE_SIZE = 100
+# Who a broadcast can be addressed to
+BROADCAST_AUDIENCES = ('user', 'merchant', 'all')
+
+
+def _unread_version_key(account_type, account_id):
+    return f"notif:unread-version:{account_type}:{account_id}"
+
+
+def _unread_key(account_type, account_id, version):
+    # Counts are stored per version, see unread_count()
+    return f"notif:unread:{account_type}:{account_id}:{version}"
+
+
+def _marker_key(account_type, account_id):
+    return f"notif:marker:{account_type}:{account_id}"
+
+
+def _timeline_key(audience):
+    return f"notif:broadcasts:{audience}"
+
+
+def build(recipient_type, recipient_id, title, content, urgency='medium', date=None):
+    """Unsaved Notification for one account, for bulk_create; pass the saved rows to created()"""
+    return Notification(
+        title=title,
+        content=content,
+        urgency=urgency,
+        designated_to=recipient_type,
+        recipient_type=recipient_type,
+        recipient_id=int(recipient_id),
+        date=date or timezone.now()
+    )
+
+
+def _invalidate_unread(accounts):
+    """
+    Give each (account_type, account_id) a new unread-count version once the
+    current transaction commits, so its next read counts from the table.
+    """
+    keys = {_unread_version_key(account_type, account_id) for account_type, account_id in accounts}
+    if keys:
+        transaction.on_commit(
+            lambda: cache.set_many({key: uuid.uuid4().hex for key in keys}, UNREAD_CACHE_TIMEOUT)
+        )
+
+
+def created(notifications):
+    """Invalidate the recipients' unread counts once the inserts commit"""
+    _invalidate_unread((n.recipient_type, n.recipient_id) for n in notifications if n.recipient_type)
+
+
+def notify(recipient_type, recipient_id, title, content, urgency='medium', date=None):
+    """Create a notification only `recipient_type` #`recipient_id` will see"""
+    notification = build(recipient_type, recipient_id, title, content, urgency, date)
+    notification.save()
+    created([notification])
+    return notification
+
+
+def broadcast(audience, title, content, urgency='medium', date=None):
+    """
+    Create one notification for every account in `audience` ('user',
+    'merchant' or 'all'). It is stored once and merged into each feed
+    from the audience's cached timeline, never copied per recipient.
+    """
+    if audience not in BROADCAST_AUDIENCES:
+        raise ValueError(f"Unknown audience: {audience}")
+    notification = Notification.objects.create(
+        title=title,
+        content=content,
+        urgency=urgency,
+        designated_to=audience,
+        date=date or timezone.now()
+    )
+    transaction.on_commit(lambda: cache.delete(_timeline_key(audience)))
+    return notification
+
+
+def broadcast_timeline(audience):
+    """Newest broadcasts to `audience`, newest first, cached until the next broadcast"""
+    timeline = cache.get(_timeline_key(audience))
+    if timeline is None:
+        timeline = list(Notification.objects.filter(
+            recipient_type__isnull=True, recipient_id__isnull=True, designated_to=audience
+        ).order_by('-date', '-notificationid')[:BROADCAST_TIMELINE_SIZE])
+        cache.set(_timeline_key(audience), timeline, BROADCAST_TIMELINE_TIMEOUT)
+    return timeline
+
+
+def _newest_first(notification):
+    return (notification.date, notification.notificationid)
+
+
+def feed(account_type, account_id, limit):
+    """
+    Newest `limit` notifications for an account: its own rows (a range
+    scan on idx_notif_recipient) merged with the cached broadcast
+    timelines for its account type and for everyone.
+    """
+    targeted = Notification.objects.filter(
+        recipient_type=account_type, recipient_id=account_id
+    ).order_by('-date', '-notificationid')[:limit]
+    merged = heapq.merge(
+        list(targeted), broadcast_timeline(account_type), broadcast_timeline('all'),
+        key=_newest_first, reverse=True
+    )
+    return list(islice(merged, limit))
+
+
+def _broadcast_ids(audience):
+    """Ids in the audience's broadcast timeline, ascending"""
+    return sorted(notification.notificationid for notification in broadcast_timeline(audience))
+
+
+def read_marker(account_type, account_id):
+    """Highest notification id the account has marked read (0 if never)"""
+    marker = cache.get(_marker_key(account_type, account_id))
+    if marker is None:
+        marker = NotificationReadMarker.objects.filter(
+            account_type=account_type, account_id=account_id
+        ).values_list('last_read_id', flat=True).first() or 0
+        cache.set(_marker_key(account_type, account_id), marker, UNREAD_CACHE_TIMEOUT)
+    return marker
+
+
+def unread_count(account_type, account_id):
+    """
+    Unread notifications for an account, served from cache: a count of
+    its own unread rows, plus the broadcasts newer than its read marker.
+    The count is stored under the account's current version, which
+    notify()/created()/mark_read() replace after committing. A count taken
+    while a new notification was committing is stored under the old
+    version and never read, so it cannot stay too low.
+    """
+    version_key = _unread_version_key(account_type, account_id)
+    marker_key = _marker_key(account_type, account_id)
+    cached = cache.get_many([version_key, marker_key])
+    marker = cached.get(marker_key)
+    if marker is None:
+        marker = read_marker(account_type, account_id)
+
+    version = cached.get(version_key)
+    if version is None:
+        cache.add(version_key, uuid.uuid4().hex, UNREAD_CACHE_TIMEOUT)
+        version = cache.get(version_key)
+
+    targeted = cache.get(_unread_key(account_type, account_id, version)) if version else None
+    if targeted is None:
+        targeted = Notification.objects.filter(
+            recipient_type=account_type, recipient_id=account_id, notificationid__gt=marker
+        ).count()
+        if version:
+            cache.add(_unread_key(account_type, account_id, version), targeted, UNREAD_CACHE_TIMEOUT)
+
+    broadcasts = 0
+    for audience in (account_type, 'all'):
+        ids = _broadcast_ids(audience)
+        broadcasts += len(ids) - bisect_right(ids, marker)
+    return targeted + broadcasts
+
+
+def forget_cached(rows):
+    """Drop cached counters and timelines that may include these (now removed) rows"""
+    _invalidate_unread((row['recipient_type'], row['recipient_id']) for row in rows if row['recipient_type'])
+    keys = {_timeline_key(row['designated_to']) for row in rows if not row['recipient_type']}
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(list(keys)))
+
+
+def mark_read(account_type, account_id, last_id=None):
+    """
+    Move the account's read marker up to `last_id` (default: everything so
+    far). Markers never move backwards. Returns the marker now stored.
+    """
+    if last_id is None:
+        last_id = Notification.objects.aggregate(last_id=Max('notificationid'))['last_id'] or 0
+
+    with transaction.atomic():
+        marker, _ = NotificationReadMarker.objects.select_for_update().get_or_create(
+            account_type=account_type, account_id=account_id
+        )
+        if last_id > marker.last_read_id:
+            marker.last_read_id = last_id
+            marker.save(update_fields=['last_read_id', 'updated_at'])
+            Notification.objects.filter(
+                recipient_type=account_type, recipient_id=account_id,
+                read_at__isnull=True, notificationid__lte=last_id
+            ).update(read_at=timezone.now())
+
+        _invalidate_unread([(account_type, account_id)])
+        marker_key = _marker_key(account_type, account_id)
+        transaction.on_commit(lambda: cache.delete(marker_key))
+    return marker.last_read_id
@@ -0,0 +1,123 @@
+import asyncio
+import json
+import threading
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+# Events a slow subscriber may have queued before it is told to resync
+SUBSCRIBER_QUEUE_SIZE = 100
+
+
+class Subscription:
+    """One open stream listening to a merchant's order events"""
+
+    def __init__(self, merchant_id):
+        self.merchant_id = merchant_id
+        self.loop = asyncio.get_running_loop()
+        self.queue = asyncio.Queue(maxsize=SUBSCRIBER_QUEUE_SIZE)
+        self.overflowed = False
+
+    def deliver(self, event):
+        # Runs on the subscriber's event loop
+        if self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # Too far behind: drop the backlog and ask the client to refetch
+            self.overflowed = True
+            while not self.queue.empty():
+                self.queue.get_nowait()
+            self.queue.put_nowait({'type': 'resync', 'merchant_id': self.merchant_id})
+
+    async def get(self):
+        event = await self.queue.get()
+        if event.get('type') == 'resync':
+            self.overflowed = False
+        return event
+
+
+class InProcessBroker:
+    """
+    Delivers events to subscribers in this process only.
+    publish() can be called from any thread (sync views run in a thread
+    pool under ASGI); delivery hops onto each subscriber's event loop.
+    Set ORDER_EVENTS_BROKER to a Redis/etc. backed class with the same
+    subscribe/unsubscribe/publish methods when running several processes.
+    """
+
+    def __init__(self):
+        self.subscribers = {}
+        self.lock = threading.Lock()
+
+    def subscribe(self, merchant_id):
+        subscription = Subscription(merchant_id)
+        with self.lock:
+            self.subscribers.setdefault(merchant_id, set()).add(subscription)
+        return subscription
+
+    def unsubscribe(self, subscription):
+        with self.lock:
+            subscriptions = self.subscribers.get(subscription.merchant_id)
+            if subscriptions:
+                subscriptions.discard(subscription)
+                if not subscriptions:
+                    del self.subscribers[subscription.merchant_id]
+
+    def publish(self, merchant_id, event):
+        with self.lock:
+            subscriptions = list(self.subscribers.get(merchant_id, ()))
+        for subscription in subscriptions:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription.deliver, event)
+            except RuntimeError:
+                # Loop already closed, the stream is going away
+                self.unsubscribe(subscription)
+
+
+_broker = None
+_broker_lock = threading.Lock()
+
+def get_broker():
+    global _broker
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker_path = getattr(settings, 'ORDER_EVENTS_BROKER', 'api.order_events.InProcessBroker')
+                _broker = import_string(broker_path)()
+    return _broker
+
+
+def order_delta(order, event_type):
+    """The part of an order a merchant screen needs to update its list in place"""
+    return {
+        'type': event_type,
+        'order_id': order.orderid,
+        'order_number': order.order_number,
+        'merchant_id': order.merchant_id,
+        'order_status': order.status,
+        'is_paid': order.is_paid,
+        'customer_name': order.customer_name,
+        'customer_id': order.customer_id,
+        'table_name': order.table_name or '',
+        'total_amount': float(order.total_amount),
+        'items': order.get_items_list() if event_type == 'order_created' else None,
+        'date': timezone.now().isoformat(),
+    }
+
+
+def publish_order_event(order, event_type):
+    """
+    Push an order change to the merchant's open streams once the
+    surrounding DB transaction commits (immediately outside one).
+    """
+    event = order_delta(order, event_type)
+    merchant_id = int(order.merchant_id)
+    transaction.on_commit(lambda: get_broker().publish(merchant_id, event))
+
+
+def format_sse(event):
+    return f"event: {event['type']}\ndata: {json.dumps(event)}\n\n"
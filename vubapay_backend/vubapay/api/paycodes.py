@@ -0,0 +1,228 @@
+import datetime
+import threading
+
+from django.core.cache import cache
+from django.db import IntegrityError, connection, transaction
+
+from .models import User, Merchant
+from .utils import generate_user_paycode, generate_merchant_paycode
+
+# Prefixes handed out by api.utils
+USER_PAYCODE_PREFIX = 'UP'
+MERCHANT_PAYCODE_PREFIX = 'MP'
+
+# Found paycodes are cached this long; profile changes invalidate them sooner
+PAYCODE_CACHE_TIMEOUT = 10 * 60
+# Misses are cached briefly so keystroke lookups of partial codes stay cheap
+PAYCODE_MISS_TIMEOUT = 30
+_MISS = 'missing'
+
+
+def paycode_account_type(paycode):
+    """'user' or 'merchant' from the paycode prefix, None for legacy codes without one"""
+    if paycode.startswith(USER_PAYCODE_PREFIX):
+        return 'user'
+    if paycode.startswith(MERCHANT_PAYCODE_PREFIX):
+        return 'merchant'
+    return None
+
+
+def candidate_types(paycode):
+    """Account tables a paycode can live in, most likely first"""
+    account_type = paycode_account_type(paycode)
+    return (account_type,) if account_type else ('user', 'merchant')
+
+
+def _cache_key(paycode):
+    return f"paycode:{paycode}"
+
+
+def _user_entry(user):
+    return {
+        'type': 'user',
+        'id': user.userid,
+        'username': user.username,
+        'email': user.email,
+        'phone': user.phonenumber,
+        'paycode': user.paycode,
+        'profile_picture': user.profilepicture.url if user.profilepicture else None,
+    }
+
+
+def _merchant_entry(merchant):
+    return {
+        'type': 'merchant',
+        'id': merchant.merchantid,
+        'username': merchant.username,
+        'email': merchant.email,
+        'phone': merchant.phonenumber,
+        'paycode': merchant.merchantpaycode,
+        'business_type': merchant.businesstype,
+        'profile_picture': merchant.profilepicture.url if merchant.profilepicture else None,
+    }
+
+
+def _load(paycode):
+    for account_type in candidate_types(paycode):
+        if account_type == 'user':
+            user = User.objects.filter(paycode=paycode).first()
+            if user:
+                return _user_entry(user)
+        else:
+            merchant = Merchant.objects.filter(merchantpaycode=paycode).first()
+            if merchant:
+                return _merchant_entry(merchant)
+    return None
+
+
+def lookup(paycode):
+    """
+    Public details of the account owning `paycode` (type, id, username,
+    email, phone, paycode, profile_picture), or None. The prefix routes
+    the query to the right table and results are cached by paycode.
+    Balances and PINs are never cached, payments must read the locked rows.
+    """
+    paycode = paycode.strip()
+    if not paycode:
+        return None
+
+    entry = cache.get(_cache_key(paycode))
+    if entry is None:
+        entry = _load(paycode)
+        if entry is None:
+            cache.set(_cache_key(paycode), _MISS, PAYCODE_MISS_TIMEOUT)
+        else:
+            cache.set(_cache_key(paycode), entry, PAYCODE_CACHE_TIMEOUT)
+    return None if entry == _MISS else entry
+
+
+def invalidate(*paycodes):
+    """Forget cached lookups once the current DB transaction commits"""
+    keys = [_cache_key(paycode) for paycode in paycodes if paycode]
+    if keys:
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+class PaycodeAllocator:
+    """
+    Hands out paycodes that were checked against the database in blocks,
+    so registration never draws a code that is already taken.
+    Codes come from an in-process pool; when it runs low a background
+    thread verifies the next block with a single IN query.
+    Pooled codes can be taken by another process while they wait, so
+    create_account() checks a code again before using it; the DB unique
+    index still catches the remaining race.
+    `generation` names what the generated codes depend on (the year for
+    merchant codes): when it changes the pool is thrown away.
+    """
+
+    def __init__(self, model, field, generate, block_size=200, low_water=50, generation=None):
+        self.model = model
+        self.field = field
+        self.generate = generate
+        self.block_size = block_size
+        self.low_water = low_water
+        self.generation = generation or (lambda: None)
+        self.pool = []
+        self.pool_generation = self.generation()
+        self.lock = threading.Lock()
+        self.refilling = False
+
+    def _check_generation(self):
+        """Drop pooled codes made for a past generation; call with the lock held"""
+        current = self.generation()
+        if current != self.pool_generation:
+            self.pool = []
+            self.pool_generation = current
+
+    def _fresh_block(self, size=None):
+        """A block of random codes none of which exist yet"""
+        candidates = {self.generate() for _ in range(size or self.block_size)}
+        return list(candidates - self._taken(candidates))
+
+    def _taken(self, codes):
+        return set(
+            self.model.objects.filter(**{f'{self.field}__in': codes})
+            .values_list(self.field, flat=True)
+        )
+
+    def _refill_in_background(self):
+        try:
+            generation = self.generation()
+            block = self._fresh_block()
+            with self.lock:
+                self._check_generation()
+                if generation == self.pool_generation:
+                    self.pool.extend(code for code in block if code not in self.pool)
+        finally:
+            self.refilling = False
+            connection.close()
+
+    def allocate(self):
+        with self.lock:
+            self._check_generation()
+            while not self.pool:
+                self.pool.extend(self._fresh_block())
+            code = self.pool.pop()
+            if len(self.pool) < self.low_water and not self.refilling:
+                self.refilling = True
+                threading.Thread(target=self._refill_in_background, daemon=True).start()
+        return code
+
+    def is_free(self, code):
+        return not self.model.objects.filter(**{self.field: code}).exists()
+
+    def allocate_many(self, count):
+        """`count` unused codes at once, for bulk imports; pooled codes are checked again"""
+        codes = []
+        with self.lock:
+            self._check_generation()
+            while len(codes) < count:
+                if not self.pool:
+                    self.pool.extend(self._fresh_block(max(self.block_size, count - len(codes))))
+                take = min(count - len(codes), len(self.pool))
+                block = self.pool[-take:]
+                del self.pool[-take:]
+                taken = self._taken(block)
+                codes.extend(code for code in block if code not in taken)
+        return codes
+
+
+ALLOCATORS = {
+    'user': PaycodeAllocator(User, 'paycode', generate_user_paycode),
+    # Merchant codes embed the year, see api.utils.generate_merchant_paycode
+    'merchant': PaycodeAllocator(Merchant, 'merchantpaycode', generate_merchant_paycode,
+                                 generation=lambda: datetime.datetime.now().year),
+}
+
+# Attempts before giving up when fresh codes keep colliding with other processes
+CREATE_ATTEMPTS = 5
+
+
+def allocate(account_type):
+    return ALLOCATORS[account_type].allocate()
+
+
+def create_account(account_type, **fields):
+    """
+    Create a User or Merchant with a newly allocated paycode. The pooled
+    code is checked again first, since another process may have used it
+    while it waited; a concurrent registration taking it after the check
+    is caught by the unique index and retried with another code.
+    """
+    allocator = ALLOCATORS[account_type]
+    for attempt in range(CREATE_ATTEMPTS):
+        fields[allocator.field] = allocator.allocate()
+        if not allocator.is_free(fields[allocator.field]):
+            continue
+        try:
+            with transaction.atomic():
+                account = allocator.model.objects.create(**fields)
+        except IntegrityError:
+            # Another unique column (email, username...) may be the culprit
+            if not allocator.model.objects.filter(**{allocator.field: fields[allocator.field]}).exists():
+                raise
+            continue
+        invalidate(fields[allocator.field])
+        return account
+    raise IntegrityError(f"Could not allocate a unique {account_type} paycode")
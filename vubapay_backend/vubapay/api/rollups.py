@@ -0,0 +1,182 @@
+from datetime import datetime, time
+from decimal import Decimal
+
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import Count, F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import DailyRollup, MerchantDailyRollup, OrderStatusRollup, Order, Transaction
+
+# MySQL deadlock and lock wait timeout; the rollup transaction is simply run again
+RETRY_ERRORS = (1213, 1205)
+APPLY_ATTEMPTS = 3
+
+
+def _bump(model, keys, **increments):
+    """Add `increments` to the rollup row identified by `keys`, creating it on first use"""
+    increments = {field: value for field, value in increments.items() if value}
+    if not increments:
+        return
+    updates = {field: F(field) + value for field, value in increments.items()}
+    if model.objects.filter(**keys).update(**updates):
+        return
+    try:
+        with transaction.atomic():
+            model.objects.create(**keys, **increments)
+    except IntegrityError:
+        # Another request created the row first
+        model.objects.filter(**keys).update(**updates)
+
+
+def _apply(bumps):
+    """
+    Apply a list of (model, keys, increments) in one short transaction of
+    its own. Rows are always locked in the same order, so two requests
+    touching the same rows (e.g. opposite status changes) cannot deadlock
+    each other; a deadlock with anything else is retried.
+    """
+    bumps = sorted(bumps, key=lambda bump: (bump[0]._meta.db_table, sorted(bump[1].items())))
+    for attempt in range(APPLY_ATTEMPTS):
+        try:
+            with transaction.atomic():
+                for model, keys, increments in bumps:
+                    _bump(model, keys, **increments)
+            return
+        except OperationalError as e:
+            if e.args and e.args[0] in RETRY_ERRORS and attempt + 1 < APPLY_ATTEMPTS:
+                continue
+            print(f"⚠️ Rollup update failed, run rebuild_rollups to correct it: {e}")
+            return
+        except Exception as e:
+            print(f"⚠️ Rollup update failed, run rebuild_rollups to correct it: {e}")
+            return
+
+
+def _record(*bumps):
+    """
+    Queue counter changes until the caller's transaction commits. Payments
+    then never wait on the shared per-day rollup rows while they hold
+    account locks, and a rolled back payment is never counted. A failed
+    update only leaves the rollups behind until the next rebuild.
+    """
+    bumps = list(bumps)
+    transaction.on_commit(lambda: _apply(bumps))
+
+
+def _day(moment):
+    return timezone.localdate(moment) if moment else timezone.localdate()
+
+
+def record_transaction(trans):
+    """Count a completed Transaction towards the day's and the receiving merchant's totals"""
+    day = _day(trans.date)
+    bumps = [(DailyRollup, {'day': day}, {'revenue': trans.amount, 'charges': trans.charge, 'transaction_count': 1})]
+    if trans.receiver_type == 'merchant':
+        bumps.append((MerchantDailyRollup, {'merchant_id': trans.receiverid, 'day': day},
+                      {'revenue': trans.amount, 'transaction_count': 1}))
+    _record(*bumps)
+
+
+def record_order_created(order):
+    day = _day(order.created_at)
+    _record(
+        (DailyRollup, {'day': day}, {'orders_created': 1}),
+        (MerchantDailyRollup, {'merchant_id': order.merchant_id, 'day': day}, {'orders_created': 1}),
+        (OrderStatusRollup, {'merchant_id': order.merchant_id, 'status': order.status}, {'count': 1}),
+    )
+
+
+def record_order_paid(order):
+    day = _day(order.payment_date)
+    paid = {'orders_paid': 1, 'order_revenue': order.total_amount, 'tips': Decimal(str(order.tip_amount or 0))}
+    _record(
+        (DailyRollup, {'day': day}, paid),
+        (MerchantDailyRollup, {'merchant_id': order.merchant_id, 'day': day}, paid),
+    )
+
+
+def record_status_change(order, old_status, new_status):
+    if old_status == new_status:
+        return
+    _record(
+        (OrderStatusRollup, {'merchant_id': order.merchant_id, 'status': old_status}, {'count': -1}),
+        (OrderStatusRollup, {'merchant_id': order.merchant_id, 'status': new_status}, {'count': 1}),
+    )
+
+
+def record_order_deleted(order):
+    _record((OrderStatusRollup, {'merchant_id': order.merchant_id, 'status': order.status}, {'count': -1}))
+
+
+def rebuild(since=None):
+    """
+    Recompute the rollups from transaction and orders with a few GROUP BY
+    queries, replacing what is stored. With `since`, only days from that
+    date on are rebuilt (status counts are always rebuilt in full).
+    Payments made while it runs can be missed, run it when traffic is low.
+    """
+    transactions = Transaction.objects.all()
+    orders = Order.objects.all()
+    paid_orders = Order.objects.filter(is_paid=True, payment_date__isnull=False)
+    if since:
+        start = timezone.make_aware(datetime.combine(since, time.min), timezone.get_current_timezone())
+        transactions = transactions.filter(date__gte=start)
+        orders = orders.filter(created_at__gte=start)
+        paid_orders = paid_orders.filter(payment_date__gte=start)
+
+    daily = {}
+    merchant_daily = {}
+
+    def daily_row(day):
+        return daily.setdefault(day, DailyRollup(day=day))
+
+    def merchant_row(merchant_id, day):
+        return merchant_daily.setdefault((merchant_id, day), MerchantDailyRollup(merchant_id=merchant_id, day=day))
+
+    by_day = (transactions.annotate(day=TruncDate('date')).values('day')
+              .annotate(revenue=Sum('amount'), charges=Sum('charge'), count=Count('transactionid')))
+    for row in by_day:
+        rollup = daily_row(row['day'])
+        rollup.revenue, rollup.charges, rollup.transaction_count = row['revenue'], row['charges'], row['count']
+
+    received = (transactions.filter(receiver_type='merchant').annotate(day=TruncDate('date'))
+                .values('receiverid', 'day').annotate(revenue=Sum('amount'), count=Count('transactionid')))
+    for row in received:
+        rollup = merchant_row(row['receiverid'], row['day'])
+        rollup.revenue, rollup.transaction_count = row['revenue'], row['count']
+
+    created = (orders.annotate(day=TruncDate('created_at'))
+               .values('merchant_id', 'day').annotate(count=Count('orderid')))
+    for row in created:
+        daily_row(row['day']).orders_created += row['count']
+        merchant_row(row['merchant_id'], row['day']).orders_created = row['count']
+
+    paid = (paid_orders.annotate(day=TruncDate('payment_date'))
+            .values('merchant_id', 'day')
+            .annotate(count=Count('orderid'), amount=Sum('total_amount'), tips=Sum('tip_amount')))
+    for row in paid:
+        for rollup in (daily_row(row['day']), merchant_row(row['merchant_id'], row['day'])):
+            rollup.orders_paid += row['count']
+            rollup.order_revenue += row['amount'] or 0
+            rollup.tips += row['tips'] or 0
+
+    statuses = [
+        OrderStatusRollup(merchant_id=row['merchant_id'], status=row['status'], count=row['count'])
+        for row in Order.objects.values('merchant_id', 'status').annotate(count=Count('orderid'))
+    ]
+
+    with transaction.atomic():
+        if since:
+            DailyRollup.objects.filter(day__gte=since).delete()
+            MerchantDailyRollup.objects.filter(day__gte=since).delete()
+        else:
+            DailyRollup.objects.all().delete()
+            MerchantDailyRollup.objects.all().delete()
+        OrderStatusRollup.objects.all().delete()
+
+        DailyRollup.objects.bulk_create(daily.values(), batch_size=1000)
+        MerchantDailyRollup.objects.bulk_create(merchant_daily.values(), batch_size=1000)
+        OrderStatusRollup.objects.bulk_create(statuses, batch_size=1000)
+
+    return {'days': len(daily), 'merchant_days': len(merchant_daily), 'statuses': len(statuses)}
@@ -4,11 +4,12 @@ from .models import Order
 import json
 
 class MenuSerializer(serializers.ModelSerializer):
-    productname = serializers.CharField(source='productid.productname', read_only=True)
-    price = serializers.DecimalField(source='productid.price', max_digits=10, decimal_places=2, read_only=True)
-    amountinstock = serializers.IntegerField(source='productid.amountinstock', read_only=True)
-    category = serializers.CharField(source='productid.category', read_only=True)
-    productpicture = serializers.CharField(source='productid.productpicture', read_only=True)
+    # Filled from Menu.objects.with_product() annotations
+    productname = serializers.CharField(read_only=True)
+    price = serializers.DecimalField(max_digits=10, decimal_places=2, read_only=True)
+    amountinstock = serializers.IntegerField(read_only=True)
+    category = serializers.CharField(read_only=True)
+    productpicture = serializers.CharField(read_only=True)
     
     class Meta:
         model = Menu
@@ -0,0 +1,117 @@
+from decimal import Decimal
+
+from django.db import transaction
+from django.utils import timezone
+
+from . import ledger, notifications, rollups
+from .models import Merchant, Order, Sales, Notification
+from .order_events import publish_order_event
+
+
+def _sales_rows(order, now):
+    """One Sales row per order line"""
+    return [
+        Sales(
+            merchantid=order.merchant_id,
+            productname=item.get('productname', 'Unknown'),
+            date=now,
+            amount=Decimal(str(item.get('price', 0))) * Decimal(str(item.get('quantity', 1))),
+            quantity=item.get('quantity', 1)
+        )
+        for item in order.get_items_list()
+    ]
+
+
+def _payment_notifications(order, now):
+    return [
+        notifications.build(
+            'merchant', order.merchant_id,
+            title=f"Order #{order.order_number} Paid",
+            content=f"Order #{order.order_number} has been paid by {order.customer_name}. Amount: {order.total_amount} RWF",
+            urgency="medium",
+            date=now
+        ),
+        # Also notify the customer
+        notifications.build(
+            order.customer_type, order.customer_id,
+            title="Payment Confirmation",
+            content=f"Payment for order #{order.order_number} to {order.merchant_name} has been completed.",
+            urgency="low",
+            date=now
+        ),
+    ]
+
+
+def settle_order(order_id, transaction_id, tip_amount=Decimal('0'), message=''):
+    """
+    Mark an order paid and record its sales and notifications as one unit.
+    The order row is locked and flipped with a conditional is_paid=False
+    update, so concurrent or retried calls record the sale exactly once.
+    Returns (order, settled); settled is False when it was already paid.
+    Raises Order.DoesNotExist for unknown orders.
+    """
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(orderid=order_id)
+        if order.is_paid:
+            return order, False
+
+        now = timezone.now()
+        tip_amount = Decimal(str(tip_amount))
+        updated = Order.objects.filter(orderid=order.orderid, is_paid=False).update(
+            is_paid=True,
+            payment_date=now,
+            transaction_id=transaction_id,
+            tip_amount=tip_amount,
+            customer_message=message,
+            updated_at=now
+        )
+        if not updated:
+            order.refresh_from_db()
+            return order, False
+
+        order.is_paid = True
+        order.payment_date = now
+        order.transaction_id = transaction_id
+        order.tip_amount = tip_amount
+        order.customer_message = message
+        order.updated_at = now
+
+        Sales.objects.bulk_create(_sales_rows(order, now))
+        rollups.record_order_paid(order)
+        notifications.created(Notification.objects.bulk_create(_payment_notifications(order, now)))
+        publish_order_event(order, 'order_paid')
+
+    return order, True
+
+
+def pay_order(order_id, sender_paycode, pin, tip_amount=Decimal('0'), message=''):
+    """
+    Charge the customer (order total + tip) and settle the order in a single
+    DB transaction, so money never moves without the order being marked paid.
+    The order row is locked first, which makes the order id the idempotency
+    key: a retried call finds the order paid and charges nothing.
+    Returns (order, transfer_result); transfer_result is None when the order
+    was already paid. Raises Order.DoesNotExist or a ledger.LedgerError.
+    """
+    tip_amount = Decimal(str(tip_amount))
+    if tip_amount < 0:
+        raise ledger.LedgerError("Tip amount cannot be negative")
+
+    with transaction.atomic():
+        order = Order.objects.select_for_update().get(orderid=order_id)
+        if order.is_paid:
+            return order, None
+        if order.status == 'cancelled':
+            raise ledger.LedgerError("Cannot pay a cancelled order")
+
+        merchant_paycode = (Merchant.objects
+                            .filter(merchantid=order.merchant_id)
+                            .values_list('merchantpaycode', flat=True)
+                            .first())
+        if not merchant_paycode:
+            raise ledger.PartyNotFound("Merchant not found")
+
+        result = ledger.transfer(sender_paycode, merchant_paycode, order.total_amount + tip_amount, pin)
+        order, _ = settle_order(order.orderid, result.transaction_id, tip_amount, message)
+
+    return order, result
@@ -0,0 +1,147 @@
+from bisect import bisect_right
+from datetime import timedelta
+
+from django.db.models import Count, DecimalField, F, IntegerField, OuterRef, Subquery, Sum, Value, Window
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import User, Merchant, Product, ExtraMenu, DailyRollup, MerchantDailyRollup, OrderStatusRollup
+
+# Dashboard figures about money and orders come from the rollup tables kept
+# by api.rollups (rebuild with `manage.py rebuild_rollups`), so they cost
+# the same however large transaction and orders grow.
+
+
+def totals():
+    """Row counts shown on the dashboard cards; orders and transactions come from the rollups"""
+    return {
+        'total_users': User.objects.count(),
+        'total_merchants': Merchant.objects.count(),
+        'total_orders': OrderStatusRollup.objects.aggregate(total=Sum('count'))['total'] or 0,
+        'total_products': Product.objects.count(),
+        'total_transactions': DailyRollup.objects.aggregate(total=Sum('transaction_count'))['total'] or 0,
+        'total_services': ExtraMenu.objects.count(),
+    }
+
+
+def activity(today=None):
+    """Order and revenue figures for today, yesterday and all time, from the daily rollup"""
+    today = today or timezone.localdate()
+    yesterday = today - timedelta(days=1)
+    recent = {row.day: row for row in DailyRollup.objects.filter(day__in=[today, yesterday])}
+    total_revenue = DailyRollup.objects.aggregate(total=Sum('revenue'))['total']
+
+    return {
+        'orders_today': recent[today].orders_created if today in recent else 0,
+        'orders_yesterday': recent[yesterday].orders_created if yesterday in recent else 0,
+        'total_revenue': total_revenue or 0,
+        'revenue_today': recent[today].revenue if today in recent else 0,
+    }
+
+
+def daily_revenue(days, today=None):
+    """
+    Transaction volume per day for the last `days` days, today first,
+    with zeros for quiet days. Reads at most `days` rollup rows.
+    """
+    today = today or timezone.localdate()
+    first_day = today - timedelta(days=days - 1)
+    by_day = dict(
+        DailyRollup.objects.filter(day__gte=first_day, day__lte=today).values_list('day', 'revenue')
+    )
+
+    series = []
+    for i in range(days):
+        day = today - timedelta(days=i)
+        series.append({
+            'date': day.isoformat(),
+            'revenue': float(by_day.get(day) or 0)
+        })
+    return series
+
+
+def top_merchants(limit=10):
+    """
+    Merchants with the most money received, highest first, each with its
+    order and product counts. A single query: the per-merchant totals are
+    correlated subqueries annotated onto Merchant, revenue and orders
+    reading the rollups instead of transaction and orders.
+    """
+    revenue = (
+        MerchantDailyRollup.objects.filter(merchant_id=OuterRef('merchantid'))
+        .values('merchant_id').annotate(total=Sum('revenue')).values('total')
+    )
+    orders = (
+        OrderStatusRollup.objects.filter(merchant_id=OuterRef('merchantid'))
+        .values('merchant_id').annotate(total=Sum('count')).values('total')
+    )
+    products = (
+        Product.objects.filter(merchantid=OuterRef('merchantid'))
+        .values('merchantid').annotate(total=Count('productid')).values('total')
+    )
+    merchants = (
+        Merchant.objects.annotate(
+            revenue=Coalesce(Subquery(revenue), Value(0), output_field=DecimalField(max_digits=16, decimal_places=2)),
+            order_count=Coalesce(Subquery(orders), Value(0), output_field=IntegerField()),
+            product_count=Coalesce(Subquery(products), Value(0), output_field=IntegerField()),
+        )
+        .order_by('-revenue', 'merchantid')
+        .values('merchantid', 'username', 'email', 'revenue', 'order_count', 'product_count')[:limit]
+    )
+    return [
+        {
+            'id': merchant['merchantid'],
+            'name': merchant['username'],
+            'email': merchant['email'],
+            'revenue': float(merchant['revenue']),
+            'orders': merchant['order_count'],
+            'products': merchant['product_count'],
+        }
+        for merchant in merchants
+    ]
+
+
+def _running_totals(model, date_field):
+    """
+    (date, accounts up to and including that date) ascending, from one
+    COUNT(*) OVER (ORDER BY date) query; peers share a date so DISTINCT
+    leaves one row per date.
+    """
+    rows = list(
+        model.objects.filter(**{f'{date_field}__isnull': False})
+        .annotate(running=Window(Count('pk'), order_by=F(date_field).asc()))
+        .values_list(date_field, 'running')
+        .distinct()
+        .order_by(date_field)
+    )
+    return [row[0] for row in rows], [row[1] for row in rows]
+
+
+def _total_on(running, day):
+    dates, totals_so_far = running
+    position = bisect_right(dates, day)
+    return totals_so_far[position - 1] if position else 0
+
+
+def user_growth(days, today=None):
+    """Cumulative users and merchants on each of the last `days` days, today first"""
+    today = today or timezone.localdate()
+    users = _running_totals(User, 'dateofbirth')
+    merchants = _running_totals(Merchant, 'dateofcreation')
+
+    growth = []
+    for i in range(days):
+        day = today - timedelta(days=i)
+        growth.append({
+            'date': day.isoformat(),
+            'users': _total_on(users, day),
+            'merchants': _total_on(merchants, day),
+        })
+    return growth
+
+
+def order_status_counts():
+    return list(
+        OrderStatusRollup.objects.values('status').annotate(count=Sum('count'))
+        .filter(count__gt=0).order_by('status')
+    )
@@ -0,0 +1,28 @@
+from django.apps import apps
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class UnmanagedModelTestRunner(DiscoverRunner):
+    """
+    Most api tables come from the SQL scripts (managed = False), so the
+    test database would not have them. For the test run every api model is
+    treated as managed and its table built straight from the model.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        self.unmanaged = [model for model in apps.get_app_config('api').get_models() if not model._meta.managed]
+        for model in self.unmanaged:
+            model._meta.managed = True
+        super().setup_test_environment(**kwargs)
+
+    def setup_databases(self, **kwargs):
+        # Without migrations the tables are created from the models as they are now
+        with override_settings(MIGRATION_MODULES={**settings.MIGRATION_MODULES, 'api': None}):
+            return super().setup_databases(**kwargs)
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        for model in self.unmanaged:
+            model._meta.managed = False
@@ -1,3 +1,1421 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import tempfile
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import Q
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import (
+    account_import, admin_tables, dashboard_snapshot, ledger, menu_cache, merchant_report,
+    notification_archive, order_events, paycodes, rollups, utils,
+)
+from . import notifications as notifications_feed
+from . import stats as dashboard_stats
+from .models import (
+    User, Merchant, Order, Sales, Transaction, Product, Menu, Notification, NotificationArchive,
+    DailyRollup, MerchantDailyRollup, OrderStatusRollup, resolve_account_names,
+)
+from .settlement import settle_order
+from .utils import generate_id
+
+
+def make_user(paycode='UP12345678', balance='5000.00', pin='1234'):
+    return User.objects.create(
+        nationalid='1199880012345678', paycode=paycode, accounttype='user',
+        email=f'{paycode.lower()}@example.com', username=f'user {paycode}',
+        phonenumber='0788000000', password='x', balance=Decimal(balance), pin=pin
+    )
+
+
+def make_merchant(paycode='MP2025000001', balance='0.00', pin='4321'):
+    return Merchant.objects.create(
+        nationalid='1199880087654321', merchantpaycode=paycode, businesstype='Restaurant',
+        accounttype='merchant', email=f'{paycode.lower()}@example.com', username=f'merchant {paycode}',
+        phonenumber='0788111111', password='x', balance=Decimal(balance), pin=pin
+    )
+
+
+def make_product(merchant, name='Brochette', stock=10, price='1500', category='Food', picture=''):
+    return Product.objects.create(
+        productid=generate_id(), productname=name, productpicture=picture, amountinstock=stock,
+        price=Decimal(price), category=category, merchantid=merchant.merchantid
+    )
+
+
+def make_transaction(sender, receiver, amount='100', date=None):
+    """Transaction between two User/Merchant rows; `date` overrides auto_now_add"""
+    sender_type = 'merchant' if isinstance(sender, Merchant) else 'user'
+    receiver_type = 'merchant' if isinstance(receiver, Merchant) else 'user'
+    trans = Transaction.objects.create(
+        transactionid=generate_id(), senderid=sender.pk, sender_type=sender_type,
+        receiverid=receiver.pk, receiver_type=receiver_type, amount=Decimal(amount), charge=Decimal('20')
+    )
+    if date is not None:
+        Transaction.objects.filter(pk=trans.pk).update(date=date)
+        trans.date = date
+    return trans
+
+
+def make_order(user, merchant, items, total, is_paid=False):
+    return Order.objects.create(
+        orderid=generate_id(), order_number=f'ORD{generate_id() % 10 ** 12}',
+        customer_id=user.userid, customer_type='user', customer_name=user.username,
+        merchant_id=merchant.merchantid, merchant_name=merchant.username,
+        items=items, total_amount=Decimal(total), is_paid=is_paid
+    )
+
+
+class TransferTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.sender = make_user('UP10000001', balance='1000.00')
+        self.receiver = make_user('UP10000002', balance='0.00')
+
+    def test_insufficient_balance_moves_nothing(self):
+        # 1000 + the 20 charge is more than the sender has
+        with self.assertRaises(ledger.InsufficientFunds):
+            ledger.transfer('UP10000001', 'UP10000002', Decimal('1000'), '1234')
+
+        self.sender.refresh_from_db()
+        self.receiver.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('1000.00'))
+        self.assertEqual(self.receiver.balance, Decimal('0.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_transfer_to_self_is_rejected(self):
+        with self.assertRaisesMessage(ledger.LedgerError, "Cannot send money to yourself"):
+            ledger.transfer('UP10000001', 'UP10000001', Decimal('100'), '1234')
+
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('1000.00'))
+        self.assertFalse(Transaction.objects.exists())
+
+    def test_transfer_moves_amount_and_charge(self):
+        result = ledger.transfer('UP10000001', 'UP10000002', Decimal('100'), '1234')
+
+        self.sender.refresh_from_db()
+        self.receiver.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('880.00'))
+        self.assertEqual(self.receiver.balance, Decimal('100.00'))
+        self.assertEqual(result.sender_balance, Decimal('880.00'))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+
+class SettleOrderTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.merchant = make_merchant()
+        self.order = make_order(self.user, self.merchant, [
+            {'productid': 1, 'productname': 'Brochette', 'price': 1500, 'quantity': 2},
+            {'productid': 2, 'productname': 'Fanta', 'price': 800, 'quantity': 1},
+        ], '3800')
+
+    def test_settling_twice_records_sales_once(self):
+        order, settled = settle_order(self.order.orderid, generate_id())
+        self.assertTrue(settled)
+        self.assertTrue(order.is_paid)
+        self.assertEqual(Sales.objects.filter(merchantid=self.merchant.merchantid).count(), 2)
+
+        order, settled = settle_order(self.order.orderid, generate_id())
+        self.assertFalse(settled)
+        self.assertEqual(Sales.objects.filter(merchantid=self.merchant.merchantid).count(), 2)
+
+    def test_already_paid_order_records_no_sales(self):
+        paid = make_order(self.user, self.merchant, [
+            {'productid': 1, 'productname': 'Brochette', 'price': 1500, 'quantity': 1},
+        ], '1500', is_paid=True)
+
+        _, settled = settle_order(paid.orderid, generate_id())
+        self.assertFalse(settled)
+        self.assertFalse(Sales.objects.exists())
+
+
+class IdempotentPaymentTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.sender = make_user('UP10000001', balance='1000.00')
+        self.receiver = make_user('UP10000002', balance='0.00')
+        self.payment = {
+            'sender_paycode': 'UP10000001', 'receiver_paycode': 'UP10000002', 'pin': '1234', 'amount': '100'
+        }
+
+    def pay(self, key, payment=None):
+        return self.client.post('/api/process-payment/', payment or self.payment,
+                                content_type='application/json', HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_replay_returns_first_response_without_paying_again(self):
+        first = self.pay('pay-1')
+        second = self.pay('pay-1')
+
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(second['Idempotent-Replayed'], 'true')
+        self.assertEqual(second.json()['transaction_id'], first.json()['transaction_id'])
+
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('880.00'))
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_key_reused_for_another_request_is_rejected(self):
+        self.pay('pay-1')
+        response = self.pay('pay-1', {**self.payment, 'amount': '200'})
+
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Transaction.objects.count(), 1)
+
+    def test_different_keys_pay_twice(self):
+        self.pay('pay-1')
+        self.pay('pay-2')
+
+        self.sender.refresh_from_db()
+        self.assertEqual(self.sender.balance, Decimal('760.00'))
+        self.assertEqual(Transaction.objects.count(), 2)
+
+
+class CreateOrderStockTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.merchant = make_merchant()
+        self.product = Product.objects.create(
+            productid=generate_id(), productname='Brochette', productpicture='', amountinstock=3,
+            price=Decimal('1500'), category='Food', merchantid=self.merchant.merchantid
+        )
+        Menu.objects.create(merchantid=self.merchant.merchantid, productid=self.product.productid, availability=True)
+
+    def create_order(self, order_number, quantity, total=None):
+        return self.client.post('/api/create-order/', {
+            'order_number': order_number,
+            'customer_id': self.user.userid,
+            'customer_type': 'user',
+            'customer_name': self.user.username,
+            'merchant_id': self.merchant.merchantid,
+            'merchant_name': self.merchant.username,
+            'items': [{'productid': self.product.productid, 'productname': 'Brochette',
+                       'price': 1500, 'quantity': quantity}],
+            'total_amount': total if total is not None else 1500 * quantity,
+        }, content_type='application/json')
+
+    def test_order_takes_stock_and_sells_out_menu(self):
+        response = self.create_order('ORD1', 3)
+
+        self.assertEqual(response.status_code, 201)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amountinstock, 0)
+        self.assertFalse(Menu.objects.get(productid=self.product.productid).availability)
+
+    def test_out_of_stock_returns_409_and_keeps_nothing(self):
+        self.create_order('ORD1', 2)
+        response = self.create_order('ORD2', 2)
+
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()['shortages'], [{'productname': 'Brochette', 'available': 1}])
+        self.assertFalse(Order.objects.filter(order_number='ORD2').exists())
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.amountinstock, 1)
+
+    def test_malformed_quantity_returns_400(self):
+        response = self.create_order('ORD1', 'two', total=3000)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Order.objects.exists())
+
+
+class IdGeneratorTests(SimpleTestCase):
+
+    def test_ids_are_unique_and_increasing(self):
+        generator = utils.IdGenerator(3)
+        ids = [generator.next_id() for _ in range(5000)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(ids, sorted(ids))
+
+    def test_worker_id_is_encoded(self):
+        first = utils.IdGenerator(1).next_id()
+        second = utils.IdGenerator(2).next_id()
+        self.assertEqual((first >> utils.SEQUENCE_BITS) & utils.MAX_WORKER_ID, 1)
+        self.assertEqual((second >> utils.SEQUENCE_BITS) & utils.MAX_WORKER_ID, 2)
+
+    def test_full_millisecond_waits_for_the_next(self):
+        generator = utils.IdGenerator(0)
+        # 128 ids fit in ms 1000, the 129th has to move on to ms 1001
+        clock = iter([1000] * (utils.MAX_SEQUENCE + 2) + [1000, 1001])
+        with mock.patch.object(generator, '_now_ms', side_effect=lambda: next(clock)):
+            ids = [generator.next_id() for _ in range(utils.MAX_SEQUENCE + 2)]
+        self.assertEqual(len(set(ids)), len(ids))
+        self.assertEqual(generator.last_ms, 1001)
+
+    def test_clock_going_backwards_does_not_repeat_ids(self):
+        generator = utils.IdGenerator(0)
+        clock = iter([2000, 1500, 1500])
+        with mock.patch.object(generator, '_now_ms', side_effect=lambda: next(clock)):
+            ids = [generator.next_id() for _ in range(3)]
+        self.assertEqual(ids, sorted(set(ids)))
+
+    def test_out_of_range_worker_id_is_rejected(self):
+        with self.assertRaises(ValueError):
+            utils.IdGenerator(utils.MAX_WORKER_ID + 1)
+
+
+class WorkerIdTests(SimpleTestCase):
+
+    def test_environment_variable_wins(self):
+        with mock.patch.dict(os.environ, {'VUBAPAY_WORKER_ID': '7'}):
+            self.assertEqual(utils._default_worker_id(), 7)
+
+    def test_leases_give_processes_distinct_ids(self):
+        with tempfile.TemporaryDirectory() as lock_dir, \
+                mock.patch.dict(os.environ, {'VUBAPAY_WORKER_LOCK_DIR': lock_dir}), \
+                mock.patch.object(utils, '_worker_lease', None):
+            first = utils._lease_worker_id()
+            first_lease = utils._worker_lease
+            second = utils._lease_worker_id()
+            second_lease = utils._worker_lease
+            self.assertNotEqual(first, second)
+
+            # A released id is handed out again
+            first_lease.close()
+            self.assertEqual(utils._lease_worker_id(), first)
+            utils._worker_lease.close()
+            second_lease.close()
+
+
+class CounterpartyNameTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('UP10000001')
+        self.friends = [make_user(f'UP2000000{i}') for i in range(5)]
+        self.merchants = [make_merchant(f'MP202500000{i}') for i in range(5)]
+
+    def test_names_resolve_with_one_query_per_table(self):
+        accounts = [('user', friend.userid) for friend in self.friends]
+        accounts += [('merchant', merchant.merchantid) for merchant in self.merchants]
+        accounts.append(('user', 999999))
+
+        with self.assertNumQueries(2):
+            names = resolve_account_names(accounts)
+
+        self.assertEqual(names[('user', self.friends[0].userid)], ('user', self.friends[0].username))
+        self.assertEqual(names[('merchant', self.merchants[0].merchantid)], ('merchant', self.merchants[0].username))
+        self.assertNotIn(('user', 999999), names)
+
+    def test_same_id_in_both_tables_keeps_its_type(self):
+        friend, merchant = self.friends[0], self.merchants[0]
+        User.objects.filter(pk=friend.pk).update(userid=50000)
+        Merchant.objects.filter(pk=merchant.pk).update(merchantid=50000)
+
+        names = resolve_account_names([('user', 50000), ('merchant', 50000)])
+
+        self.assertEqual(names[('user', 50000)], ('user', friend.username))
+        self.assertEqual(names[('merchant', 50000)], ('merchant', merchant.username))
+
+    def history_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get('/api/get-user-transactions/', {'email': self.user.email})
+        self.assertEqual(response.status_code, 200)
+        return response.json(), len(queries)
+
+    def test_history_query_count_does_not_grow_with_counterparties(self):
+        make_transaction(self.user, self.friends[0])
+        _, few = self.history_queries()
+
+        for counterparty in self.friends[1:] + self.merchants:
+            make_transaction(self.user, counterparty)
+            make_transaction(counterparty, self.user)
+        data, many = self.history_queries()
+
+        self.assertEqual(many, few)
+        other_parties = {row['other_party'] for row in data['transactions']}
+        self.assertEqual(other_parties, {account.username for account in self.friends + self.merchants})
+
+
+class TransactionHistoryPagingTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('UP10000001')
+        self.friend = make_user('UP10000002')
+        start = datetime(2026, 3, 1, 8, 0, tzinfo=dt_timezone.utc)
+        self.ids = []
+        for i in range(7):
+            # Pairs of rows share a timestamp, the cursor must still split them cleanly
+            trans = make_transaction(self.user, self.friend, date=start + timedelta(minutes=i // 2))
+            self.ids.append(trans.transactionid)
+        make_transaction(self.friend, self.user, date=start - timedelta(days=1))
+
+    def history(self, **params):
+        return self.client.get('/api/get-user-transactions/', {'email': self.user.email, **params})
+
+    def test_pages_cover_every_row_once_newest_first(self):
+        seen = []
+        cursor = None
+        while True:
+            params = {'limit': 3}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.history(**params).json()
+            self.assertLessEqual(len(data['transactions']), 3)
+            seen += [row['transaction_id'] for row in data['transactions']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(len(seen), 8)
+        self.assertEqual(len(set(seen)), 8)
+        self.assertEqual(seen[:7], sorted(self.ids, reverse=True))
+
+    def test_since_and_until_bound_the_rows(self):
+        data = self.history(since='2026-03-01T08:01:00Z', until='2026-03-01T08:03:00Z').json()
+
+        self.assertEqual(len(data['transactions']), 4)
+
+    def test_bad_limit_cursor_or_timestamp_is_rejected(self):
+        self.assertEqual(self.history(limit=0).status_code, 400)
+        self.assertEqual(self.history(limit='many').status_code, 400)
+        self.assertEqual(self.history(cursor='not-a-cursor').status_code, 400)
+        self.assertEqual(self.history(since='yesterday').status_code, 400)
+
+    def test_ndjson_stream_ends_with_the_next_cursor(self):
+        response = self.history(stream='ndjson', limit=5)
+
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        lines = [json.loads(line) for line in b''.join(response.streaming_content).decode().splitlines()]
+        rows, trailer = lines[:-1], lines[-1]
+        self.assertEqual(len(rows), 5)
+        self.assertTrue(trailer['next_cursor'])
+
+        rest = self.history(stream='ndjson', limit=5, cursor=trailer['next_cursor'])
+        lines = [json.loads(line) for line in b''.join(rest.streaming_content).decode().splitlines()]
+        self.assertEqual(len(lines) - 1, 3)
+        self.assertIsNone(lines[-1]['next_cursor'])
+
+
+class TypeAwareHistoryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('UP10000001')
+        self.friend = make_user('UP10000002')
+        self.merchant = make_merchant('MP2025000001')
+        self.shop = make_merchant('MP2025000002')
+        # A merchant whose id is also the user's id must not share its history
+        User.objects.filter(pk=self.user.pk).update(userid=60000)
+        Merchant.objects.filter(pk=self.merchant.pk).update(merchantid=60000)
+        self.user.refresh_from_db()
+        self.merchant.refresh_from_db()
+
+    def history(self, account, **params):
+        response = self.client.get('/api/get-user-transactions/', {'email': account.email, **params})
+        self.assertEqual(response.status_code, 200)
+        return [row['transaction_id'] for row in response.json()['transactions']]
+
+    def test_accounts_sharing_an_id_see_only_their_own_rows(self):
+        mine = make_transaction(self.user, self.friend)
+        theirs = make_transaction(self.merchant, self.shop)
+        to_merchant = make_transaction(self.friend, self.merchant)
+
+        self.assertEqual(self.history(self.user), [mine.transactionid])
+        self.assertEqual(set(self.history(self.merchant)), {theirs.transactionid, to_merchant.transactionid})
+
+    def test_date_filters_are_half_open_ranges(self):
+        new_year = datetime(2026, 1, 1, tzinfo=dt_timezone.utc)
+        last_of_2025 = make_transaction(self.user, self.friend, date=new_year - timedelta(seconds=1))
+        first_of_2026 = make_transaction(self.friend, self.user, date=new_year)
+
+        self.assertEqual(self.history(self.user, year=2025), [last_of_2025.transactionid])
+        self.assertEqual(self.history(self.user, year=2025, month=12, day=31), [last_of_2025.transactionid])
+        self.assertEqual(self.history(self.user, year=2025, month=12), [last_of_2025.transactionid])
+        self.assertEqual(self.history(self.user, year=2026, month=1), [first_of_2026.transactionid])
+
+    def test_invalid_date_filter_is_rejected(self):
+        response = self.client.get('/api/get-user-transactions/', {'email': self.user.email, 'year': 2026, 'month': 13})
+        self.assertEqual(response.status_code, 400)
+
+
+class MerchantMenuQueryTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.merchant = make_merchant()
+        self.products = [
+            make_product(self.merchant, f'Dish {i}', stock=i, price=f'{1000 + i}', picture=f'products/{i}.jpg')
+            for i in range(5)
+        ]
+        for product in self.products:
+            Menu.objects.create(merchantid=self.merchant.merchantid, productid=product.productid, availability=True)
+
+    def test_menu_with_products_loads_in_one_query(self):
+        with self.assertNumQueries(1):
+            rows = list(Menu.objects.filter(merchantid=self.merchant.merchantid).with_product())
+
+        by_product = {row.productid: row for row in rows}
+        product = self.products[3]
+        self.assertEqual(by_product[product.productid].productname, 'Dish 3')
+        self.assertEqual(by_product[product.productid].price, Decimal('1003'))
+        self.assertEqual(by_product[product.productid].amountinstock, 3)
+
+    def test_menu_endpoint_returns_product_fields_and_skips_deleted_products(self):
+        Product.objects.filter(productid=self.products[0].productid).delete()
+
+        response = self.client.get('/api/merchant-menu/', {'merchant_id': self.merchant.merchantid})
+
+        self.assertEqual(response.status_code, 200)
+        menu = {item['productid']: item for item in response.json()['menu']}
+        self.assertEqual(len(menu), 4)
+        self.assertNotIn(self.products[0].productid, menu)
+        self.assertEqual(menu[self.products[2].productid]['productname'], 'Dish 2')
+        self.assertEqual(menu[self.products[2].productid]['price'], 1002.0)
+        self.assertEqual(menu[self.products[2].productid]['productpicture'], '/media/products/2.jpg')
+
+
+class MenuCacheTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.merchant = make_merchant()
+        self.fries = make_product(self.merchant, 'Fries')
+        self.soda = make_product(self.merchant, 'Soda')
+        Menu.objects.create(merchantid=self.merchant.merchantid, productid=self.fries.productid, availability=True)
+
+    def menu(self, **headers):
+        return self.client.get('/api/merchant-menu/', {'merchant_id': self.merchant.merchantid}, **headers)
+
+    def test_repeat_reads_are_served_from_cache(self):
+        self.menu()
+        with self.assertNumQueries(0):
+            response = self.menu()
+        self.assertEqual(response.json()['count'], 1)
+
+    def test_client_with_current_etag_gets_304(self):
+        etag = self.menu()['ETag']
+
+        response = self.menu(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+
+    def test_menu_write_invalidates_after_commit(self):
+        etag = self.menu()['ETag']
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/add-to-menu/', {
+                'merchant_id': self.merchant.merchantid, 'product_id': self.soda.productid
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        response = self.menu(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+
+    def test_invalidation_waits_for_commit(self):
+        version = menu_cache.get_version(self.merchant.merchantid)
+
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            menu_cache.invalidate(self.merchant.merchantid)
+        self.assertEqual(menu_cache.get_version(self.merchant.merchantid), version)
+
+        for callback in callbacks:
+            callback()
+        self.assertNotEqual(menu_cache.get_version(self.merchant.merchantid), version)
+
+
+class ConditionalPollTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.merchant = make_merchant()
+        self.order = make_order(self.user, self.merchant, [
+            {'productid': 1, 'productname': 'Brochette', 'price': 1500, 'quantity': 1},
+        ], '1500')
+
+    def orders(self, **headers):
+        return self.client.get('/api/get-merchant-orders/', {'merchant_id': self.merchant.merchantid}, **headers)
+
+    def order_notifications(self, **headers):
+        return self.client.get('/api/get-merchant-order-notifications/',
+                               {'merchant_id': self.merchant.merchantid}, **headers)
+
+    def test_unchanged_orders_answer_304(self):
+        etag = self.orders()['ETag']
+
+        response = self.orders(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_change_within_the_same_second_is_not_a_304(self):
+        etag = self.orders()['ETag']
+        notifications_etag = self.order_notifications()['ETag']
+
+        # updated_at keeps its value, as it would for a second write in the same second
+        updated_at = Order.objects.get(pk=self.order.pk).updated_at
+        Order.objects.filter(pk=self.order.pk).update(status='confirmed', updated_at=updated_at)
+
+        response = self.orders(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['orders'][0]['status'], 'confirmed')
+        self.assertEqual(self.order_notifications(HTTP_IF_NONE_MATCH=notifications_etag).status_code, 200)
+
+    def test_paying_changes_the_etag(self):
+        etag = self.orders()['ETag']
+        updated_at = Order.objects.get(pk=self.order.pk).updated_at
+        Order.objects.filter(pk=self.order.pk).update(is_paid=True, updated_at=updated_at)
+
+        self.assertEqual(self.orders(HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_deleted_notification_changes_the_feed_etag(self):
+        first = notifications_feed.notify('merchant', self.merchant.merchantid, 'One', 'first')
+        notifications_feed.notify('merchant', self.merchant.merchantid, 'Two', 'second')
+        params = {'email': self.merchant.email}
+        etag = self.client.get('/api/notifications/', params)['ETag']
+        self.assertEqual(self.client.get('/api/notifications/', params, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        first.delete()
+
+        response = self.client.get('/api/notifications/', params, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['title'] for row in response.json()['notifications']], ['Two'])
+
+
+class OrderStreamTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.merchant = make_merchant()
+
+    def test_stream_refuses_wsgi(self):
+        response = self.client.get('/api/merchant-order-stream/', {'merchant_id': self.merchant.merchantid})
+        self.assertEqual(response.status_code, 501)
+
+    async def test_stream_delivers_published_events(self):
+        response = await self.async_client.get('/api/merchant-order-stream/', {'merchant_id': self.merchant.merchantid})
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+
+        stream = aiter(response.streaming_content)
+        self.assertEqual(await anext(stream), b'retry: 3000\n\n')
+        order_events.get_broker().publish(self.merchant.merchantid, {'type': 'order_paid', 'order_id': 42})
+        event = await asyncio.wait_for(anext(stream), 5)
+        await stream.aclose()
+
+        self.assertTrue(event.startswith(b'event: order_paid\n'))
+        self.assertIn(b'"order_id": 42', event)
+
+    async def test_unknown_merchant_is_404(self):
+        response = await self.async_client.get('/api/merchant-order-stream/', {'merchant_id': 999999})
+        self.assertEqual(response.status_code, 404)
+
+    def test_events_are_published_after_commit(self):
+        order = make_order(self.user, self.merchant, [], '0')
+        with mock.patch.object(order_events, 'get_broker') as get_broker:
+            with self.captureOnCommitCallbacks(execute=True):
+                order_events.publish_order_event(order, 'order_created')
+                get_broker.return_value.publish.assert_not_called()
+
+        get_broker.return_value.publish.assert_called_once()
+        merchant_id, event = get_broker.return_value.publish.call_args.args
+        self.assertEqual(merchant_id, self.merchant.merchantid)
+        self.assertEqual(event['order_id'], order.orderid)
+
+
+class OrderBrokerTests(SimpleTestCase):
+
+    async def test_slow_subscriber_is_told_to_resync(self):
+        broker = order_events.InProcessBroker()
+        subscription = broker.subscribe(7)
+        for i in range(order_events.SUBSCRIBER_QUEUE_SIZE + 5):
+            broker.publish(7, {'type': 'order_created', 'n': i})
+        # Deliveries are scheduled on the loop, let them run
+        await asyncio.sleep(0)
+
+        event = await subscription.get()
+        self.assertEqual(event['type'], 'resync')
+        self.assertTrue(subscription.queue.empty())
+
+    async def test_unsubscribed_streams_get_nothing(self):
+        broker = order_events.InProcessBroker()
+        subscription = broker.subscribe(7)
+        broker.unsubscribe(subscription)
+
+        broker.publish(7, {'type': 'order_created'})
+        await asyncio.sleep(0)
+
+        self.assertTrue(subscription.queue.empty())
+
+
+class PaycodeLookupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user('UP10000001')
+        self.merchant = make_merchant('MP2025000001')
+
+    def test_prefix_routes_to_one_table_and_result_is_cached(self):
+        with self.assertNumQueries(1):
+            entry = paycodes.lookup('UP10000001')
+        self.assertEqual((entry['type'], entry['id']), ('user', self.user.userid))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(paycodes.lookup('UP10000001'), entry)
+
+        with self.assertNumQueries(1):
+            self.assertEqual(paycodes.lookup('MP2025000001')['id'], self.merchant.merchantid)
+
+    def test_cached_entry_holds_no_balance_or_pin(self):
+        entry = paycodes.lookup('UP10000001')
+        self.assertNotIn('balance', entry)
+        self.assertNotIn('pin', entry)
+
+    def test_misses_are_cached_too(self):
+        self.assertIsNone(paycodes.lookup('UP99999999'))
+        with self.assertNumQueries(0):
+            self.assertIsNone(paycodes.lookup('UP99999999'))
+
+    def test_legacy_code_without_prefix_checks_both_tables(self):
+        Merchant.objects.filter(pk=self.merchant.pk).update(merchantpaycode='LEGACY1')
+
+        with self.assertNumQueries(2):
+            self.assertEqual(paycodes.lookup('LEGACY1')['type'], 'merchant')
+
+    def test_invalidate_drops_the_entry_after_commit(self):
+        paycodes.lookup('UP10000001')
+        User.objects.filter(pk=self.user.pk).update(username='renamed')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            paycodes.invalidate('UP10000001')
+
+        self.assertEqual(paycodes.lookup('UP10000001')['username'], 'renamed')
+
+
+class PaycodeAllocatorTests(TestCase):
+
+    def allocator(self, codes, **kwargs):
+        """Allocator drawing from `codes` in order, without background refills"""
+        codes = iter(codes)
+        return paycodes.PaycodeAllocator(User, 'paycode', lambda: next(codes), block_size=3, low_water=0, **kwargs)
+
+    def test_fresh_blocks_skip_codes_already_taken(self):
+        make_user('UP10000002')
+        allocator = self.allocator(['UP10000001', 'UP10000002', 'UP10000003'])
+
+        codes = {allocator.allocate(), allocator.allocate()}
+
+        self.assertEqual(codes, {'UP10000001', 'UP10000003'})
+
+    def test_allocate_many_checks_pooled_codes_again(self):
+        allocator = self.allocator([f'UP1000000{i}' for i in range(1, 10)])
+        allocator.allocate()
+        # Still pooled here, but another process registers with one of them
+        make_user(allocator.pool[0])
+
+        codes = allocator.allocate_many(4)
+
+        self.assertEqual(len(codes), 4)
+        self.assertEqual(len(set(codes)), 4)
+        self.assertFalse(User.objects.filter(paycode__in=codes).exists())
+
+    def test_new_generation_drops_the_pool(self):
+        year = [2025]
+        allocator = self.allocator([f'UP1000000{i}' for i in range(1, 10)], generation=lambda: year[0])
+        allocator.allocate()
+        stale = set(allocator.pool)
+
+        year[0] = 2026
+        code = allocator.allocate()
+
+        self.assertNotIn(code, stale)
+        self.assertEqual(allocator.pool_generation, 2026)
+
+    def test_create_account_skips_a_pooled_code_taken_meanwhile(self):
+        allocator = self.allocator(['UP10000001', 'UP10000002', 'UP10000003', 'UP10000004'])
+        allocator.pool = ['UP10000009', 'UP10000001']
+        make_user('UP10000001')
+
+        with mock.patch.dict(paycodes.ALLOCATORS, {'user': allocator}):
+            account = paycodes.create_account(
+                'user', nationalid='1199880012345679', accounttype='normal', email='new@example.com',
+                username='new', phonenumber='0788222222', password='x'
+            )
+
+        self.assertEqual(account.paycode, 'UP10000009')
+
+
+class AccountImportTests(TestCase):
+
+    HEADER = 'type,national_id,email,username,phone,password,pin\n'
+
+    def setUp(self):
+        cache.clear()
+        make_user('UP10000001')
+
+    def import_csv(self, body, **kwargs):
+        importer = account_import.AccountImporter(**kwargs)
+        return importer.run(account_import.read_rows(io.StringIO(self.HEADER + body)))
+
+    def test_valid_rows_go_in_and_bad_rows_are_reported_by_line(self):
+        report = self.import_csv(
+            'user,1001,ann@example.com,ann,0781000001,x,1234\n'
+            'merchant,1002,shop@example.com,shop,0781000002,x,1234\n'
+            'user,1003,,nomail,0781000003,x,1234\n'
+            'user,1004,ann@example.com,ann2,0781000004,x,1234\n'
+            'user,1005,up10000001@example.com,old,0781000005,x,1234\n'
+            'user,1006,pin@example.com,pin,0781000006,x,12ab\n',
+            chunk_size=2,
+        )
+
+        self.assertEqual((report['created_users'], report['created_merchants']), (1, 1))
+        errors = {error['line']: error['error'] for error in report['errors']}
+        self.assertEqual(set(errors), {4, 5, 6, 7})
+        self.assertIn('email', errors[4])
+        self.assertIn('email', errors[5])
+        self.assertIn('email', errors[6])
+        self.assertIn('PIN', errors[7])
+
+        ann = User.objects.get(email='ann@example.com')
+        self.assertTrue(ann.paycode.startswith(paycodes.USER_PAYCODE_PREFIX))
+        self.assertTrue(Merchant.objects.get(email='shop@example.com').merchantpaycode.startswith('MP'))
+
+    def test_imported_paycodes_are_unique(self):
+        rows = ''.join(f'user,2{i:03},u{i}@example.com,u{i},07820{i:05},x,1234\n' for i in range(50))
+        report = self.import_csv(rows, chunk_size=20)
+
+        self.assertEqual(report['created_users'], 50)
+        codes = list(User.objects.filter(email__endswith='@example.com').values_list('paycode', flat=True))
+        self.assertEqual(len(codes), len(set(codes)))
+
+    def test_dry_run_writes_nothing(self):
+        report = self.import_csv('user,1001,ann@example.com,ann,0781000001,x,1234\n', dry_run=True)
+
+        self.assertEqual(report['created_users'], 1)
+        self.assertFalse(User.objects.filter(email='ann@example.com').exists())
+
+    def test_ndjson_lines_that_are_not_objects_are_row_errors(self):
+        lines = (
+            '{"type": "user", "national_id": "1001", "email": "ann@example.com", "username": "ann",'
+            ' "phone": "0781000001", "password": "x"}\n'
+            '[1, 2]\n'
+            '"x"\n'
+            '{not json\n'
+        )
+        importer = account_import.AccountImporter()
+        report = importer.run(account_import.read_rows(io.StringIO(lines), 'ndjson'))
+
+        self.assertEqual(report['created_users'], 1)
+        self.assertEqual([error['line'] for error in report['errors']], [2, 3, 4])
+
+
+class TargetedNotificationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.merchant = make_merchant('MP2025000001')
+        self.other_merchant = make_merchant('MP2025000002')
+
+    def feed_titles(self, account):
+        response = self.client.get('/api/notifications/', {'email': account.email})
+        self.assertEqual(response.status_code, 200)
+        return [row['title'] for row in response.json()['notifications']]
+
+    def test_notify_records_the_recipient(self):
+        notification = notifications_feed.notify('merchant', self.merchant.merchantid, 'Hello', 'Just you')
+
+        notification.refresh_from_db()
+        self.assertEqual((notification.recipient_type, notification.recipient_id),
+                         ('merchant', self.merchant.merchantid))
+
+    def test_order_notification_reaches_only_its_merchant(self):
+        response = self.client.post('/api/create-order/', {
+            'order_number': 'ORD1', 'customer_id': self.user.userid, 'customer_type': 'user',
+            'customer_name': self.user.username, 'merchant_id': self.merchant.merchantid,
+            'merchant_name': self.merchant.username, 'items': [], 'total_amount': 0,
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+
+        self.assertEqual(self.feed_titles(self.merchant), ['New Order #ORD1'])
+        self.assertEqual(self.feed_titles(self.other_merchant), [])
+        self.assertEqual(self.feed_titles(self.user), [])
+
+    def test_same_id_in_the_other_table_sees_nothing(self):
+        User.objects.filter(pk=self.user.pk).update(userid=70000)
+        Merchant.objects.filter(pk=self.merchant.pk).update(merchantid=70000)
+
+        notifications_feed.notify('merchant', 70000, 'For the shop', 'merchant only')
+
+        self.assertEqual(self.feed_titles(self.merchant), ['For the shop'])
+        self.assertEqual(self.feed_titles(self.user), [])
+
+
+class UnreadCountTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.account = ('user', self.user.userid)
+
+    def notify(self, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return notifications_feed.notify('user', self.user.userid, title, title)
+
+    def test_counts_own_rows_and_broadcasts_after_the_marker(self):
+        self.notify('One')
+        second = self.notify('Two')
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications_feed.broadcast('all', 'Everyone', 'hi')
+            notifications_feed.broadcast('merchant', 'Merchants only', 'hi')
+
+        self.assertEqual(notifications_feed.unread_count(*self.account), 3)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            notifications_feed.mark_read(*self.account, last_id=second.notificationid)
+        # Only the broadcast, created after the second notification, is left
+        self.assertEqual(notifications_feed.unread_count(*self.account), 1)
+
+    def test_count_is_cached_until_a_new_notification_commits(self):
+        self.notify('One')
+        self.assertEqual(notifications_feed.unread_count(*self.account), 1)
+        with self.assertNumQueries(0):
+            self.assertEqual(notifications_feed.unread_count(*self.account), 1)
+
+        self.notify('Two')
+        self.assertEqual(notifications_feed.unread_count(*self.account), 2)
+
+    def test_count_taken_before_the_commit_is_not_served_after_it(self):
+        self.notify('One')
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            notifications_feed.notify('user', self.user.userid, 'Two', 'Two')
+        # A reader racing the commit counts without the new row and caches it
+        Notification.objects.filter(title='Two').update(recipient_id=0)
+        self.assertEqual(notifications_feed.unread_count(*self.account), 1)
+        Notification.objects.filter(title='Two').update(recipient_id=self.user.userid)
+
+        for callback in callbacks:
+            callback()
+        self.assertEqual(notifications_feed.unread_count(*self.account), 2)
+
+    def test_marker_never_moves_backwards(self):
+        first = self.notify('One')
+        second = self.notify('Two')
+
+        self.assertEqual(notifications_feed.mark_read(*self.account, last_id=second.notificationid),
+                         second.notificationid)
+        self.assertEqual(notifications_feed.mark_read(*self.account, last_id=first.notificationid),
+                         second.notificationid)
+
+    def test_mark_read_endpoint_clears_the_badge(self):
+        self.notify('One')
+        self.notify('Two')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/notifications/mark-read/', {
+                'account_type': 'user', 'account_id': self.user.userid
+            }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get('/api/notifications/unread-count/', {
+            'account_type': 'user', 'account_id': self.user.userid
+        })
+        self.assertEqual(response.json()['unread_count'], 0)
+        self.assertFalse(Notification.objects.filter(recipient_id=self.user.userid, read_at__isnull=True).exists())
+
+
+class BroadcastTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.users = [make_user(f'UP1000000{i}') for i in range(3)]
+        self.merchant = make_merchant()
+
+    def broadcast(self, audience, title):
+        with self.captureOnCommitCallbacks(execute=True):
+            return notifications_feed.broadcast(audience, title, title)
+
+    def test_broadcast_is_stored_once_and_reaches_its_audience(self):
+        self.broadcast('user', 'Users only')
+
+        self.assertEqual(Notification.objects.count(), 1)
+        for user in self.users:
+            self.assertEqual([n.title for n in notifications_feed.feed('user', user.userid, 10)], ['Users only'])
+        self.assertEqual(notifications_feed.feed('merchant', self.merchant.merchantid, 10), [])
+
+    def test_feed_merges_own_rows_and_broadcasts_newest_first(self):
+        user = self.users[0]
+        self.broadcast('all', 'First')
+        notifications_feed.notify('user', user.userid, 'Second', 'mine')
+        self.broadcast('user', 'Third')
+        # Created within the same instant, date order falls back to id order
+        Notification.objects.update(date=datetime(2026, 5, 1, tzinfo=dt_timezone.utc))
+
+        titles = [n.title for n in notifications_feed.feed('user', user.userid, 10)]
+        self.assertEqual(titles, ['Third', 'Second', 'First'])
+        self.assertEqual([n.title for n in notifications_feed.feed('user', user.userid, 2)], ['Third', 'Second'])
+
+    def test_new_broadcast_shows_up_after_commit(self):
+        self.broadcast('all', 'First')
+        self.assertEqual(len(notifications_feed.broadcast_timeline('all')), 1)
+
+        self.broadcast('all', 'Second')
+
+        self.assertEqual([n.title for n in notifications_feed.broadcast_timeline('all')], ['Second', 'First'])
+
+    def test_unknown_audience_is_rejected(self):
+        with self.assertRaises(ValueError):
+            notifications_feed.broadcast('admins', 'Nope', 'nope')
+
+
+class NotificationArchiveTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user()
+        self.old = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+
+    def notify(self, title, date=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            notification = notifications_feed.notify('user', self.user.userid, title, title)
+        if date is not None:
+            Notification.objects.filter(pk=notification.pk).update(date=date)
+        return notification
+
+    def archive(self, **kwargs):
+        with self.captureOnCommitCallbacks(execute=True):
+            return notification_archive.archive_old_notifications(days=30, log=lambda message: None, **kwargs)
+
+    def test_old_rows_move_to_the_archive_table_in_batches(self):
+        old = [self.notify(f'Old {i}', self.old) for i in range(5)]
+        recent = self.notify('Recent')
+
+        self.assertEqual(self.archive(batch_size=2), 5)
+
+        self.assertEqual(list(Notification.objects.values_list('pk', flat=True)), [recent.pk])
+        self.assertEqual(
+            sorted(NotificationArchive.objects.values_list('notificationid', flat=True)),
+            sorted(n.pk for n in old),
+        )
+
+    def test_dry_run_only_counts(self):
+        self.notify('Old', self.old)
+        self.notify('Recent')
+
+        self.assertEqual(self.archive(dry_run=True), 1)
+        self.assertEqual(Notification.objects.count(), 2)
+        self.assertFalse(NotificationArchive.objects.exists())
+
+    def test_jsonl_archive_is_searchable_with_files(self):
+        old = self.notify('Old', self.old)
+        with tempfile.TemporaryDirectory() as archive_dir, self.settings(NOTIFICATION_ARCHIVE_DIR=archive_dir):
+            self.assertEqual(self.archive(to='jsonl'), 1)
+            self.assertFalse(NotificationArchive.objects.exists())
+
+            self.assertEqual(notification_archive.archived_feed('user', self.user.userid), [])
+            rows = notification_archive.archived_feed('user', self.user.userid, include_files=True)
+
+        self.assertEqual([row['notificationid'] for row in rows], [old.pk])
+        self.assertEqual(rows[0]['date'], self.old)
+
+    def test_archived_feed_pages_by_id_even_when_dates_disagree(self):
+        ids = [self.notify(f'Old {i}').pk for i in range(5)]
+        # Older ids get newer dates, so a date order would skip or repeat rows
+        for offset, pk in enumerate(ids):
+            Notification.objects.filter(pk=pk).update(date=self.old + timedelta(days=len(ids) - offset))
+        self.archive()
+
+        first = notification_archive.archived_feed('user', self.user.userid, limit=2)
+        second = notification_archive.archived_feed('user', self.user.userid, limit=2, before_id=first[-1]['notificationid'])
+        third = notification_archive.archived_feed('user', self.user.userid, limit=2, before_id=second[-1]['notificationid'])
+
+        paged = [row['notificationid'] for row in first + second + third]
+        self.assertEqual(paged, sorted(ids, reverse=True))
+
+    def test_endpoint_returns_the_next_cursor(self):
+        ids = [self.notify(f'Old {i}', self.old).pk for i in range(3)]
+        self.archive()
+        params = {'account_type': 'user', 'account_id': self.user.userid, 'limit': 2}
+
+        response = self.client.get('/api/notifications/archive/', params)
+        self.assertEqual(response.status_code, 200)
+        body = response.json()
+        self.assertEqual([n['notificationid'] for n in body['notifications']], [ids[2], ids[1]])
+        self.assertEqual(body['next_before_id'], ids[1])
+
+        body = self.client.get('/api/notifications/archive/', {**params, 'before_id': body['next_before_id']}).json()
+        self.assertEqual([n['notificationid'] for n in body['notifications']], [ids[0]])
+        self.assertIsNone(body['next_before_id'])
+
+
+class DashboardStatsTests(TestCase):
+
+    def setUp(self):
+        self.today = datetime(2026, 5, 10).date()
+
+    def test_top_merchants_is_one_query_ordered_by_revenue(self):
+        quiet = make_merchant('MP2025000001')
+        busy = make_merchant('MP2025000002')
+        make_product(busy)
+        make_product(busy, 'Isombe')
+        MerchantDailyRollup.objects.create(merchant_id=busy.merchantid, day=self.today, revenue=Decimal('900'))
+        MerchantDailyRollup.objects.create(merchant_id=busy.merchantid, day=self.today - timedelta(days=1), revenue=Decimal('100'))
+        MerchantDailyRollup.objects.create(merchant_id=quiet.merchantid, day=self.today, revenue=Decimal('50'))
+        OrderStatusRollup.objects.create(merchant_id=busy.merchantid, status='pending', count=2)
+        OrderStatusRollup.objects.create(merchant_id=busy.merchantid, status='completed', count=3)
+
+        with self.assertNumQueries(1):
+            top = dashboard_stats.top_merchants(10)
+
+        self.assertEqual([m['id'] for m in top], [busy.merchantid, quiet.merchantid])
+        self.assertEqual(top[0]['revenue'], 1000.0)
+        self.assertEqual(top[0]['orders'], 5)
+        self.assertEqual(top[0]['products'], 2)
+        self.assertEqual((top[1]['orders'], top[1]['products']), (0, 0))
+        self.assertEqual(len(dashboard_stats.top_merchants(1)), 1)
+
+    def test_daily_revenue_fills_quiet_days_with_zero(self):
+        DailyRollup.objects.create(day=self.today, revenue=Decimal('300'))
+        DailyRollup.objects.create(day=self.today - timedelta(days=2), revenue=Decimal('120'))
+        DailyRollup.objects.create(day=self.today - timedelta(days=5), revenue=Decimal('999'))
+
+        series = dashboard_stats.daily_revenue(3, self.today)
+
+        self.assertEqual([day['revenue'] for day in series], [300.0, 0.0, 120.0])
+        self.assertEqual(series[0]['date'], '2026-05-10')
+
+    def test_user_growth_is_cumulative(self):
+        for i, joined in enumerate([self.today - timedelta(days=3), self.today - timedelta(days=1), self.today]):
+            user = make_user(f'UP1000000{i}')
+            User.objects.filter(pk=user.pk).update(dateofbirth=joined)
+        merchant = make_merchant()
+        Merchant.objects.filter(pk=merchant.pk).update(dateofcreation=self.today - timedelta(days=1))
+
+        growth = dashboard_stats.user_growth(3, self.today)
+
+        self.assertEqual([day['users'] for day in growth], [3, 2, 1])
+        self.assertEqual([day['merchants'] for day in growth], [1, 1, 0])
+
+    def test_totals_and_activity_read_the_rollups(self):
+        DailyRollup.objects.create(day=self.today, revenue=Decimal('300'), transaction_count=4, orders_created=2)
+        DailyRollup.objects.create(day=self.today - timedelta(days=1), revenue=Decimal('200'), transaction_count=1, orders_created=5)
+        OrderStatusRollup.objects.create(merchant_id=1, status='pending', count=7)
+
+        totals = dashboard_stats.totals()
+        activity = dashboard_stats.activity(self.today)
+
+        self.assertEqual(totals['total_transactions'], 5)
+        self.assertEqual(totals['total_orders'], 7)
+        self.assertEqual((activity['orders_today'], activity['orders_yesterday']), (2, 5))
+        self.assertEqual(activity['total_revenue'], Decimal('500'))
+        self.assertEqual(activity['revenue_today'], Decimal('300'))
+
+
+class RollupTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(balance='10000.00')
+        self.merchant = make_merchant()
+
+    def pay_merchant(self, amount):
+        return ledger.transfer(self.user.paycode, self.merchant.merchantpaycode, Decimal(amount), '1234')
+
+    def test_payment_is_counted_once_it_commits(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pay_merchant('100')
+            self.assertFalse(DailyRollup.objects.exists())
+
+        daily = DailyRollup.objects.get(day=timezone.localdate())
+        self.assertEqual((daily.revenue, daily.charges, daily.transaction_count), (Decimal('100'), Decimal('20'), 1))
+        merchant_daily = MerchantDailyRollup.objects.get(merchant_id=self.merchant.merchantid)
+        self.assertEqual((merchant_daily.revenue, merchant_daily.transaction_count), (Decimal('100'), 1))
+
+    def test_rolled_back_payment_is_not_counted(self):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            with self.assertRaises(RuntimeError):
+                with transaction.atomic():
+                    self.pay_merchant('100')
+                    raise RuntimeError("rolled back")
+
+        self.assertEqual(callbacks, [])
+        self.assertFalse(DailyRollup.objects.exists())
+
+    def test_paid_order_and_status_changes_are_counted(self):
+        order = make_order(self.user, self.merchant, [
+            {'productid': 1, 'productname': 'Brochette', 'price': 1500, 'quantity': 2},
+        ], '3000')
+
+        with self.captureOnCommitCallbacks(execute=True):
+            rollups.record_order_created(order)
+            settle_order(order.orderid, generate_id(), Decimal('200'))
+            rollups.record_status_change(order, order.status, 'completed')
+
+        daily = DailyRollup.objects.get(day=timezone.localdate())
+        self.assertEqual((daily.orders_created, daily.orders_paid), (1, 1))
+        self.assertEqual((daily.order_revenue, daily.tips), (Decimal('3000'), Decimal('200')))
+        counts = dict(OrderStatusRollup.objects.values_list('status', 'count'))
+        self.assertEqual(counts, {order.status: 0, 'completed': 1})
+
+    def test_rebuild_matches_the_live_counters(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.pay_merchant('100')
+            self.pay_merchant('250')
+        live = list(DailyRollup.objects.values_list('day', 'revenue', 'charges', 'transaction_count'))
+        live_merchant = list(MerchantDailyRollup.objects.values_list('merchant_id', 'day', 'revenue', 'transaction_count'))
+        DailyRollup.objects.all().delete()
+        MerchantDailyRollup.objects.all().delete()
+
+        out = io.StringIO()
+        call_command('rebuild_rollups', stdout=out)
+
+        self.assertIn("Rebuilt 1 days", out.getvalue())
+        self.assertEqual(list(DailyRollup.objects.values_list('day', 'revenue', 'charges', 'transaction_count')), live)
+        self.assertEqual(
+            list(MerchantDailyRollup.objects.values_list('merchant_id', 'day', 'revenue', 'transaction_count')),
+            live_merchant,
+        )
+
+
+class DashboardSnapshotTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.merchant = make_merchant()
+        self.users = [make_user(f'UP1000000{i}') for i in range(3)]
+
+    def test_snapshot_is_built_once_then_served_from_cache(self):
+        snapshot = dashboard_snapshot.get()
+        self.assertEqual(snapshot['total_users'], 3)
+        self.assertEqual([u['userid'] for u in snapshot['recent_users']],
+                         sorted((u.userid for u in self.users), reverse=True))
+
+        with self.assertNumQueries(0):
+            self.assertEqual(dashboard_snapshot.get()['generated_at'], snapshot['generated_at'])
+
+    @mock.patch.object(dashboard_snapshot, '_refreshing', False)
+    def test_stale_snapshot_is_served_while_it_refreshes_in_background(self):
+        stale = {**dashboard_snapshot.refresh(), 'generated_at': 0}
+        cache.set(dashboard_snapshot.SNAPSHOT_KEY, stale)
+
+        with mock.patch.object(dashboard_snapshot.threading, 'Thread') as thread:
+            self.assertEqual(dashboard_snapshot.get()['generated_at'], 0)
+            dashboard_snapshot.get()
+
+        thread.assert_called_once()
+        thread.return_value.start.assert_called_once_with()
+
+    def test_refresh_command_replaces_the_snapshot(self):
+        dashboard_snapshot.get()
+        make_user('UP10000009')
+
+        call_command('refresh_dashboard_snapshot', stdout=io.StringIO())
+
+        self.assertEqual(dashboard_snapshot.get()['total_users'], 4)
+
+
+class AdminTablePagingTests(TestCase):
+
+    def setUp(self):
+        self.users = [make_user(f'UP1000000{i}') for i in range(5)]
+        self.newest_first = sorted((u.userid for u in self.users), reverse=True)
+
+    def test_pages_follow_next_before(self):
+        seen = []
+        params = {'page_size': 2}
+        while True:
+            response = self.client.get('/api/admin/tables/users/', params)
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            seen += [row['userid'] for row in body['results']]
+            if body['next_before'] is None:
+                break
+            params['before'] = body['next_before']
+
+        self.assertEqual(seen, self.newest_first)
+
+    def test_full_last_page_has_no_next_before(self):
+        body = self.client.get('/api/admin/tables/users/', {'page_size': 5}).json()
+        self.assertEqual(len(body['results']), 5)
+        self.assertIsNone(body['next_before'])
+
+    def test_bad_requests(self):
+        self.assertEqual(self.client.get('/api/admin/tables/secrets/').status_code, 404)
+        self.assertEqual(self.client.get('/api/admin/tables/users/', {'before': 'x'}).status_code, 400)
+
+
+class AdminTableSearchTests(TestCase):
+
+    def setUp(self):
+        self.alice = make_user('UP10000001')
+        self.bob = make_user('UP10000002')
+        User.objects.filter(pk=self.alice.pk).update(username='Alice Uwase', email='alice@example.com')
+        User.objects.filter(pk=self.bob.pk).update(username='Upton Bob', phonenumber='0788999999')
+
+    def ids(self, **kwargs):
+        return [row['userid'] for row in admin_tables.page('users', **kwargs)['results']]
+
+    def test_prefix_search_is_case_insensitive(self):
+        self.assertEqual(self.ids(query='alice'), [self.alice.userid])
+        self.assertEqual(self.ids(query='uwase'), [])
+
+    def test_search_field_is_guessed_from_the_query(self):
+        self.assertEqual(admin_tables.page('users', query='up10000001')['search_field'], 'paycode')
+        self.assertEqual(admin_tables.page('users', query='alice@')['search_field'], 'email')
+        self.assertEqual(admin_tables.page('users', query='0788999')['search_field'], 'phonenumber')
+        # Only a full paycode is taken as one, "upton" is a name
+        page = admin_tables.page('users', query='upton')
+        self.assertEqual(page['search_field'], 'username')
+        self.assertEqual([row['userid'] for row in page['results']], [self.bob.userid])
+
+    def test_explicit_field_must_be_searchable(self):
+        self.assertEqual(self.ids(query='UP1000000', search_field='paycode'),
+                         sorted([self.alice.userid, self.bob.userid], reverse=True))
+        with self.assertRaises(ValueError):
+            admin_tables.page('users', query='x', search_field='balance')
+        with self.assertRaises(ValueError):
+            admin_tables.page('transactions', query='x')
+
+    def test_filters_match_exactly_and_unknown_names_are_ignored(self):
+        User.objects.filter(pk=self.bob.pk).update(accounttype='agent')
+
+        self.assertEqual(self.ids(filters={'accounttype': 'agent'}), [self.bob.userid])
+        self.assertEqual(len(self.ids(filters={'_': '123', 'balance': '0'})), 2)
+
+    def test_endpoint_searches_and_rejects_bad_fields(self):
+        response = self.client.get('/api/admin/tables/users/', {'q': 'Alice', '_': '1700000000'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['userid'] for row in response.json()['results']], [self.alice.userid])
+
+        response = self.client.get('/api/admin/tables/users/', {'q': 'Alice', 'field': 'pin'})
+        self.assertEqual(response.status_code, 400)
+
+
+class MerchantReportTests(TestCase):
+
+    def setUp(self):
+        self.user = make_user()
+        self.merchant = make_merchant(balance='2500.00')
+        today = timezone.localdate()
+        self.period = {'year': today.year, 'month': today.month, 'day': today.day}
+
+    def test_financial_summary_sums_both_sides(self):
+        make_transaction(self.user, self.merchant, '1000')
+        make_transaction(self.user, self.merchant, '500')
+        make_transaction(self.merchant, self.user, '300')
+        old = make_transaction(self.user, self.merchant, '9999')
+        Transaction.objects.filter(pk=old.pk).update(date=datetime(2020, 1, 1, tzinfo=dt_timezone.utc))
+
+        summary = merchant_report.financial_summary(self.merchant, self.period)
+
+        self.assertEqual(summary['income'], Decimal('1500'))
+        self.assertEqual(summary['sent'], Decimal('300'))
+        # The sender pays the charge on top of what it sent
+        self.assertEqual(summary['expenses'], Decimal('320'))
+        self.assertEqual(summary['net'], Decimal('1180'))
+
+    def test_sales_and_orders_are_grouped_in_sql(self):
+        Sales.objects.create(merchantid=self.merchant.merchantid, productname='Fanta', amount=Decimal('800'), quantity=1)
+        Sales.objects.create(merchantid=self.merchant.merchantid, productname='Brochette', amount=Decimal('3000'), quantity=2)
+        Sales.objects.create(merchantid=self.merchant.merchantid, productname='Fanta', amount=Decimal('800'), quantity=1)
+        make_order(self.user, self.merchant, [], '3000', is_paid=True)
+        make_order(self.user, self.merchant, [], '800')
+
+        with self.assertNumQueries(1):
+            sales = merchant_report.product_sales(self.merchant, self.period)
+        self.assertEqual([(row['productname'], row['quantity']) for row in sales], [('Brochette', 2), ('Fanta', 2)])
+
+        orders = merchant_report.order_summary(self.merchant, self.period)
+        self.assertEqual(orders['total'], 2)
+        self.assertEqual(orders['value'], Decimal('3800'))
+        self.assertEqual(orders['paid_value'], Decimal('3000'))
+        self.assertEqual(len(orders['recent']), 2)
+
+    def test_period_filter_is_a_half_open_range(self):
+        start = datetime(2026, 2, 1, tzinfo=dt_timezone.utc)
+        end = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        self.assertEqual(merchant_report.period_filter('date', 2026, 2), Q(date__gte=start, date__lt=end))
+        self.assertEqual(
+            merchant_report.period_filter('date', 2026, 12),
+            Q(date__gte=datetime(2026, 12, 1, tzinfo=dt_timezone.utc), date__lt=datetime(2027, 1, 1, tzinfo=dt_timezone.utc)),
+        )
+
+    def test_long_tables_are_split(self):
+        rows = [[str(i), 'x'] for i in range(merchant_report.ROWS_PER_TABLE * 2 + 1)]
+        tables = list(merchant_report.chunked_tables(['#', 'name'], rows, None, []))
+        self.assertEqual(len(tables), 3)
+
+    def test_endpoint_streams_a_pdf(self):
+        make_transaction(self.user, self.merchant, '1000')
+        Sales.objects.create(merchantid=self.merchant.merchantid, productname='Fanta', amount=Decimal('800'), quantity=1)
+
+        response = self.client.get('/api/generate-merchant-report/', {'merchant_id': self.merchant.merchantid, **self.period})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertIn('attachment', response['Content-Disposition'])
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_endpoint_rejects_impossible_periods(self):
+        params = {'merchant_id': self.merchant.merchantid, 'year': 2026, 'month': 4, 'day': 31}
+        self.assertEqual(self.client.get('/api/generate-merchant-report/', params).status_code, 400)
+        self.assertEqual(self.client.get('/api/generate-merchant-report/', {'merchant_id': 'x'}).status_code, 400)
+
+
+class PayOrderTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = make_user(balance='5000.00')
+        self.merchant = make_merchant()
+        self.order = make_order(self.user, self.merchant, [
+            {'productid': 1, 'productname': 'Brochette', 'price': 1500, 'quantity': 2},
+        ], '3000')
+
+    def pay(self, pin='1234', tip_amount=0):
+        return self.client.post('/api/pay-order/', {
+            'order_id': self.order.orderid, 'sender_paycode': self.user.paycode, 'pin': pin, 'tip_amount': tip_amount
+        }, content_type='application/json')
+
+    def test_retried_payment_charges_once(self):
+        first = self.pay(tip_amount=100)
+        self.assertEqual(first.status_code, 200)
+        self.assertFalse(first.json()['already_paid'])
+
+        second = self.pay(tip_amount=100)
+        self.assertTrue(second.json()['already_paid'])
+        self.assertEqual(second.json()['transaction_id'], first.json()['transaction_id'])
+
+        self.user.refresh_from_db()
+        self.merchant.refresh_from_db()
+        # 3000 + 100 tip + the 20 charge
+        self.assertEqual(self.user.balance, Decimal('1880.00'))
+        self.assertEqual(self.merchant.balance, Decimal('3100.00'))
+        self.assertEqual(Transaction.objects.count(), 1)
+        self.assertEqual(Sales.objects.filter(merchantid=self.merchant.merchantid).count(), 1)
+
+    def test_failed_payment_leaves_the_order_unpaid(self):
+        response = self.pay(pin='0000')
+
+        self.assertFalse(response.json()['success'])
+        self.order.refresh_from_db()
+        self.assertFalse(self.order.is_paid)
+        self.assertFalse(Transaction.objects.exists())
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.balance, Decimal('5000.00'))
+
+    def test_cancelled_order_cannot_be_paid(self):
+        Order.objects.filter(pk=self.order.pk).update(status='cancelled')
+
+        self.assertFalse(self.pay().json()['success'])
+        self.assertFalse(Transaction.objects.exists())
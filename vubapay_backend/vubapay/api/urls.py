@@ -24,6 +24,9 @@ urlpatterns = [
     path('notifications/', get_user_notifications, name='get_notifications'),
     path('notifications/test/', test_notifications, name='test_notifications'),
     path('notifications/all/', get_all_notifications, name='get_all_notifications'),
+    path('notifications/unread-count/', views.get_unread_notification_count, name='get_unread_notification_count'),
+    path('notifications/mark-read/', views.mark_notifications_read, name='mark_notifications_read'),
+    path('notifications/archive/', views.get_archived_notifications, name='get_archived_notifications'),
     path('user-details/', get_user_details, name='get_user_details'),
     path('update-profile/', update_profile, name='update_profile'),
     path('update-profile-picture/', update_profile_picture, name='update_profile_picture'),
@@ -56,9 +59,11 @@ urlpatterns = [
     path('get-unpaid-orders/', get_unpaid_orders, name='get_unpaid_orders'),
     path('cancel-order/', cancel_order, name='cancel_order'),
     path('mark-order-paid/', mark_order_paid, name='mark_order_paid'),
+    path('pay-order/', views.pay_order, name='pay_order'),
     path('get-order-details/', get_order_details, name='get_order_details'),
     path('merchant-payment-details/', get_merchant_payment_details, name='merchant_payment_details'),
     path('get-merchant-order-notifications/', get_merchant_order_notifications, name='get_merchant_order_notifications'),
+    path('merchant-order-stream/', views.merchant_order_stream, name='merchant_order_stream'),
     path('get-payable-orders/', get_payable_orders, name='get_payable_orders'),
     path('verify-pin/', views.verify_pin, name='verify_pin'),
     # Admin URLs
@@ -71,6 +76,9 @@ urlpatterns = [
     # CRUD operations for all models
     path('admin/create-user/', views.create_user_admin, name='admin_create_user'),
     path('admin/create-merchant/', views.create_merchant_admin, name='admin_create_merchant'),
+    path('admin/import-accounts/', views.import_accounts_admin, name='admin_import_accounts'),
+    path('admin/send-notification/', views.send_notification_admin, name='admin_send_notification'),
+    path('admin/tables/<str:entity>/', views.admin_table, name='admin_table'),
     path('admin/create-product/', views.create_product_admin, name='admin_create_product'),
     path('admin/create-service/', views.create_service_admin, name='admin_create_service'),
     path('generate-merchant-report/', generate_merchant_report, name='generate_merchant_report'),
@@ -1,9 +1,136 @@
+import os
 import random
 import datetime
+import logging
+import tempfile
+import threading
+import time
 
+# Paycodes are random, uniqueness is checked by api.paycodes.PaycodeAllocator
 def generate_user_paycode():
-    return "UP" + str(random.randint(100000, 999999))
+    return "UP" + str(random.randint(10000000, 99999999))
 
 def generate_merchant_paycode():
     year = datetime.datetime.now().year
-    return f"MP{year}{random.randint(1000, 9999)}"
+    return f"MP{year}{random.randint(100000, 999999)}"
+
+
+# Snowflake-style ids: | 41 bits ms since ID_EPOCH | 5 bits worker | 7 bits sequence |
+# 53 bits total so ids stay exact as JSON numbers (Flutter web / JS doubles),
+# and they sort after the old millisecond-timestamp ids already in the tables.
+ID_EPOCH_MS = 1735689600000  # 2025-01-01T00:00:00Z
+WORKER_BITS = 5
+SEQUENCE_BITS = 7
+MAX_WORKER_ID = (1 << WORKER_BITS) - 1
+MAX_SEQUENCE = (1 << SEQUENCE_BITS) - 1
+
+
+class IdGenerator:
+    """
+    Time-ordered unique id generator, no database round trip needed.
+    Up to 128 ids per millisecond per worker; when a millisecond is used up
+    we spin until the next one.
+    """
+
+    def __init__(self, worker_id):
+        if not 0 <= worker_id <= MAX_WORKER_ID:
+            raise ValueError(f"worker_id must be between 0 and {MAX_WORKER_ID}")
+        self.worker_id = worker_id
+        self.last_ms = -1
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    def _now_ms(self):
+        return int(time.time() * 1000)
+
+    def next_id(self):
+        with self.lock:
+            now = self._now_ms()
+
+            # Clock went backwards (NTP adjustment): keep using the last timestamp
+            if now < self.last_ms:
+                now = self.last_ms
+
+            if now == self.last_ms:
+                self.sequence = (self.sequence + 1) & MAX_SEQUENCE
+                if self.sequence == 0:
+                    while now <= self.last_ms:
+                        now = self._now_ms()
+            else:
+                self.sequence = 0
+
+            self.last_ms = now
+            return ((now - ID_EPOCH_MS) << (WORKER_BITS + SEQUENCE_BITS)) \
+                | (self.worker_id << SEQUENCE_BITS) \
+                | self.sequence
+
+
+# Lock file held for the life of the process, see _lease_worker_id()
+_worker_lease = None
+
+
+def _lease_worker_id():
+    """
+    Claim the first free worker id on this host by taking an exclusive lock
+    on its lock file. The OS drops the lock when the process exits, so ids
+    of dead workers are reused. Returns None where flock is not available.
+    """
+    global _worker_lease
+    try:
+        import fcntl
+    except ImportError:
+        return None
+
+    lock_dir = os.environ.get('VUBAPAY_WORKER_LOCK_DIR', tempfile.gettempdir())
+    for worker_id in range(MAX_WORKER_ID + 1):
+        lease = open(os.path.join(lock_dir, f'vubapay-worker-{worker_id}.lock'), 'a')
+        try:
+            fcntl.flock(lease, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lease.close()
+            continue
+        _worker_lease = lease
+        return worker_id
+    raise RuntimeError(
+        f"All {MAX_WORKER_ID + 1} worker ids on this host are in use; set VUBAPAY_WORKER_ID per process"
+    )
+
+
+def _default_worker_id():
+    """
+    VUBAPAY_WORKER_ID when set, which is required when workers run on more
+    than one host. Otherwise a lock-file lease makes the workers of one host
+    (gunicorn, uwsgi...) get distinct ids.
+    """
+    worker_id = os.environ.get('VUBAPAY_WORKER_ID')
+    if worker_id is not None:
+        return int(worker_id)
+
+    worker_id = _lease_worker_id()
+    if worker_id is None:
+        # No flock (Windows): fine for a single development process only
+        worker_id = os.getpid() & MAX_WORKER_ID
+        logging.getLogger(__name__).warning(
+            "VUBAPAY_WORKER_ID is not set, using worker id %s from the pid; "
+            "set it per process when running several workers", worker_id)
+    return worker_id
+
+
+_id_generator = IdGenerator(_default_worker_id())
+
+
+def _lease_again_in_child():
+    # A forked worker (gunicorn --preload) shares the parent's lease, take its own
+    global _id_generator, _worker_lease
+    if _worker_lease is not None:
+        _worker_lease.close()
+        _worker_lease = None
+        _id_generator = IdGenerator(_default_worker_id())
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=_lease_again_in_child)
+
+def generate_id():
+    """Unique, k-sorted id for Transaction, Order and Product primary keys"""
+    return _id_generator.next_id()
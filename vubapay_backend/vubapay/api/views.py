@@ -2,100 +2,25 @@ from django.shortcuts import render, get_object_or_404
 from django.http import JsonResponse
 from .models import User, Merchant, Order
 from django.views.decorators.csrf import csrf_exempt
+import asyncio
 import json
 import logging
 
 logger = logging.getLogger(__name__)
 
-@csrf_exempt
-def admin_dashboard(request):
-    """Single comprehensive admin dashboard with all data"""
-    try:
-        # Get all data from database
-        users = User.objects.all()
-        merchants = Merchant.objects.all()
-        orders = Order.objects.all()
-        services = ExtraMenu.objects.all()
-        products = Product.objects.all()
-        transactions = Transaction.objects.all()
-        menus = Menu.objects.all()
-        
-        # Get counts for analytics
-        total_users = users.count()
-        total_merchants = merchants.count()
-        total_orders = orders.count()
-        total_products = products.count()
-        total_transactions = transactions.count()
-        total_services = services.count()
-        
-        # Today's stats
-        today = datetime.now().date()
-        orders_today = Order.objects.filter(created_at__date=today).count()
-        
-        # Revenue calculations
-        total_revenue = Transaction.objects.aggregate(total=Sum('amount'))['total'] or 0
-        revenue_today = Transaction.objects.filter(date__date=today).aggregate(total=Sum('amount'))['total'] or 0
-        
-        context = {
-            # All data for tables
-            'users': users,
-            'merchants': merchants,
-            'orders': orders,
-            'services': services,
-            'products': products,
-            'transactions': transactions,
-            'menus': menus,
-            
-            # Analytics counts
-            'users_count': total_users,
-            'merchants_count': total_merchants,
-            'orders_count': total_orders,
-            'products_count': total_products,
-            'transactions_count': total_transactions,
-            'services_count': total_services,
-            
-            # Additional stats
-            'orders_today': orders_today,
-            'total_revenue': total_revenue,
-            'revenue_today': revenue_today,
-            'today': today,
-        }
-        
-        return render(request, 'api/admin_dashboard.html', context)
-        
-    except Exception as e:
-        print(f"Error in admin_dashboard: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        # Return empty context if there's an error
-        return render(request, 'api/admin_dashboard.html', {
-            'users': [],
-            'merchants': [],
-            'orders': [],
-            'services': [],
-            'products': [],
-            'transactions': [],
-            'menus': [],
-            'users_count': 0,
-            'merchants_count': 0,
-            'orders_count': 0,
-            'products_count': 0,
-            'transactions_count': 0,
-            'services_count': 0,
-            'error': str(e)
-        })
 @csrf_exempt
 def search_by_paycode(request):
     if request.method == "GET":
         paycode = request.GET.get('paycode', None)
         if paycode:
-            user = User.objects.filter(paycode=paycode).first()
-            if user:
+            account = paycodes.lookup(paycode)
+            if account:
                 return JsonResponse({"status": "success", "user": {
-                    "id": user.id,
-                    "name": user.name,
-                    "email": user.email,
-                    "paycode": user.paycode
+                    "id": account['id'],
+                    "name": account['username'],
+                    "email": account['email'],
+                    "paycode": account['paycode'],
+                    "type": account['type']
                 }})
             else:
                 return JsonResponse({"status": "error", "message": "User not found"})
@@ -141,21 +66,31 @@ from rest_framework.decorators import api_view
 from rest_framework.response import Response
 from rest_framework import status
 from django.db.models import Q
-from django.utils.dateparse import parse_date
+from django.utils.dateparse import parse_date, parse_datetime
 from .models import User, Merchant, Product, Notification, Menu,  Sales
 from .serializers import UserSerializer, MerchantSerializer, ProductSerializer, NotificationSerializer
-from .utils import generate_user_paycode, generate_merchant_paycode
+from .utils import generate_id
+from . import account_import, inventory, ledger, menu_cache, paycodes, rollups
+from . import notifications as notifications_feed
+from . import notification_archive
+from . import stats as dashboard_stats
+from . import admin_tables, dashboard_snapshot, merchant_report
+from .conditional import conditional_response, etag_matches, make_etag, not_modified, rows_etag
+from .order_events import get_broker, publish_order_event, format_sse
+from .settlement import settle_order, pay_order as settle_pay_order
+from .idempotency import idempotent
 from django.utils import timezone
 from datetime import timedelta
-from django.http import JsonResponse
+from django.core.handlers.asgi import ASGIRequest
+from django.http import FileResponse, JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 import json
-from django.db import transaction
-from .models import Transaction
+from django.db import transaction, connection
+from .models import Transaction, resolve_account_names
 import base64
+import io
 from django.core.files.base import ContentFile
 from datetime import datetime
-import random
 from .models import ExtraMenu   
 import os
 from django.conf import settings
@@ -170,9 +105,9 @@ def register(request):
 
     try:
         if account_type == 'user':
-            user = User.objects.create(
+            user = paycodes.create_account(
+                'user',
                 nationalid=request.data.get('nationalId'),
-                paycode=generate_user_paycode(),
                 profilepicture=profile_pic,
                 accounttype='normal',
                 email=request.data.get('email'),
@@ -185,9 +120,9 @@ def register(request):
             return Response({"id": user.userid, "type": "user"}, status=status.HTTP_201_CREATED)
 
         elif account_type == 'merchant':
-            merchant = Merchant.objects.create(
+            merchant = paycodes.create_account(
+                'merchant',
                 nationalid=request.data.get('nationalId'),
-                merchantpaycode=generate_merchant_paycode(),
                 profilepicture=profile_pic,
                 businesstype=request.data.get('businessType'),
                 accounttype='merchant',
@@ -262,12 +197,11 @@ def test_notifications(request):
         
         if not all_notifications.exists():
             print("⚠️ No notifications found, creating sample...")
-            Notification.objects.create(
+            notifications_feed.broadcast(
+                'user',
                 title="Test Notification",
                 content="This is a test notification from database",
-                urgency="medium",
-                designated_to="user",
-                date="2024-01-15 10:30:00"
+                urgency="medium"
             )
             all_notifications = Notification.objects.all()
         
@@ -285,6 +219,16 @@ def test_notifications(request):
         print(f"❌ Error in test_notifications: {str(e)}")
         return Response({"error": str(e)}, status=500)
 
+def _notification_account(email):
+    """(account_type, account_id) for the user or merchant with this email, or None"""
+    user_id = User.objects.filter(email=email).values_list('userid', flat=True).first()
+    if user_id is not None:
+        return 'user', user_id
+    merchant_id = Merchant.objects.filter(email=email).values_list('merchantid', flat=True).first()
+    if merchant_id is not None:
+        return 'merchant', merchant_id
+    return None
+
 @api_view(['GET'])
 def get_user_notifications(request):
     try:
@@ -292,53 +236,140 @@ def get_user_notifications(request):
         if not user_email:
             return Response({"error": "Email parameter required"}, status=400)
         
-        user_type = None
-        user_id = None
+        account = _notification_account(user_email)
+        if account is None:
+            print(f"❌ User not found: {user_email}")
+            return Response({"error": "User not found"}, status=404)
+        user_type, user_id = account
+        print(f"✅ Found {user_type}: {user_email}, ID: {user_id}")
+        
+        # This account's own notifications plus broadcasts to its type or to all
+        notifications = notifications_feed.feed(user_type, user_id, 20 if user_type == 'merchant' else 10)
+        read_up_to = notifications_feed.read_marker(user_type, user_id)
+        unread_count = notifications_feed.unread_count(user_type, user_id)
+        
+        # Tagged with what is actually shown, so deleted or archived rows change it too
+        etag = make_etag('notifications', user_type, user_id, read_up_to, unread_count,
+                         *[notification.notificationid for notification in notifications])
+        if etag_matches(request, etag):
+            return not_modified(etag)
+        print(f"✅ Found {len(notifications)} notifications for {user_type} {user_id}")
         
-        try:
-            user = User.objects.get(email=user_email)
-            user_type = 'user'
-            user_id = user.userid
-            print(f"✅ Found user: {user.email}, type: {user_type}, ID: {user_id}")
-        except User.DoesNotExist:
+        serializer = NotificationSerializer(notifications, many=True)
+        notifications_data = serializer.data
+        for notification in notifications_data:
+            notification['is_read'] = notification['notificationid'] <= read_up_to
+        
+        return Response({
+            "notifications": notifications_data,
+            "unread_count": unread_count,
+            "last_read_id": read_up_to,
+            "user_type": user_type,
+            "message": f"Found {len(notifications_data)} notifications for {user_type}"
+        }, headers={'ETag': etag})
+        
+    except Exception as e:
+        print(f"❌ Error in get_user_notifications: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
+
+def _notification_account_from_params(params):
+    """Account from account_type/account_id (no lookup) or from email"""
+    account_type = params.get('account_type')
+    account_id = params.get('account_id')
+    if account_type in ('user', 'merchant') and str(account_id or '').isdigit():
+        return account_type, int(account_id)
+    email = params.get('email')
+    return _notification_account(email) if email else None
+
+@api_view(['GET'])
+def get_unread_notification_count(request):
+    """
+    Badge count for the home screens. Pass account_type and account_id to
+    answer straight from the cached counter, or email as elsewhere.
+    """
+    try:
+        account = _notification_account_from_params(request.query_params)
+        if account is None:
+            return Response({"error": "account_type and account_id, or a known email, required"}, status=400)
+        account_type, account_id = account
+        
+        return Response({
+            "unread_count": notifications_feed.unread_count(account_type, account_id),
+            "user_type": account_type,
+        })
+        
+    except Exception as e:
+        print(f"❌ Error in get_unread_notification_count: {str(e)}")
+        return Response({"error": str(e)}, status=500)
+
+@api_view(['POST'])
+def mark_notifications_read(request):
+    """
+    Mark an account's notifications read up to last_id (default: all of them)
+    """
+    try:
+        account = _notification_account_from_params(request.data)
+        if account is None:
+            return Response({"error": "account_type and account_id, or a known email, required"}, status=400)
+        account_type, account_id = account
+        
+        last_id = request.data.get('last_id')
+        if last_id is not None:
             try:
-                merchant = Merchant.objects.get(email=user_email)
-                user_type = 'merchant'
-                user_id = merchant.merchantid
-                print(f"✅ Found merchant: {merchant.email}, type: {user_type}, ID: {user_id}")
-            except Merchant.DoesNotExist:
-                print(f"❌ User not found: {user_email}")
-                return Response({"error": "User not found"}, status=404)
+                last_id = int(last_id)
+            except (TypeError, ValueError):
+                return Response({"error": "last_id must be a notification id"}, status=400)
         
-        # For merchants, get only their notifications or all merchant notifications
-        if user_type == 'merchant':
-            # Get general merchant notifications and order notifications for this specific merchant
-            notifications = Notification.objects.filter(
-                Q(designated_to='merchant') | Q(designated_to='all') | 
-                Q(content__contains=f"merchant_id={user_id}") |
-                Q(content__contains=f"merchant {user_id}") |
-                Q(content__icontains=merchant.username)
-            ).order_by('-date')[:20]
-        else:
-            # For regular users
-            notifications = Notification.objects.filter(
-                Q(designated_to='user') | Q(designated_to='all')
-            ).order_by('-date')[:10]
+        read_up_to = notifications_feed.mark_read(account_type, account_id, last_id)
+        print(f"✅ {account_type} {account_id} read notifications up to {read_up_to}")
+        
+        return Response({
+            "success": True,
+            "last_read_id": read_up_to,
+        })
+        
+    except Exception as e:
+        print(f"❌ Error in mark_notifications_read: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return Response({"error": str(e)}, status=500)
+
+@api_view(['GET'])
+def get_archived_notifications(request):
+    """
+    Older notifications moved out by archive_notifications, newest first.
+    Page with before_id (the last notificationid received); files=true also
+    searches the JSONL archive files, which is slow.
+    """
+    try:
+        account = _notification_account_from_params(request.query_params)
+        if account is None:
+            return Response({"error": "account_type and account_id, or a known email, required"}, status=400)
+        account_type, account_id = account
         
-        print(f"✅ Found {notifications.count()} notifications for {user_type} {user_id}")
+        try:
+            limit = min(int(request.query_params.get('limit', 50)), 200)
+            before_id = request.query_params.get('before_id')
+            before_id = int(before_id) if before_id else None
+        except ValueError:
+            return Response({"error": "limit and before_id must be numbers"}, status=400)
+        include_files = request.query_params.get('files', '').lower() in ('1', 'true', 'yes')
         
-        serializer = NotificationSerializer(notifications, many=True)
-        unread_count = notifications.count()
+        rows = notification_archive.archived_feed(account_type, account_id, limit, before_id, include_files)
+        for row in rows:
+            row['date'] = row['date'].strftime("%Y-%m-%d %H:%M:%S") if row['date'] else None
         
         return Response({
-            "notifications": serializer.data,
-            "unread_count": unread_count,
-            "user_type": user_type,
-            "message": f"Found {unread_count} notifications for {user_type}"
+            "notifications": rows,
+            "count": len(rows),
+            "next_before_id": rows[-1]['notificationid'] if len(rows) == limit else None,
+            "user_type": account_type,
         })
         
     except Exception as e:
-        print(f"❌ Error in get_user_notifications: {str(e)}")
+        print(f"❌ Error in get_archived_notifications: {str(e)}")
         import traceback
         traceback.print_exc()
         return Response({"error": str(e)}, status=500)
@@ -480,6 +511,7 @@ def update_profile(request):
                 user.nationalid = data['national_id']
             
             user.save()
+            paycodes.invalidate(user.paycode)
             
             return Response({
                 "message": "Profile updated successfully",
@@ -519,6 +551,7 @@ def update_profile(request):
                 merchant.nationalid = data['national_id']
             
             merchant.save()
+            paycodes.invalidate(merchant.merchantpaycode)
             
             return Response({
                 "message": "Profile updated successfully",
@@ -556,6 +589,7 @@ def update_profile_picture(request):
             
             user.profilepicture = profile_pic
             user.save()
+            paycodes.invalidate(user.paycode)
             
             return Response({
                 "message": "Profile picture updated successfully",
@@ -574,6 +608,7 @@ def update_profile_picture(request):
             
             merchant.profilepicture = profile_pic
             merchant.save()
+            paycodes.invalidate(merchant.merchantpaycode)
             
             return Response({
                 "message": "Profile picture updated successfully",
@@ -602,43 +637,15 @@ def find_user_by_paycode(request):
         try:
             print(f"🔍 Searching for paycode: {paycode}")
             
-            # Search in User model
-            try:
-                user = User.objects.get(paycode=paycode)
-                print(f"✅ Found USER: {user.username}")
-                return JsonResponse({
-                    'success': True,
-                    'username': user.username,
-                    'email': user.email,
-                    'phone': user.phonenumber,
-                    'type': 'user',
-                    'paycode': user.paycode,
-                    'profile_picture': user.profilepicture.url if user.profilepicture else None,
-                    'error': None
-                })
-            except User.DoesNotExist:
-                print(f"ℹ️ Not found in User, checking Merchant...")
-                pass
-            
-            # Search in Merchant model
-            try:
-                merchant = Merchant.objects.get(merchantpaycode=paycode)
-                print(f"✅ Found MERCHANT: {merchant.username}")
-                return JsonResponse({
-                    'success': True,
-                    'username': merchant.username,
-                    'email': merchant.email,
-                    'phone': merchant.phonenumber,
-                    'type': 'merchant',
-                    'paycode': merchant.merchantpaycode,
-                    'business_type': merchant.businesstype,
-                    'profile_picture': merchant.profilepicture.url if merchant.profilepicture else None,
-                    'error': None
-                })
-            except Merchant.DoesNotExist:
-                print(f"❌ Not found in Merchant either")
-                pass
+            # Prefix-routed, cached lookup across users and merchants
+            account = paycodes.lookup(paycode)
+            if account:
+                print(f"✅ Found {account['type'].upper()}: {account['username']}")
+                response = {'success': True, 'error': None}
+                response.update({key: value for key, value in account.items() if key != 'id'})
+                return JsonResponse(response)
             
+            print(f"❌ Paycode not found")
             return JsonResponse({
                 'success': False,
                 'error': 'User not found',
@@ -778,8 +785,8 @@ def create_product(request):
         except Merchant.DoesNotExist:
             return Response({"error": "Merchant not found"}, status=404)
         
-        # Generate product ID (timestamp + random)
-        product_id = int(datetime.now().timestamp() * 1000) + random.randint(1000, 9999)
+        # Generate product ID
+        product_id = generate_id()
         
         # Handle image upload
         product_picture_url = None
@@ -845,6 +852,8 @@ def create_product(request):
                     fieldname=field_name.strip()
                 )
         
+        menu_cache.invalidate(merchant_id)
+        
         # Build the full URL for the response
         product_data = {
             'productid': product.productid,
@@ -871,6 +880,45 @@ def create_product(request):
         traceback.print_exc()
         return Response({'error': str(e), 'debug': 'Check server logs for details'}, status=400)
 
+def _product_picture_url(picture):
+    """Turn a stored product picture into a URL under /media/"""
+    if not picture:
+        return None
+    # If it's a relative path, make it absolute
+    if isinstance(picture, str):
+        if picture.startswith('/'):
+            return picture
+        return f"/media/{picture}"
+    # It's an ImageField
+    return picture.url
+
+def _build_merchant_products(merchant_id):
+    # Get products for this merchant
+    products = Product.objects.filter(merchantid=merchant_id)
+    
+    # Format response data
+    products_data = []
+    for product in products:
+        products_data.append({
+            'productid': product.productid,
+            'productname': product.productname,
+            'price': float(product.price),
+            'amountinstock': product.amountinstock,
+            'category': product.category,
+            'merchantid': product.merchantid,
+            'productpicture': _product_picture_url(product.productpicture),
+        })
+    
+    return {
+        'success': True,
+        'count': len(products_data),
+        'products': products_data
+    }
+
+def _menu_response(request, payload, etag):
+    """Serve a cached menu payload, or 304 when the client already has it"""
+    return conditional_response(request, etag, lambda: Response(payload))
+
 @api_view(['GET'])
 def merchant_products(request):
     """
@@ -885,40 +933,10 @@ def merchant_products(request):
         # Convert to integer
         merchant_id = int(merchant_id)
         
-        # Get products for this merchant
-        products = Product.objects.filter(merchantid=merchant_id)
-        
-        # Format response data
-        products_data = []
-        for product in products:
-            # Handle product picture URL
-            product_picture_url = None
-            if product.productpicture:
-                # If it's a relative path, make it absolute
-                if isinstance(product.productpicture, str):
-                    if product.productpicture.startswith('/'):
-                        product_picture_url = product.productpicture
-                    else:
-                        product_picture_url = f"/media/{product.productpicture}"
-                else:
-                    # It's an ImageField
-                    product_picture_url = product.productpicture.url if product.productpicture else None
-            
-            products_data.append({
-                'productid': product.productid,
-                'productname': product.productname,
-                'price': float(product.price),
-                'amountinstock': product.amountinstock,
-                'category': product.category,
-                'merchantid': product.merchantid,
-                'productpicture': product_picture_url,
-            })
-        
-        return Response({
-            'success': True,
-            'count': len(products_data),
-            'products': products_data
-        })
+        payload, etag = menu_cache.get_or_build(
+            'products', merchant_id, lambda: _build_merchant_products(merchant_id)
+        )
+        return _menu_response(request, payload, etag)
         
     except ValueError:
         return Response({"error": "Invalid merchant ID"}, status=400)
@@ -928,6 +946,30 @@ def merchant_products(request):
         traceback.print_exc()
         return Response({'error': str(e)}, status=400)
     
+def _build_merchant_menu(merchant_id):
+    # Get menu items for this merchant, product details joined in the same query
+    menu_items = Menu.objects.filter(merchantid=merchant_id).with_product()
+    
+    # Format response with product details
+    menu_data = []
+    for menu_item in menu_items:
+        menu_data.append({
+            'menuid': menu_item.menuid,
+            'productid': menu_item.productid,
+            'productname': menu_item.productname,
+            'price': float(menu_item.price),
+            'amountinstock': menu_item.amountinstock,
+            'category': menu_item.category,
+            'productpicture': _product_picture_url(menu_item.productpicture),
+            'availability': menu_item.availability
+        })
+    
+    return {
+        'success': True,
+        'count': len(menu_data),
+        'menu': menu_data
+    }
+
 @api_view(['GET'])
 def merchant_menu(request):
     """
@@ -942,46 +984,10 @@ def merchant_menu(request):
         # Convert to integer
         merchant_id = int(merchant_id)
         
-        # Get menu items for this merchant
-        menu_items = Menu.objects.filter(merchantid=merchant_id)
-        
-        # Format response with product details
-        menu_data = []
-        for menu_item in menu_items:
-            try:
-                # Get the product
-                product = Product.objects.get(productid=menu_item.productid)
-                
-                # Handle product picture URL
-                product_picture_url = None
-                if product.productpicture:
-                    if isinstance(product.productpicture, str):
-                        if product.productpicture.startswith('/'):
-                            product_picture_url = product.productpicture
-                        else:
-                            product_picture_url = f"/media/{product.productpicture}"
-                    else:
-                        product_picture_url = product.productpicture.url if product.productpicture else None
-                
-                menu_data.append({
-                    'menuid': menu_item.menuid,
-                    'productid': product.productid,
-                    'productname': product.productname,
-                    'price': float(product.price),
-                    'amountinstock': product.amountinstock,
-                    'category': product.category,
-                    'productpicture': product_picture_url,
-                    'availability': menu_item.availability
-                })
-            except Product.DoesNotExist:
-                print(f"⚠️ Product {menu_item.productid} not found for menu item {menu_item.menuid}")
-                continue
-        
-        return Response({
-            'success': True,
-            'count': len(menu_data),
-            'menu': menu_data
-        })
+        payload, etag = menu_cache.get_or_build(
+            'menu', merchant_id, lambda: _build_merchant_menu(merchant_id)
+        )
+        return _menu_response(request, payload, etag)
         
     except ValueError:
         return Response({"error": "Invalid merchant ID"}, status=400)
@@ -1026,6 +1032,7 @@ def add_to_menu(request):
             productid=product_id,    # Pass integer ID
             availability=data.get('availability', True)
         )
+        menu_cache.invalidate(merchant_id)
         
         return Response({
             'success': True,
@@ -1060,6 +1067,7 @@ def remove_from_menu(request):
             pass
             
         menu_item.delete()
+        menu_cache.invalidate(menu_item.merchantid)
         
         return Response({
             'success': True, 
@@ -1072,6 +1080,19 @@ def remove_from_menu(request):
         print(f"🔥 Error in remove_from_menu: {str(e)}")
         return Response({'error': str(e)}, status=400)
 
+def _build_merchant_custom_fields(merchant_id):
+    # Raises Merchant.DoesNotExist so unknown merchants are never cached
+    merchant = Merchant.objects.get(merchantid=merchant_id)
+    field_names = list(
+        ExtraMenu.objects.filter(merchantid=merchant.merchantid).values_list('fieldname', flat=True)
+    )
+    
+    return {
+        'success': True,
+        'custom_fields': field_names,
+        'count': len(field_names)
+    }
+
 @api_view(['GET'])
 def merchant_custom_fields(request):
     """
@@ -1083,17 +1104,14 @@ def merchant_custom_fields(request):
         return Response({"error": "Merchant ID parameter required"}, status=400)
     
     try:
-        merchant = Merchant.objects.get(merchantid=merchant_id)
-        custom_fields = ExtraMenu.objects.filter(merchantid=merchant)
-        
-        field_names = [field.fieldname for field in custom_fields]
-        
-        return Response({
-            'success': True,
-            'custom_fields': field_names,
-            'count': len(field_names)
-        })
+        merchant_id = int(merchant_id)
+        payload, etag = menu_cache.get_or_build(
+            'custom_fields', merchant_id, lambda: _build_merchant_custom_fields(merchant_id)
+        )
+        return _menu_response(request, payload, etag)
         
+    except ValueError:
+        return Response({"error": "Invalid merchant ID"}, status=400)
     except Merchant.DoesNotExist:
         return Response({"error": "Merchant not found"}, status=404)
     except Exception as e:
@@ -1143,6 +1161,8 @@ def update_product(request):
                 menu_item.availability = data['availability']
                 menu_item.save()
         
+        menu_cache.invalidate(product.merchantid)
+        
         serializer = ProductSerializer(product)
         
         return Response({
@@ -1174,6 +1194,7 @@ def delete_product(request):
         
         # Delete product
         product.delete()
+        menu_cache.invalidate(product.merchantid)
         
         return Response({
             'success': True, 
@@ -1217,6 +1238,8 @@ def toggle_product_availability(request):
                 menu_item.availability = (product.amountinstock > 0)
                 menu_item.save()
             
+            menu_cache.invalidate(product.merchantid)
+            
             return Response({
                 'success': True,
                 'available': product.amountinstock > 0,
@@ -1297,6 +1320,7 @@ def get_categories(request):
         print(f"🔥 Error in get_categories: {str(e)}")
         return Response({'error': str(e)}, status=400)
 @api_view(['POST'])
+@idempotent
 def process_payment(request):
     """
     Process a payment between two users/merchants
@@ -1321,140 +1345,239 @@ def process_payment(request):
         except (ValueError, InvalidOperation):
             return Response({"success": False, "error": "Invalid amount"}, status=400)
         
-        # Find sender (can be user or merchant)
-        sender = None
-        sender_type = None
-        
-        # Check if sender is a user
-        try:
-            user_sender = User.objects.get(paycode=sender_paycode)
-            sender = user_sender
-            sender_type = 'user'
-            print(f"✅ Sender is USER: {user_sender.username}")
-        except User.DoesNotExist:
-            pass
-        
-        # Check if sender is a merchant
-        if not sender:
-            try:
-                merchant_sender = Merchant.objects.get(merchantpaycode=sender_paycode)
-                sender = merchant_sender
-                sender_type = 'merchant'
-                print(f"✅ Sender is MERCHANT: {merchant_sender.username}")
-            except Merchant.DoesNotExist:
-                return Response({"success": False, "error": "Sender not found"}, status=404)
-        
-        # Verify PIN
-        if str(sender.pin) != str(pin):
-            return Response({"success": False, "error": "Invalid PIN"}, status=400)
-        
-        # Check sender balance
-        sender_balance = sender.balance if hasattr(sender, 'balance') else Decimal('0')
-        
-        # Calculate charge (20 RWF) as Decimal
-        charge = Decimal('20.0')
-        total_amount = amount_decimal + charge
-        
-        # Check if sender has sufficient balance
-        if sender_balance < total_amount:
-            return Response({
-                "success": False, 
-                "error": f"Insufficient balance. Available: {sender_balance} RWF, Required: {total_amount} RWF"
-            }, status=400)
-        
-        # Find receiver (can be user or merchant)
-        receiver = None
-        receiver_type = None
-        
-        # Check if receiver is a user
         try:
-            user_receiver = User.objects.get(paycode=receiver_paycode)
-            receiver = user_receiver
-            receiver_type = 'user'
-            print(f"✅ Receiver is USER: {user_receiver.username}")
-        except User.DoesNotExist:
-            pass
-        
-        # Check if receiver is a merchant
-        if not receiver:
-            try:
-                merchant_receiver = Merchant.objects.get(merchantpaycode=receiver_paycode)
-                receiver = merchant_receiver
-                receiver_type = 'merchant'
-                print(f"✅ Receiver is MERCHANT: {merchant_receiver.username}")
-            except Merchant.DoesNotExist:
-                return Response({"success": False, "error": "Receiver not found"}, status=404)
+            result = ledger.transfer(sender_paycode, receiver_paycode, amount_decimal, pin)
+        except ledger.LedgerError as e:
+            return Response({"success": False, "error": e.message}, status=e.status_code)
         
-        # Check if sender is trying to pay themselves
-        if sender_paycode == receiver_paycode:
-            return Response({"success": False, "error": "Cannot send money to yourself"}, status=400)
+        sender = result.sender
+        receiver = result.receiver
+        print(f"💾 Stored transaction: Sender ({sender.type}) ID: {sender.id} -> Receiver ({receiver.type}) ID: {receiver.id}")
         
-        # Start transaction
-        with transaction.atomic():
-            # Deduct from sender (both are Decimal now)
-            sender.balance -= total_amount
-            sender.save()
-            
-            # Add to receiver (only the amount, not the charge)
-            receiver.balance += amount_decimal
-            receiver.save()
-            
-            # Create transaction record
-            transaction_id = int(datetime.now().timestamp() * 1000)
-            
-            # Determine sender and receiver IDs based on type
-            sender_id = sender.userid if sender_type == 'user' else sender.merchantid
-            receiver_id = receiver.userid if receiver_type == 'user' else receiver.merchantid
-            
-            # Create transaction record with sender and receiver types
-            trans = Transaction.objects.create(
-                transactionid=transaction_id,
-                transfertype='Normal transfer',
-                senderid=sender_id,
-                receiverid=receiver_id,
-                amount=amount_decimal,
-                charge=charge,
-                status='success',
-                sender_type=sender_type,
-                receiver_type=receiver_type
-            )
-            
-            print(f"💾 Stored transaction: Sender ({sender_type}) ID: {sender_id} -> Receiver ({receiver_type}) ID: {receiver_id}")
-            
-            # Return success response
-            return Response({
-                "success": True,
-                "message": "Payment successful",
-                "transaction_id": transaction_id,
-                "amount": float(amount_decimal),
-                "charge": float(charge),
-                "total_deducted": float(total_amount),
-                "sender_balance": float(sender.balance),
-                "receiver_balance": float(receiver.balance),
-                "receiver_name": receiver.username,
-                "receiver_type": receiver_type,
-                "sender_type": sender_type,
-            }, status=200)
+        # Return success response
+        return Response({
+            "success": True,
+            "message": "Payment successful",
+            "transaction_id": result.transaction_id,
+            "amount": float(result.amount),
+            "charge": float(result.charge),
+            "total_deducted": float(result.total),
+            "sender_balance": float(result.sender_balance),
+            "receiver_balance": float(result.receiver_balance),
+            "receiver_name": receiver.username,
+            "receiver_type": receiver.type,
+            "sender_type": sender.type,
+        }, status=200)
             
     except Exception as e:
         print(f"🔥 Error in process_payment: {str(e)}")
         import traceback
         traceback.print_exc()
         return Response({"success": False, "error": str(e)}, status=500)
+# Keyset pagination for transaction history, ordered newest first on (date, transactionid)
+TRANSACTIONS_MAX_LIMIT = 200
+TRANSACTIONS_STREAM_CHUNK = 500
+
+
+def _encode_transaction_cursor(trans):
+    raw = f"{trans.date.isoformat()}|{trans.transactionid}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def _decode_transaction_cursor(cursor):
+    """Return (date, transactionid) from a cursor token, raises ValueError if malformed"""
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        date_str, transaction_id = raw.split('|')
+        return datetime.fromisoformat(date_str), int(transaction_id)
+    except Exception:
+        raise ValueError("Invalid cursor")
+
+
+def _is_sender(trans, user_id, user_type):
+    return trans.senderid == user_id and trans.sender_type == user_type
+
+
+def _format_transaction(trans, user_id, user_type, other_party, names):
+    """Serialize one transaction from the point of view of the (user_type, user_id) account"""
+    is_sender = _is_sender(trans, user_id, user_type)
+    
+    # Get other party details using the sender_type and receiver_type fields
+    other_party_type, other_party_id = other_party
+    if other_party in names:
+        other_party_type, other_party_name = names[other_party]
+    else:
+        print(f"⚠️ Could not find other party (ID: {other_party_id}, Type: {other_party_type})")
+        other_party_name = f"Account {other_party_id}"
+    
+    # Calculate total for sent transactions
+    if is_sender:
+        total_amount = trans.amount + trans.charge if trans.amount and trans.charge else trans.amount
+    else:
+        total_amount = trans.amount
+    
+    return {
+        'transaction_id': trans.transactionid,
+        'date': trans.date.strftime('%d %B %Y %H:%M') if trans.date else 'Unknown date',
+        'short_date': trans.date.strftime('%d %b %Y') if trans.date else 'Unknown date',
+        'amount': float(trans.amount) if trans.amount else 0.0,
+        'charge': float(trans.charge) if trans.charge else 0.0,
+        'type': 'sent' if is_sender else 'received',
+        'other_party': other_party_name,
+        'other_party_type': other_party_type,
+        'status': trans.status if trans.status else 'success',
+        'total': float(total_amount) if total_amount else 0.0
+    }
+
+
+def _format_transactions(transactions, user_id, user_type):
+    """Serialize a batch of transactions, resolving all counterparty names in one go"""
+    counterparties = [
+        (trans.receiver_type, trans.receiverid) if _is_sender(trans, user_id, user_type)
+        else (trans.sender_type, trans.senderid)
+        for trans in transactions
+    ]
+    names = resolve_account_names(counterparties)
+    return [
+        _format_transaction(trans, user_id, user_type, other_party, names)
+        for trans, other_party in zip(transactions, counterparties)
+    ]
+
+
+def _parse_instant(value):
+    """Aware datetime from an ISO 8601 query param, naive values are in the server's timezone"""
+    parsed = parse_datetime(value)
+    if parsed is None:
+        raise ValueError(f"Invalid timestamp: {value}")
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed, timezone.get_current_timezone())
+    return parsed
+
+
+def _transaction_time_filter(since, until):
+    """Q on Transaction.date for the half-open range [since, until), either end optional"""
+    filters = Q()
+    if since:
+        filters &= Q(date__gte=_parse_instant(since))
+    if until:
+        filters &= Q(date__lt=_parse_instant(until))
+    return filters
+
+
+def _transaction_date_filter(year, month, day):
+    """
+    Build a Q on Transaction.date from the year/month/day query params.
+    Nested filters (year, year+month, year+month+day) become a half-open
+    datetime range so the (type, id, date) indexes can be used; other
+    combinations fall back to the date part lookups.
+    Raises ValueError on non-numeric or out-of-range values.
+    """
+    year = int(year) if year else None
+    month = int(month) if month else None
+    day = int(day) if day else None
+    
+    if year and (month or not day):
+        tz = timezone.get_current_timezone()
+        if not month:
+            start = datetime(year, 1, 1)
+            end = datetime(year + 1, 1, 1)
+        elif not day:
+            start = datetime(year, month, 1)
+            end = datetime(year + 1, 1, 1) if month == 12 else datetime(year, month + 1, 1)
+        else:
+            start = datetime(year, month, day)
+            end = start + timedelta(days=1)
+        return Q(date__gte=timezone.make_aware(start, tz), date__lt=timezone.make_aware(end, tz))
+    
+    filters = Q()
+    if year:
+        filters &= Q(date__year=year)
+    if month:
+        filters &= Q(date__month=month)
+    if day:
+        filters &= Q(date__day=day)
+    return filters
+
+
+def _account_transactions(user_id, user_type, filters, branch_limit=None):
+    """
+    Transactions sent or received by one account, newest first.
+    Runs as UNION ALL of a sender branch and a receiver branch so each side
+    is a range scan on its own (type, id, date) index instead of an OR scan.
+    When the backend allows it each branch is cut to branch_limit rows too.
+    """
+    sent = Transaction.objects.filter(filters, sender_type=user_type, senderid=user_id)
+    received = Transaction.objects.filter(filters, receiver_type=user_type, receiverid=user_id)
+    
+    if branch_limit is not None and connection.features.supports_slicing_ordering_in_compound:
+        sent = sent.order_by('-date', '-transactionid')[:branch_limit]
+        received = received.order_by('-date', '-transactionid')[:branch_limit]
+    
+    return sent.union(received, all=True).order_by('-date', '-transactionid')
+
+
+def _stream_transactions(transactions, user_id, user_type, limit):
+    """
+    Yield NDJSON lines, one per transaction, chunk by chunk so memory stays flat.
+    The last line carries the next_cursor for the following page.
+    """
+    last = None
+    sent = 0
+    chunk = []
+    
+    def flush(chunk):
+        for row in _format_transactions(chunk, user_id, user_type):
+            yield json.dumps(row) + "\n"
+    
+    for trans in transactions.iterator(chunk_size=TRANSACTIONS_STREAM_CHUNK):
+        if limit is not None and sent == limit:
+            break
+        chunk.append(trans)
+        sent += 1
+        last = trans
+        if len(chunk) == TRANSACTIONS_STREAM_CHUNK:
+            yield from flush(chunk)
+            chunk = []
+    else:
+        # Ran out of rows before hitting the limit: nothing left to page through
+        last = None
+    
+    yield from flush(chunk)
+    yield json.dumps({'next_cursor': _encode_transaction_cursor(last) if last else None}) + "\n"
+
+
 @api_view(['GET'])
 def get_user_transactions(request):
     """
-    Get all transactions for a specific user/merchant with filtering
+    Get transactions for a specific user/merchant with filtering.
+    Pass `limit` (and `cursor` from the previous page's next_cursor) to page
+    through the history newest first; `stream=ndjson` streams the rows instead
+    (not `format`, DRF reserves that for picking a renderer).
+    `since`/`until` are ISO 8601 instants bounding the dates (until excluded),
+    so clients can ask for their own local day.
     """
     try:
         email = request.GET.get('email')
         year = request.GET.get('year')
         month = request.GET.get('month')
         day = request.GET.get('day')
+        limit = request.GET.get('limit')
+        cursor = request.GET.get('cursor')
+        since = request.GET.get('since')
+        until = request.GET.get('until')
+        stream = request.GET.get('stream') == 'ndjson'
         
         if not email:
             return Response({"error": "Email parameter required"}, status=400)
         
+        if limit is not None or cursor:
+            try:
+                limit = min(int(limit or TRANSACTIONS_MAX_LIMIT), TRANSACTIONS_MAX_LIMIT)
+                if limit <= 0:
+                    raise ValueError
+            except ValueError:
+                return Response({"error": "Invalid limit"}, status=400)
+        
         # Find user
         user = None
         user_id = None
@@ -1482,84 +1605,48 @@ def get_user_transactions(request):
             except Merchant.DoesNotExist:
                 return Response({"error": "User not found"}, status=404)
         
-        # Get all transactions where user is either sender or receiver
-        # Since we need to handle both user and merchant IDs, we'll query without filtering by type first
-        transactions = Transaction.objects.filter(
-            Q(senderid=user_id) | Q(receiverid=user_id)
-        ).order_by('-date')
-        
         # Apply filters
-        if year:
-            transactions = transactions.filter(date__year=int(year))
-            print(f"📅 Filtering by year: {year}")
+        try:
+            filters = _transaction_date_filter(year, month, day) & _transaction_time_filter(since, until)
+        except ValueError:
+            return Response({"error": "Invalid date filter"}, status=400)
+        if year or month or day:
+            print(f"📅 Filtering by year: {year}, month: {month}, day: {day}")
         
-        if month:
-            transactions = transactions.filter(date__month=int(month))
-            print(f"📅 Filtering by month: {month}")
+        # Continue after the last row of the previous page
+        if cursor:
+            try:
+                cursor_date, cursor_id = _decode_transaction_cursor(cursor)
+            except ValueError as e:
+                return Response({"error": str(e)}, status=400)
+            filters &= Q(date__lt=cursor_date) | Q(date=cursor_date, transactionid__lt=cursor_id)
+        
+        transactions = _account_transactions(
+            user_id, user_type, filters,
+            branch_limit=limit + 1 if limit is not None and not stream else None
+        )
         
-        if day:
-            transactions = transactions.filter(date__day=int(day))
-            print(f"📅 Filtering by day: {day}")
+        if stream:
+            response = StreamingHttpResponse(
+                _stream_transactions(transactions, user_id, user_type, limit),
+                content_type='application/x-ndjson'
+            )
+            response['X-User-Type'] = user_type
+            response['X-User-Id'] = str(user_id)
+            return response
         
-        print(f"📊 Found {transactions.count()} transactions")
+        next_cursor = None
+        if limit is not None:
+            # Fetch one extra row to know whether another page exists
+            transactions = list(transactions[:limit + 1])
+            if len(transactions) > limit:
+                transactions = transactions[:limit]
+                next_cursor = _encode_transaction_cursor(transactions[-1])
+        else:
+            transactions = list(transactions)
+        print(f"📊 Found {len(transactions)} transactions")
         
-        # Format response
-        transaction_data = []
-        for trans in transactions:
-            # Determine transaction type
-            is_sender = trans.senderid == user_id
-            is_receiver = trans.receiverid == user_id
-            
-            # Get other party details using the sender_type and receiver_type fields
-            other_party_id = trans.receiverid if is_sender else trans.senderid
-            other_party_type = trans.receiver_type if is_sender else trans.sender_type
-            other_party_name = "Unknown"
-            
-            # Try to get other party name based on their type
-            try:
-                if other_party_type == 'user':
-                    # Other party is a user
-                    other_user = User.objects.get(userid=other_party_id)
-                    other_party_name = other_user.username
-                elif other_party_type == 'merchant':
-                    # Other party is a merchant
-                    other_merchant = Merchant.objects.get(merchantid=other_party_id)
-                    other_party_name = other_merchant.username
-                else:
-                    # Type not specified, try both
-                    try:
-                        other_user = User.objects.get(userid=other_party_id)
-                        other_party_name = other_user.username
-                        other_party_type = 'user'
-                    except User.DoesNotExist:
-                        try:
-                            other_merchant = Merchant.objects.get(merchantid=other_party_id)
-                            other_party_name = other_merchant.username
-                            other_party_type = 'merchant'
-                        except Merchant.DoesNotExist:
-                            other_party_name = f"Account {other_party_id}"
-            except Exception as e:
-                print(f"⚠️ Could not find other party (ID: {other_party_id}, Type: {other_party_type}): {e}")
-                other_party_name = f"Account {other_party_id}"
-            
-            # Calculate total for sent transactions
-            if is_sender:
-                total_amount = trans.amount + trans.charge if trans.amount and trans.charge else trans.amount
-            else:
-                total_amount = trans.amount
-            
-            transaction_data.append({
-                'transaction_id': trans.transactionid,
-                'date': trans.date.strftime('%d %B %Y %H:%M') if trans.date else 'Unknown date',
-                'short_date': trans.date.strftime('%d %b %Y') if trans.date else 'Unknown date',
-                'amount': float(trans.amount) if trans.amount else 0.0,
-                'charge': float(trans.charge) if trans.charge else 0.0,
-                'type': 'sent' if is_sender else 'received',
-                'other_party': other_party_name,
-                'other_party_type': other_party_type,
-                'status': trans.status if trans.status else 'success',
-                'total': float(total_amount) if total_amount else 0.0
-            })
+        transaction_data = _format_transactions(transactions, user_id, user_type)
         
         return Response({
             'success': True,
@@ -1568,7 +1655,8 @@ def get_user_transactions(request):
             'balance': float(user_balance),
             'user_id': user_id,
             'total_transactions': len(transaction_data),
-            'transactions': transaction_data
+            'transactions': transaction_data,
+            'next_cursor': next_cursor,
         })
         
     except Exception as e:
@@ -1585,7 +1673,6 @@ def test_endpoint(request):
         'time': datetime.now().isoformat()
     })
 
-import random
 from datetime import datetime
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -1595,6 +1682,7 @@ from .models import Order
 from .serializers import OrderSerializer
 
 @api_view(['POST'])
+@idempotent
 def create_order(request):
     """
     Create a new order
@@ -1613,8 +1701,8 @@ def create_order(request):
                     'error': f'Missing required field: {field}'
                 }, status=status.HTTP_400_BAD_REQUEST)
         
-        # Generate unique order ID (timestamp + random)
-        order_id = int(datetime.now().timestamp() * 1000) + random.randint(1000, 9999)
+        # Generate unique order ID
+        order_id = generate_id()
         
         # Create order
         with transaction.atomic():
@@ -1633,11 +1721,13 @@ def create_order(request):
                 status=data.get('status', 'pending')
             )
             
-            # Update product stock if needed
-            _update_product_stock(data['items'], data['merchant_id'])
+            # Reserve product stock, rolls the order back if anything is short
+            inventory.reserve_stock(data['items'], data['merchant_id'])
+            rollups.record_order_created(order)
             
             # Create notification for merchant
             _create_order_notification(order)
+            publish_order_event(order, 'order_created')
         
         serializer = OrderSerializer(order)
         
@@ -1648,6 +1738,17 @@ def create_order(request):
             'order': serializer.data
         }, status=status.HTTP_201_CREATED)
         
+    except inventory.InvalidOrderItems as e:
+        return Response({
+            'success': False,
+            'error': e.message
+        }, status=status.HTTP_400_BAD_REQUEST)
+    except inventory.InsufficientStock as e:
+        return Response({
+            'success': False,
+            'error': e.message,
+            'shortages': [{'productname': name, 'available': available} for name, available in e.shortages]
+        }, status=status.HTTP_409_CONFLICT)
     except Exception as e:
         print(f"🔥 Error creating order: {str(e)}")
         import traceback
@@ -1657,59 +1758,16 @@ def create_order(request):
             'error': str(e)
         }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
-def _update_product_stock(items, merchant_id):
-    """
-    Update product stock after order
-    """
-    try:
-        from .models import Product
-        
-        for item in items:
-            product_id = item.get('productid')
-            quantity = item.get('quantity', 0)
-            
-            if product_id and quantity > 0:
-                try:
-                    product = Product.objects.get(
-                        productid=product_id,
-                        merchantid=merchant_id
-                    )
-                    
-                    # Reduce stock
-                    new_stock = max(0, product.amountinstock - quantity)
-                    product.amountinstock = new_stock
-                    product.save()
-                    
-                    # Update menu availability
-                    from .models import Menu
-                    menu_items = Menu.objects.filter(
-                        merchantid=merchant_id,
-                        productid=product_id
-                    )
-                    for menu_item in menu_items:
-                        menu_item.availability = (new_stock > 0)
-                        menu_item.save()
-                        
-                except Product.DoesNotExist:
-                    print(f"⚠️ Product {product_id} not found")
-                    continue
-                    
-    except Exception as e:
-        print(f"⚠️ Error updating stock: {e}")
-
 def _create_order_notification(order):
     """
     Create notification for merchant about new order
     """
     try:
-        from .models import Notification
-        
-        Notification.objects.create(
+        notifications_feed.notify(
+            'merchant', order.merchant_id,
             title=f"New Order #{order.order_number}",
             content=f"New order from {order.customer_name}. Total: {order.total_amount} RWF",
-            urgency="high",
-            designated_to="merchant",
-            date=datetime.now()
+            urgency="high"
         )
         
     except Exception as e:
@@ -1786,9 +1844,12 @@ def update_order_status(request):
         return Response({"error": f"Invalid status. Must be one of: {valid_statuses}"}, status=400)
     
     try:
-        order = Order.objects.get(orderid=order_id)
-        order.status = new_status
-        order.save()
+        with transaction.atomic():
+            order = Order.objects.select_for_update().get(orderid=order_id)
+            old_status = order.status
+            order.status = new_status
+            order.save()
+            rollups.record_status_change(order, old_status, new_status)
         
         # Create notification for customer
         _create_status_notification(order)
@@ -1811,8 +1872,6 @@ def _create_status_notification(order):
     Create notification for customer about order status change
     """
     try:
-        from .models import Notification
-        
         status_messages = {
             'confirmed': 'Your order has been confirmed',
             'preparing': 'Your order is being prepared',
@@ -1822,12 +1881,11 @@ def _create_status_notification(order):
         }
         
         if order.status in status_messages:
-            Notification.objects.create(
+            notifications_feed.notify(
+                order.customer_type, order.customer_id,
                 title=f"Order #{order.order_number} Update",
                 content=f"{status_messages[order.status]} by {order.merchant_name}",
-                urgency="medium",
-                designated_to=order.customer_type,
-                date=datetime.now()
+                urgency="medium"
             )
         
     except Exception as e:
@@ -1895,6 +1953,9 @@ def get_customer_orders(request):
         traceback.print_exc()
         return Response({'error': str(e)}, status=500)
 
+# Columns whose values decide a merchant order poll's ETag
+ORDER_ETAG_FIELDS = ('orderid', 'status', 'is_paid', 'updated_at')
+
 @api_view(['GET'])
 def get_merchant_orders(request):
     """
@@ -1917,14 +1978,21 @@ def get_merchant_orders(request):
             merchant_id=merchant_id
         ).order_by('-created_at')
         
-        # Serialize the orders
-        serializer = OrderSerializer(orders, many=True)
+        # Cheap version token so idle polls get a 304 without serializing anything;
+        # updated_at has one-second precision, so status and is_paid are hashed too
+        etag, total = rows_etag(('merchant-orders', merchant_id), orders, ORDER_ETAG_FIELDS)
         
-        return Response({
-            'success': True,
-            'count': orders.count(),
-            'orders': serializer.data
-        })
+        def build():
+            # Serialize the orders
+            serializer = OrderSerializer(orders, many=True)
+            
+            return Response({
+                'success': True,
+                'count': total,
+                'orders': serializer.data
+            })
+        
+        return conditional_response(request, etag, build)
         
     except Exception as e:
         print(f"🔥 Error in get_merchant_orders: {str(e)}")
@@ -2002,29 +2070,32 @@ def cancel_order(request):
             return Response({"error": "Order ID, customer ID and type required"}, status=400)
         
         try:
-            order = Order.objects.get(
-                orderid=int(order_id),
-                customer_id=int(customer_id),
-                customer_type=customer_type
-            )
-            
-            # Only allow cancellation for pending or delivered orders
-            if order.status not in ['pending', 'delivered']:
-                return Response({
-                    "error": f"Cannot cancel order with status: {order.status}"
-                }, status=400)
-            
-            order.status = 'cancelled'
-            order.save()
+            with transaction.atomic():
+                order = Order.objects.select_for_update().get(
+                    orderid=int(order_id),
+                    customer_id=int(customer_id),
+                    customer_type=customer_type
+                )
+                
+                # Only allow cancellation for pending or delivered orders
+                if order.status not in ['pending', 'delivered']:
+                    return Response({
+                        "error": f"Cannot cancel order with status: {order.status}"
+                    }, status=400)
+                
+                old_status = order.status
+                order.status = 'cancelled'
+                order.save()
+                rollups.record_status_change(order, old_status, 'cancelled')
             
             # Create notification
-            Notification.objects.create(
+            notifications_feed.notify(
+                'merchant', order.merchant_id,
                 title=f"Order #{order.order_number} Cancelled",
                 content=f"Order #{order.order_number} has been cancelled by {order.customer_name}",
-                urgency="medium",
-                designated_to="merchant",
-                date=datetime.now()
+                urgency="medium"
             )
+            publish_order_event(order, 'order_cancelled')
             
             serializer = OrderSerializer(order)
             
@@ -2044,6 +2115,7 @@ def cancel_order(request):
         return Response({'error': str(e)}, status=500)
 
 @api_view(['POST'])
+@idempotent
 def mark_order_paid(request):
     """
     Mark an order as paid
@@ -2058,52 +2130,16 @@ def mark_order_paid(request):
             return Response({"error": "Order ID and transaction ID required"}, status=400)
         
         try:
-            order = Order.objects.get(orderid=int(order_id))
+            order, settled = settle_order(int(order_id), transaction_id, tip_amount, message)
             
             # Check if already paid
-            if order.is_paid:
+            if not settled:
                 return Response({
                     "success": True,
                     "message": "Order already paid",
                     "order": OrderSerializer(order).data
                 })
             
-            # Mark order as paid
-            order.is_paid = True
-            order.payment_date = datetime.now()
-            order.transaction_id = transaction_id
-            order.tip_amount = Decimal(str(tip_amount))
-            order.customer_message = message
-            order.save()
-            
-            # Create sales record
-            items = order.get_items_list()
-            for item in items:
-                Sales.objects.create(
-                    merchantid=order.merchant_id,
-                    productname=item.get('productname', 'Unknown'),
-                    amount=Decimal(str(item.get('price', 0))) * Decimal(str(item.get('quantity', 1))),
-                    quantity=item.get('quantity', 1)
-                )
-            
-            # Create notification
-            Notification.objects.create(
-                title=f"Order #{order.order_number} Paid",
-                content=f"Order #{order.order_number} has been paid by {order.customer_name}. Amount: {order.total_amount} RWF",
-                urgency="medium",
-                designated_to="merchant",
-                date=datetime.now()
-            )
-            
-            # Also create notification for customer
-            Notification.objects.create(
-                title=f"Payment Confirmation",
-                content=f"Payment for order #{order.order_number} to {order.merchant_name} has been completed.",
-                urgency="low",
-                designated_to=order.customer_type,
-                date=datetime.now()
-            )
-            
             serializer = OrderSerializer(order)
             
             return Response({
@@ -2120,6 +2156,68 @@ def mark_order_paid(request):
         import traceback
         traceback.print_exc()
         return Response({'error': str(e)}, status=500)
+
+@api_view(['POST'])
+@idempotent
+def pay_order(request):
+    """
+    Pay for an order and mark it paid in one request, replacing the
+    process-payment/ + mark-order-paid/ round trips. Safe to retry.
+    """
+    try:
+        order_id = request.data.get('order_id')
+        sender_paycode = request.data.get('sender_paycode')
+        pin = request.data.get('pin')
+        tip_amount = request.data.get('tip_amount', 0) or 0
+        message = request.data.get('message', '')
+        
+        if not all([order_id, sender_paycode, pin]):
+            return Response({"success": False, "error": "Order ID, sender paycode and PIN required"}, status=400)
+        
+        try:
+            order_id = int(order_id)
+            tip_amount = Decimal(str(tip_amount))
+        except (ValueError, InvalidOperation):
+            return Response({"success": False, "error": "Invalid order ID or tip amount"}, status=400)
+        
+        try:
+            order, result = settle_pay_order(order_id, sender_paycode, pin, tip_amount, message)
+        except Order.DoesNotExist:
+            return Response({"success": False, "error": "Order not found"}, status=404)
+        except ledger.LedgerError as e:
+            return Response({"success": False, "error": e.message}, status=e.status_code)
+        
+        if result is None:
+            return Response({
+                "success": True,
+                "already_paid": True,
+                "message": "Order already paid",
+                "transaction_id": order.transaction_id,
+                "order": OrderSerializer(order).data
+            })
+        
+        print(f"💾 Order #{order.order_number} paid with transaction {result.transaction_id}")
+        
+        return Response({
+            "success": True,
+            "already_paid": False,
+            "message": "Order paid successfully",
+            "transaction_id": result.transaction_id,
+            "amount": float(result.amount),
+            "charge": float(result.charge),
+            "total_deducted": float(result.total),
+            "sender_balance": float(result.sender_balance),
+            "receiver_name": result.receiver.username,
+            "receiver_type": result.receiver.type,
+            "sender_type": result.sender.type,
+            "order": OrderSerializer(order).data
+        })
+        
+    except Exception as e:
+        print(f"🔥 Error in pay_order: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return Response({"success": False, "error": str(e)}, status=500)
 @api_view(['GET'])
 def get_merchant_order_notifications(request):
     """
@@ -2136,61 +2234,118 @@ def get_merchant_order_notifications(request):
         except ValueError:
             return Response({"error": "Invalid merchant ID"}, status=400)
         
-        # CRITICAL: Verify merchant exists
-        try:
-            merchant = Merchant.objects.get(merchantid=merchant_id)
-        except Merchant.DoesNotExist:
-            return Response({"error": "Merchant not found"}, status=404)
-        
-        print(f"🔍 Fetching orders for merchant ID: {merchant_id} ({merchant.username})")
-        
         # Get orders for this specific merchant only
-        orders = Order.objects.filter(
+        active_orders = Order.objects.filter(
             merchant_id=merchant_id,
             status__in=['pending', 'confirmed', 'preparing', 'ready']
-        ).order_by('-created_at')[:20]
+        ).order_by('-created_at')
         
-        print(f"✅ Found {orders.count()} orders for merchant {merchant.username}")
+        # Only the first 20 are shown, so only they are tagged
+        etag, _ = rows_etag(('merchant-order-notifications', merchant_id), active_orders[:20], ORDER_ETAG_FIELDS)
         
-        # Convert orders to notification format
-        order_notifications = []
-        for order in orders:
-            # Debug: Check if order belongs to this merchant
-            if order.merchant_id != merchant_id:
-                print(f"⚠️ Warning: Order {order.orderid} has merchant_id={order.merchant_id}, expected {merchant_id}")
-                continue
+        def build():
+            # CRITICAL: Verify merchant exists
+            try:
+                merchant = Merchant.objects.get(merchantid=merchant_id)
+            except Merchant.DoesNotExist:
+                return Response({"error": "Merchant not found"}, status=404)
+        
+            print(f"🔍 Fetching orders for merchant ID: {merchant_id} ({merchant.username})")
+        
+            orders = list(active_orders[:20])
+            print(f"✅ Found {len(orders)} orders for merchant {merchant.username}")
+        
+            # Convert orders to notification format
+            order_notifications = []
+            for order in orders:
+                # Debug: Check if order belongs to this merchant
+                if order.merchant_id != merchant_id:
+                    print(f"⚠️ Warning: Order {order.orderid} has merchant_id={order.merchant_id}, expected {merchant_id}")
+                    continue
                 
-            notification = {
-                'title': f"Order #{order.order_number} - {order.status.upper()}",
-                'content': f"Order from {order.customer_name}. Total: {order.total_amount} RWF",
-                'urgency': 'high' if order.status == 'pending' else 'medium',
-                'date': order.created_at.isoformat() if order.created_at else datetime.now().isoformat(),
-                'designated_to': 'merchant',
-                'order_id': order.orderid,
-                'order_number': order.order_number,
-                'order_status': order.status,
-                'customer_name': order.customer_name,
-                'customer_id': order.customer_id,
-                'total_amount': float(order.total_amount),
-                'items': order.get_items_list(),
-                'table_name': order.table_name or '',
-                'is_paid': order.is_paid,
-            }
-            order_notifications.append(notification)
+                notification = {
+                    'title': f"Order #{order.order_number} - {order.status.upper()}",
+                    'content': f"Order from {order.customer_name}. Total: {order.total_amount} RWF",
+                    'urgency': 'high' if order.status == 'pending' else 'medium',
+                    'date': order.created_at.isoformat() if order.created_at else datetime.now().isoformat(),
+                    'designated_to': 'merchant',
+                    'order_id': order.orderid,
+                    'order_number': order.order_number,
+                    'order_status': order.status,
+                    'customer_name': order.customer_name,
+                    'customer_id': order.customer_id,
+                    'total_amount': float(order.total_amount),
+                    'items': order.get_items_list(),
+                    'table_name': order.table_name or '',
+                    'is_paid': order.is_paid,
+                }
+                order_notifications.append(notification)
         
-        return Response({
-            'success': True,
-            'count': len(order_notifications),
-            'merchant_id': merchant_id,
-            'merchant_name': merchant.username,
-            'notifications': order_notifications
-        })
+            return Response({
+                'success': True,
+                'count': len(order_notifications),
+                'merchant_id': merchant_id,
+                'merchant_name': merchant.username,
+                'notifications': order_notifications
+            })
+        
+        return conditional_response(request, etag, build)
         
     except Exception as e:
         print(f"🔥 Error in get_merchant_order_notifications: {str(e)}")
         import traceback
         traceback.print_exc()
         return Response({'error': str(e)}, status=500)
+
+# Seconds between keep-alive comments on an idle order stream
+ORDER_STREAM_HEARTBEAT = 15
+
+async def merchant_order_stream(request):
+    """
+    Server-sent events feed of a merchant's order changes (created, status
+    changed, cancelled, paid), replacing get_merchant_order_notifications
+    polling. Serve through vubapay.asgi so open streams don't hold a worker;
+    under WSGI the stream would never end, so it answers 501 and clients
+    keep polling.
+    """
+    if not isinstance(request, ASGIRequest):
+        return JsonResponse({
+            "error": "Order stream needs the ASGI server, poll get-merchant-order-notifications/ instead"
+        }, status=501)
+    
+    merchant_id = request.GET.get('merchant_id')
+    
+    if not merchant_id:
+        return JsonResponse({"error": "Merchant ID required"}, status=400)
+    
+    try:
+        merchant_id = int(merchant_id)
+    except ValueError:
+        return JsonResponse({"error": "Invalid merchant ID"}, status=400)
+    
+    if not await Merchant.objects.filter(merchantid=merchant_id).aexists():
+        return JsonResponse({"error": "Merchant not found"}, status=404)
+    
+    async def events():
+        broker = get_broker()
+        subscription = broker.subscribe(merchant_id)
+        print(f"📡 Merchant {merchant_id} subscribed to order stream")
+        try:
+            yield "retry: 3000\n\n"
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), ORDER_STREAM_HEARTBEAT)
+                    yield format_sse(event)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+        finally:
+            broker.unsubscribe(subscription)
+            print(f"📡 Merchant {merchant_id} left order stream")
+    
+    response = StreamingHttpResponse(events(), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    response['X-Accel-Buffering'] = 'no'
+    return response
 @api_view(['POST'])
 def update_order_status(request):
     """
@@ -2210,15 +2365,17 @@ def update_order_status(request):
             return Response({"error": f"Invalid status. Must be one of: {valid_statuses}"}, status=400)
         
         try:
-            order = Order.objects.get(
-                orderid=int(order_id),
-                merchant_id=int(merchant_id)  # Ensure merchant can only update their own orders
-            )
-            
-            old_status = order.status
-            order.status = new_status
-            order.updated_at = timezone.now()
-            order.save()
+            with transaction.atomic():
+                order = Order.objects.select_for_update().get(
+                    orderid=int(order_id),
+                    merchant_id=int(merchant_id)  # Ensure merchant can only update their own orders
+                )
+                
+                old_status = order.status
+                order.status = new_status
+                order.updated_at = timezone.now()
+                order.save()
+                rollups.record_status_change(order, old_status, new_status)
             
             # Create notification for customer about status change
             status_messages = {
@@ -2230,22 +2387,21 @@ def update_order_status(request):
             }
             
             if new_status in status_messages:
-                Notification.objects.create(
+                notifications_feed.notify(
+                    order.customer_type, order.customer_id,
                     title=f"Order #{order.order_number} Update",
                     content=f"{status_messages[new_status]} by {order.merchant_name}",
-                    urgency="medium",
-                    designated_to=order.customer_type,
-                    date=timezone.now()
+                    urgency="medium"
                 )
             
             # Also create notification for merchant
-            Notification.objects.create(
+            notifications_feed.notify(
+                'merchant', order.merchant_id,
                 title=f"Order #{order.order_number} Status Updated",
                 content=f"You changed order status from {old_status} to {new_status}",
-                urgency="low",
-                designated_to="merchant",
-                date=timezone.now()
+                urgency="low"
             )
+            publish_order_event(order, 'order_status_changed')
             
             serializer = OrderSerializer(order)
             
@@ -2373,147 +2529,11 @@ def verify_pin(request):
         traceback.print_exc()
         return Response({"success": False, "error": str(e)}, status=500)
 
-# In your views.py, replace all admin views with this single view:
-
 from django.shortcuts import render
-from django.db.models import Count, Sum, Q
+from django.db.models import Q
 from datetime import datetime, timedelta
 import json
 
-def admin_dashboard(request):
-    """Single comprehensive admin dashboard"""
-    # Get all statistics
-    from .models import User, Merchant, Order, Transaction, Product, Notification, Sales, Menu
-    
-    # Basic counts
-    total_users = User.objects.count()
-    total_merchants = Merchant.objects.count()
-    total_orders = Order.objects.count()
-    total_products = Product.objects.count()
-    total_transactions = Transaction.objects.count()
-    
-    # Today's stats
-    today = datetime.now().date()
-    orders_today = Order.objects.filter(created_at__date=today).count()
-    
-    # Revenue calculations
-    total_revenue = Transaction.objects.aggregate(total=Sum('amount'))['total'] or 0
-    revenue_today = Transaction.objects.filter(date__date=today).aggregate(total=Sum('amount'))['total'] or 0
-    
-    # Recent data for display
-    recent_users = User.objects.all().order_by('-userid')[:10]
-    recent_merchants = Merchant.objects.all().order_by('-merchantid')[:10]
-    recent_orders = Order.objects.all().order_by('-created_at')[:10]
-    recent_transactions = Transaction.objects.all().order_by('-date')[:10]
-    recent_products = Product.objects.all().order_by('-productid')[:10]
-    
-    # Status counts for orders
-    order_status_counts = Order.objects.values('status').annotate(count=Count('status'))
-    
-    # Top merchants by revenue
-    top_merchants = []
-    merchants = Merchant.objects.all()[:10]
-    for merchant in merchants:
-        revenue = Transaction.objects.filter(
-            receiverid=merchant.merchantid,
-            receiver_type='merchant'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        order_count = Order.objects.filter(merchant_id=merchant.merchantid).count()
-        product_count = Product.objects.filter(merchantid=merchant.merchantid).count()
-        
-        top_merchants.append({
-            'id': merchant.merchantid,
-            'name': merchant.username,
-            'email': merchant.email,
-            'revenue': revenue,
-            'orders': order_count,
-            'products': product_count
-        })
-    
-    # Daily revenue for last 7 days (for charts)
-    daily_revenue = []
-    for i in range(7):
-        date = today - timedelta(days=i)
-        revenue = Transaction.objects.filter(
-            date__date=date  # This is fine because Transaction.date is DateTimeField
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        
-        daily_revenue.append({
-            'date': date.isoformat(),
-            'revenue': float(revenue)
-        })
-    
-    # FIXED: User growth for last 7 days - Remove date__lte for DateField
-    user_growth = []
-    for i in range(7):
-        date = today - timedelta(days=i)
-        
-        # For DateField, just use __lte without date__
-        user_count = User.objects.filter(
-            dateofbirth__lte=date
-        ).count()
-        
-        merchant_count = Merchant.objects.filter(
-            dateofcreation__lte=date
-        ).count()
-        
-        user_growth.append({
-            'date': date.isoformat(),
-            'users': user_count,
-            'merchants': merchant_count
-        })
-    
-    # System notifications
-    system_notifications = Notification.objects.all().order_by('-date')[:20]
-    
-    # Prepare data for charts (simplified for now)
-    order_status_data = {
-        'labels': [],
-        'data': []
-    }
-    for status in order_status_counts:
-        order_status_data['labels'].append(status['status'])
-        order_status_data['data'].append(status['count'])
-    
-    # User distribution data
-    user_distribution_data = {
-        'labels': ['Users', 'Merchants'],
-        'data': [total_users, total_merchants]
-    }
-    
-    context = {
-        'total_users': total_users,
-        'total_merchants': total_merchants,
-        'total_orders': total_orders,
-        'total_products': total_products,
-        'total_transactions': total_transactions,
-        'orders_today': orders_today,
-        'total_revenue': total_revenue,
-        'revenue_today': revenue_today,
-        'today': today,
-        
-        # Recent data
-        'recent_users': recent_users,
-        'recent_merchants': recent_merchants,
-        'recent_orders': recent_orders,
-        'recent_transactions': recent_transactions,
-        'recent_products': recent_products,
-        'system_notifications': system_notifications,
-        
-        # Analytics
-        'order_status_counts': list(order_status_counts),
-        'top_merchants': top_merchants,
-        'daily_revenue': daily_revenue,
-        'user_growth': user_growth,
-        
-        # For charts
-        'order_status_data': json.dumps(order_status_data),
-        'user_distribution_data': json.dumps(user_distribution_data),
-    }
-    
-    return render(request, 'api/admin_dashboard.html', context)
-
 # API endpoints for admin data
 from rest_framework.decorators import api_view
 from rest_framework.response import Response
@@ -2521,21 +2541,20 @@ from rest_framework.response import Response
 @api_view(['GET'])
 def get_dashboard_stats(request):
     """API endpoint for dashboard statistics"""
-    from .models import User, Merchant, Order, Transaction
-    from datetime import datetime, timedelta
+    from .models import User, Merchant, Transaction
     
-    today = datetime.now().date()
-    yesterday = today - timedelta(days=1)
+    counts = dashboard_stats.totals()
+    activity = dashboard_stats.activity()
     
     # Get counts
     stats = {
-        'total_users': User.objects.count(),
-        'total_merchants': Merchant.objects.count(),
-        'total_orders': Order.objects.count(),
-        'orders_today': Order.objects.filter(created_at__date=today).count(),
-        'orders_yesterday': Order.objects.filter(created_at__date=yesterday).count(),
-        'total_revenue': Transaction.objects.aggregate(total=Sum('amount'))['total'] or 0,
-        'revenue_today': Transaction.objects.filter(date__date=today).aggregate(total=Sum('amount'))['total'] or 0,
+        'total_users': counts['total_users'],
+        'total_merchants': counts['total_merchants'],
+        'total_orders': counts['total_orders'],
+        'orders_today': activity['orders_today'],
+        'orders_yesterday': activity['orders_yesterday'],
+        'total_revenue': activity['total_revenue'],
+        'revenue_today': activity['revenue_today'],
         'active_users': User.objects.filter(balance__gt=0).count(),
         'active_merchants': Merchant.objects.filter(balance__gt=0).count(),
     }
@@ -2621,14 +2640,11 @@ def get_user_details_api(request):
 def create_user_admin(request):
     """API endpoint to create user from admin"""
     try:
-        from .models import User
-        from .utils import generate_user_paycode
-        
         data = request.data
         
-        user = User.objects.create(
+        user = paycodes.create_account(
+            'user',
             nationalid=data.get('national_id'),
-            paycode=generate_user_paycode(),
             accounttype='normal',
             email=data.get('email'),
             username=data.get('username'),
@@ -2652,14 +2668,11 @@ def create_user_admin(request):
 def create_merchant_admin(request):
     """API endpoint to create merchant from admin"""
     try:
-        from .models import Merchant
-        from .utils import generate_merchant_paycode
-        
         data = request.data
         
-        merchant = Merchant.objects.create(
+        merchant = paycodes.create_account(
+            'merchant',
             nationalid=data.get('national_id'),
-            merchantpaycode=generate_merchant_paycode(),
             businesstype=data.get('business_type'),
             accounttype='merchant',
             email=data.get('email'),
@@ -2676,10 +2689,115 @@ def create_merchant_admin(request):
             'message': 'Merchant created successfully',
             'merchant_id': merchant.merchantid
         })
-        
+
     except Exception as e:
         return Response({'error': str(e)}, status=400)
 
+@api_view(['POST'])
+def import_accounts_admin(request):
+    """
+    API endpoint to bulk import users/merchants from an uploaded CSV or NDJSON file.
+    Columns match create-user/create-merchant plus `type` (user/merchant) unless
+    the `type` form field sets it for the whole file. Returns a per-row error report.
+    """
+    try:
+        upload = request.FILES.get('file')
+        if not upload:
+            return Response({'error': 'No file uploaded'}, status=400)
+
+        fmt = request.data.get('format') or ('ndjson' if upload.name.endswith(('.ndjson', '.jsonl')) else 'csv')
+        default_type = request.data.get('type') or None
+        if default_type not in (None, 'user', 'merchant'):
+            return Response({'error': "type must be 'user' or 'merchant'"}, status=400)
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
+
+        importer = account_import.AccountImporter(default_type=default_type, dry_run=dry_run)
+        stream = io.TextIOWrapper(upload.file, encoding='utf-8-sig', newline='')
+        report = importer.run(account_import.read_rows(stream, fmt))
+        print(f"📥 Account import: {report['created_users']} users, "
+              f"{report['created_merchants']} merchants, {report['failed']} failed")
+
+        return Response({'success': True, **report})
+
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    except Exception as e:
+        import traceback
+        traceback.print_exc()
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['POST'])
+def send_notification_admin(request):
+    """API endpoint to broadcast a notification to all users, merchants or everyone"""
+    try:
+        data = request.data
+        title = (data.get('title') or '').strip()
+        content = (data.get('content') or '').strip()
+        if not title or not content:
+            return Response({'error': 'Title and message are required'}, status=400)
+        if data.get('urgency', 'medium') not in ('low', 'medium', 'high'):
+            return Response({'error': 'Urgency must be low, medium or high'}, status=400)
+        
+        notification = notifications_feed.broadcast(
+            data.get('designated_to', 'all'),
+            title=title,
+            content=content,
+            urgency=data.get('urgency', 'medium')
+        )
+        
+        return Response({
+            'success': True,
+            'message': 'Notification sent successfully',
+            'notification_id': notification.notificationid
+        })
+        
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
+@api_view(['GET'])
+def admin_table(request, entity):
+    """
+    API endpoint paging through one admin table (users, merchants, orders,
+    transactions, products, services, menus), newest first.
+    Pass next_before from the previous page as `before` to continue.
+    `q` prefix-searches paycode, email, username or phone (pick one with
+    `field`, otherwise it is guessed from q); any other parameter naming a
+    filterable column must match exactly, e.g. ?status=pending&merchant_id=3.
+    Other parameters (cache busters like ?_=123) are ignored.
+    """
+    try:
+        if entity not in admin_tables.ADMIN_TABLES:
+            return Response({'error': f'Unknown table: {entity}'}, status=404)
+        
+        params = request.query_params
+        try:
+            before = params.get('before')
+            before = int(before) if before else None
+            page_size = int(params.get('page_size', admin_tables.DEFAULT_PAGE_SIZE))
+        except ValueError:
+            return Response({'error': 'before and page_size must be numbers'}, status=400)
+        
+        filters = {
+            key: value for key, value in params.items()
+            if key not in ('before', 'page_size', 'q', 'field') and value != ''
+        }
+        try:
+            page = admin_tables.page(
+                entity, before, page_size,
+                query=params.get('q', '').strip() or None,
+                search_field=params.get('field') or None,
+                filters=filters,
+            )
+        except (ValueError, TypeError) as e:
+            return Response({'error': str(e)}, status=400)
+        
+        return Response({'success': True, 'table': entity, **page})
+        
+    except Exception as e:
+        return Response({'error': str(e)}, status=500)
+
 @api_view(['PUT'])
 def update_user_balance(request):
     """API endpoint to update user/merchant balance"""
@@ -2715,66 +2833,15 @@ def update_user_balance(request):
 @api_view(['GET'])
 def get_system_analytics(request):
     """API endpoint for system analytics"""
-    from .models import Order, Transaction, User, Merchant
-    from datetime import datetime, timedelta
-    import json
-    
     # Get date range (last 30 days)
-    end_date = datetime.now().date()
+    end_date = timezone.localdate()
     start_date = end_date - timedelta(days=30)
     
-    # Daily revenue for last 30 days
-    daily_revenue = []
-    for i in range(30):
-        date = end_date - timedelta(days=i)
-        revenue = Transaction.objects.filter(
-            date__date=date
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        daily_revenue.append({
-            'date': date.isoformat(),
-            'revenue': float(revenue)
-        })
-    
-    # Order status distribution
-    order_status = Order.objects.values('status').annotate(
-        count=Count('status')
-    )
-    
-    # User growth (last 7 days)
-    user_growth = []
-    for i in range(7):
-        date = end_date - timedelta(days=i)
-        user_count = User.objects.filter(
-            dateofbirth__date__lte=date
-        ).count()
-        merchant_count = Merchant.objects.filter(
-            dateofcreation__date__lte=date
-        ).count()
-        user_growth.append({
-            'date': date.isoformat(),
-            'users': user_count,
-            'merchants': merchant_count
-        })
-    
-    # Top merchants by revenue
-    top_merchants = []
-    merchants = Merchant.objects.all()[:10]
-    for merchant in merchants:
-        revenue = Transaction.objects.filter(
-            receiverid=merchant.merchantid,
-            receiver_type='merchant'
-        ).aggregate(total=Sum('amount'))['total'] or 0
-        top_merchants.append({
-            'name': merchant.username,
-            'revenue': float(revenue),
-            'orders': Order.objects.filter(merchant_id=merchant.merchantid).count()
-        })
-    
     return Response({
-        'daily_revenue': daily_revenue,
-        'order_status': list(order_status),
-        'user_growth': user_growth,
-        'top_merchants': top_merchants,
+        'daily_revenue': dashboard_stats.daily_revenue(30, end_date),
+        'order_status': dashboard_stats.order_status_counts(),
+        'user_growth': dashboard_stats.user_growth(7, end_date),
+        'top_merchants': dashboard_stats.top_merchants(10),
         'timeframe': {
             'start_date': start_date.isoformat(),
             'end_date': end_date.isoformat()
@@ -2789,10 +2856,9 @@ def create_entry(request):
             entry_type = data.get('type')
             
             if entry_type == 'user':
-                from .utils import generate_user_paycode
-                user = User.objects.create(
+                user = paycodes.create_account(
+                    'user',
                     nationalid=data.get('national_id'),
-                    paycode=generate_user_paycode(),
                     accounttype='normal',
                     email=data.get('email'),
                     username=data.get('username'),
@@ -2808,10 +2874,9 @@ def create_entry(request):
                 })
                 
             elif entry_type == 'merchant':
-                from .utils import generate_merchant_paycode
-                merchant = Merchant.objects.create(
+                merchant = paycodes.create_account(
+                    'merchant',
                     nationalid=data.get('national_id'),
-                    merchantpaycode=generate_merchant_paycode(),
                     businesstype=data.get('business_type'),
                     accounttype='merchant',
                     email=data.get('email'),
@@ -2828,16 +2893,15 @@ def create_entry(request):
                 })
                 
             elif entry_type == 'product':
-                import random
-                from datetime import datetime
                 product = Product.objects.create(
-                    productid=int(datetime.now().timestamp() * 1000) + random.randint(1000, 9999),
+                    productid=generate_id(),
                     productname=data.get('product_name'),
                     price=data.get('price'),
                     amountinstock=data.get('amount_in_stock'),
                     category=data.get('category'),
                     merchantid=data.get('merchant_id')
                 )
+                menu_cache.invalidate(product.merchantid)
                 return JsonResponse({
                     "success": True,
                     "message": "Product created successfully",
@@ -2849,6 +2913,7 @@ def create_entry(request):
                     fieldname=data.get('fieldname'),
                     merchantid=data.get('merchantid')
                 )
+                menu_cache.invalidate(service.merchantid)
                 return JsonResponse({
                     "success": True,
                     "message": "Service created successfully",
@@ -2874,22 +2939,28 @@ def delete_entry(request, entry_type, entry_id):
             if entry_type == 'user':
                 user = get_object_or_404(User, userid=entry_id)
                 user.delete()
+                paycodes.invalidate(user.paycode)
                 
             elif entry_type == 'merchant':
                 merchant = get_object_or_404(Merchant, merchantid=entry_id)
                 merchant.delete()
+                paycodes.invalidate(merchant.merchantpaycode)
                 
             elif entry_type == 'product':
                 product = get_object_or_404(Product, productid=entry_id)
                 product.delete()
+                menu_cache.invalidate(product.merchantid)
                 
             elif entry_type == 'service':
                 service = get_object_or_404(ExtraMenu, id=entry_id)
                 service.delete()
+                menu_cache.invalidate(service.merchantid)
                 
             elif entry_type == 'order':
                 order = get_object_or_404(Order, orderid=entry_id)
-                order.delete()
+                with transaction.atomic():
+                    order.delete()
+                    rollups.record_order_deleted(order)
                 
             else:
                 return JsonResponse({
@@ -2918,55 +2989,37 @@ logger = logging.getLogger(__name__)
 def admin_dashboard(request):
     """Single comprehensive admin dashboard with all data"""
     try:
-        # Get all data from database
-        users = User.objects.all()
-        merchants = Merchant.objects.all()
-        orders = Order.objects.all()
-        services = ExtraMenu.objects.all()
-        products = Product.objects.all()
-        transactions = Transaction.objects.all()
-        menus = Menu.objects.all()
-        
-        # Get counts for analytics
-        total_users = users.count()
-        total_merchants = merchants.count()
-        total_orders = orders.count()
-        total_products = products.count()
-        total_transactions = transactions.count()
-        total_services = services.count()
-        
-        # Today's stats
-        today = datetime.now().date()
-        orders_today = Order.objects.filter(created_at__date=today).count()
-        
-        # Revenue calculations
-        total_revenue = Transaction.objects.aggregate(total=Sum('amount'))['total'] or 0
-        revenue_today = Transaction.objects.filter(date__date=today).aggregate(total=Sum('amount'))['total'] or 0
-        
-        context = {
-            # All data for tables
-            'users': users,
-            'merchants': merchants,
-            'orders': orders,
-            'services': services,
-            'products': products,
-            'transactions': transactions,
-            'menus': menus,
+        # Figures and first rows come from a snapshot refreshed every
+        # DASHBOARD_SNAPSHOT_INTERVAL seconds; tables page through admin/tables/<entity>/
+        snapshot = dashboard_snapshot.get()
+        
+        context = dict(snapshot)
+        context.update({
+            # First rows of each table
+            'users': snapshot['recent_users'],
+            'merchants': snapshot['recent_merchants'],
+            'orders': snapshot['recent_orders'],
+            'products': snapshot['recent_products'],
+            'transactions': snapshot['recent_transactions'],
             
             # Analytics counts
-            'users_count': total_users,
-            'merchants_count': total_merchants,
-            'orders_count': total_orders,
-            'products_count': total_products,
-            'transactions_count': total_transactions,
-            'services_count': total_services,
-            
-            # Additional stats
-            'orders_today': orders_today,
-            'total_revenue': total_revenue,
-            'revenue_today': revenue_today,
-            'today': today,
-        }
+            'users_count': snapshot['total_users'],
+            'merchants_count': snapshot['total_merchants'],
+            'orders_count': snapshot['total_orders'],
+            'products_count': snapshot['total_products'],
+            'transactions_count': snapshot['total_transactions'],
+            'services_count': snapshot['total_services'],
+            
+            # For charts
+            'order_status_data': json.dumps({
+                'labels': [row['status'] for row in snapshot['order_status_counts']],
+                'data': [row['count'] for row in snapshot['order_status_counts']],
+            }),
+            'user_distribution_data': json.dumps({
+                'labels': ['Users', 'Merchants'],
+                'data': [snapshot['total_users'], snapshot['total_merchants']],
+            }),
+        })
         
         return render(request, 'api/admin_dashboard.html', context)
         
@@ -2999,11 +3052,9 @@ def create_product_admin(request):
     if request.method == "POST":
         try:
             data = request.POST
-            import random
-            from datetime import datetime
             
             # Generate product ID
-            product_id = int(datetime.now().timestamp() * 1000) + random.randint(1000, 9999)
+            product_id = generate_id()
             
             product = Product.objects.create(
                 productid=product_id,
@@ -3013,6 +3064,7 @@ def create_product_admin(request):
                 category=data.get('category', ''),
                 merchantid=int(data.get('merchant_id', 0))
             )
+            menu_cache.invalidate(product.merchantid)
             
             return JsonResponse({
                 "success": True,
@@ -3042,6 +3094,7 @@ def create_service_admin(request):
                 fieldname=data.get('fieldname', ''),
                 merchantid=int(data.get('merchantid', 0))
             )
+            menu_cache.invalidate(service.merchantid)
             
             return JsonResponse({
                 "success": True,
@@ -3060,12 +3113,11 @@ def create_service_admin(request):
         "message": "Method not allowed"
     }, status=405)
 # Add these imports at the TOP of your views.py if not already there:
-from django.db.models import Q, Sum, Count
+from django.db.models import Q
 from decimal import Decimal
 import os
 from datetime import datetime
 from io import BytesIO
-from reportlab.lib.pagesizes import A4
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
@@ -3078,7 +3130,9 @@ from django.conf import settings
 @api_view(['GET'])
 def generate_merchant_report(request):
     """
-    Generate comprehensive PDF report for a merchant
+    Generate comprehensive PDF report for a merchant.
+    Totals are computed in the database and the PDF is streamed from a
+    spooled temporary file, so a yearly report does not load every row.
     """
     try:
         # Get parameters
@@ -3103,511 +3157,26 @@ def generate_merchant_report(request):
             print(f"❌ Invalid merchant ID format: {merchant_id}")
             return Response({"error": "Invalid merchant ID format"}, status=400)
         
-        # Create response with PDF
-        response = HttpResponse(content_type='application/pdf')
-        filename = f"merchant_report_{merchant.username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
-        response['Content-Disposition'] = f'attachment; filename="{filename}"'
-        
-        # Create PDF buffer
-        buffer = BytesIO()
+        try:
+            year, month, day = (int(value) if value else None for value in (year, month, day))
+        except ValueError:
+            return Response({"error": "year, month and day must be numbers"}, status=400)
         
         try:
-            # Create the PDF document
-            doc = SimpleDocTemplate(buffer, pagesize=A4, 
-                                   rightMargin=72, leftMargin=72,
-                                   topMargin=72, bottomMargin=72)
-            
-            # Container for the 'Flowable' objects
-            elements = []
-            
-            # Get styles
-            styles = getSampleStyleSheet()
-            
-            # Custom styles
-            title_style = ParagraphStyle(
-                'CustomTitle',
-                parent=styles['Heading1'],
-                fontSize=24,
-                spaceAfter=30,
-                alignment=TA_CENTER,
-                textColor=colors.HexColor('#FF8A00')
-            )
-            
-            normal_style = ParagraphStyle(
-                'Normal',
-                parent=styles['Normal'],
-                fontSize=10
-            )
-            
-            # Add title
-            elements.append(Paragraph("MERCHANT BUSINESS REPORT", title_style))
-            
-            # Add merchant info
-            merchant_info = f"""
-            <b>Merchant:</b> {merchant.username}<br/>
-            <b>Email:</b> {merchant.email}<br/>
-            <b>Phone:</b> {merchant.phonenumber or 'N/A'}<br/>
-            <b>Business Type:</b> {merchant.businesstype or 'N/A'}<br/>
-            <b>Merchant ID:</b> {merchant.merchantid}<br/>
-            <b>Report Date:</b> {datetime.now().strftime('%d %B %Y %H:%M:%S')}<br/>
-            """
-            
-            if year:
-                merchant_info += f"<b>Year:</b> {year}<br/>"
-            if month:
-                merchant_info += f"<b>Month:</b> {month}<br/>"
-            if day:
-                merchant_info += f"<b>Day:</b> {day}<br/>"
-            
-            elements.append(Paragraph(merchant_info, normal_style))
-            elements.append(Spacer(1, 20))
-            
-            # ================ SECTION 1: FINANCIAL SUMMARY ================
-            section_style = ParagraphStyle(
-                'Section',
-                parent=styles['Heading3'],
-                fontSize=12,
-                spaceAfter=10,
-                spaceBefore=20,
-                textColor=colors.HexColor('#2C3E50')
-            )
-            
-            elements.append(Paragraph("1. FINANCIAL SUMMARY", section_style))
-            
-            # Get date range for filtering
-            date_filter = Q()
-            if year:
-                date_filter &= Q(date__year=int(year))
-            if month:
-                date_filter &= Q(date__month=int(month))
-            if day:
-                date_filter &= Q(date__day=int(day))
-            
-            print(f"📅 Applying date filter: {date_filter}")
-            
-            # Get all transactions for this merchant
-            all_transactions = Transaction.objects.filter(
-                (Q(senderid=merchant.merchantid) & Q(sender_type='merchant')) |
-                (Q(receiverid=merchant.merchantid) & Q(receiver_type='merchant'))
-            )
-            
-            if date_filter:
-                all_transactions = all_transactions.filter(date_filter)
-            
-            all_transactions = all_transactions.order_by('date')
-            
-            print(f"💰 Found {all_transactions.count()} transactions")
-            
-            # Calculate totals
-            total_income = Decimal('0.00')
-            total_expenses = Decimal('0.00')
-            total_received = Decimal('0.00')
-            total_sent = Decimal('0.00')
-            
-            for trans in all_transactions:
-                if trans.receiverid == merchant.merchantid and trans.receiver_type == 'merchant':
-                    # Income (money received)
-                    if trans.amount:
-                        total_income += Decimal(str(trans.amount))
-                        total_received += Decimal(str(trans.amount))
-                elif trans.senderid == merchant.merchantid and trans.sender_type == 'merchant':
-                    # Expense (money sent)
-                    if trans.amount:
-                        total_expenses += Decimal(str(trans.amount))
-                        total_sent += Decimal(str(trans.amount))
-                    if trans.charge:
-                        total_expenses += Decimal(str(trans.charge))
-            
-            current_balance = merchant.balance if merchant.balance else Decimal('0.00')
-            net_profit = total_income - total_expenses
-            
-            # Financial summary table
-            financial_data = [
-                ['Description', 'Amount (RWF)'],
-                ['Current Balance', f"{float(current_balance):,.2f}"],
-                ['Total Income', f"{float(total_income):,.2f}"],
-                ['Total Expenses', f"{float(total_expenses):,.2f}"],
-                ['Net Profit/Loss', f"{float(net_profit):,.2f}"],
-                ['Total Received', f"{float(total_received):,.2f}"],
-                ['Total Sent', f"{float(total_sent):,.2f}"],
-            ]
-            
-            financial_table = Table(financial_data, colWidths=[3*inch, 2*inch])
-            financial_table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#FF8A00')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 10),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-                ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                ('ALIGN', (0, 1), (0, -1), 'LEFT'),
-                ('ALIGN', (1, 1), (1, -1), 'RIGHT'),
-                ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                ('FONTSIZE', (0, 1), (-1, -1), 10),
-                ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ]))
-            
-            elements.append(financial_table)
-            elements.append(Spacer(1, 20))
-            
-            # ================ SECTION 2: PRODUCTS SALES SUMMARY ================
-            elements.append(Paragraph("2. PRODUCTS SALES SUMMARY", section_style))
-            
-            # Get sales data
-            sales = Sales.objects.filter(merchantid=merchant.merchantid)
-            
-            # Apply date filter to sales
-            if date_filter:
-                # Sales model uses 'date' field
-                sales_date_filter = Q()
-                if year:
-                    sales_date_filter &= Q(date__year=int(year))
-                if month:
-                    sales_date_filter &= Q(date__month=int(month))
-                if day:
-                    sales_date_filter &= Q(date__day=int(day))
-                sales = sales.filter(sales_date_filter)
-            
-            print(f"📈 Found {sales.count()} sales records")
-            
-            if sales.exists():
-                # Create a dictionary to aggregate product sales
-                product_sales = {}
-                total_quantity_sold = 0
-                total_sales_amount = Decimal('0.00')
-                
-                for sale in sales:
-                    product_name = sale.productname
-                    quantity = sale.quantity if sale.quantity else 0
-                    amount = Decimal(str(sale.amount)) if sale.amount else Decimal('0.00')
-                    
-                    if product_name in product_sales:
-                        product_sales[product_name]['quantity'] += quantity
-                        product_sales[product_name]['amount'] += amount
-                    else:
-                        product_sales[product_name] = {
-                            'quantity': quantity,
-                            'amount': amount,
-                            'unit_price': amount / quantity if quantity > 0 else Decimal('0.00')
-                        }
-                    
-                    total_quantity_sold += quantity
-                    total_sales_amount += amount
-                
-                # Sort products by amount (descending)
-                sorted_products = sorted(
-                    product_sales.items(),
-                    key=lambda x: x[1]['amount'],
-                    reverse=True
-                )
-                
-                # Create sales summary table with fancy styling
-                sales_data = [
-                    ['Product Name', 'Quantity Sold', 'Total Amount (RWF)', 'Avg. Price']
-                ]
-                
-                for product_name, data in sorted_products:
-                    sales_data.append([
-                        product_name[:25] if product_name else 'N/A',
-                        str(data['quantity']),
-                        f"{float(data['amount']):,.2f}",
-                        f"{float(data['unit_price']):,.2f}"
-                    ])
-                
-                # Add totals row
-                if len(sorted_products) > 0:
-                    sales_data.append([
-                        '<b>TOTAL</b>',
-                        f"<b>{total_quantity_sold}</b>",
-                        f"<b>{float(total_sales_amount):,.2f}</b>",
-                        ""
-                    ])
-                
-                sales_table = Table(sales_data, colWidths=[2.5*inch, 1*inch, 1.5*inch, 1*inch])
-                
-                # Create fancy table style with alternating row colors
-                sales_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#8E44AD')),  # Purple header
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                
-                # Add alternating row colors
-                for i in range(1, len(sales_data)):
-                    if i == len(sales_data) - 1:  # Last row (totals)
-                        sales_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, i), (-1, i), colors.HexColor('#F39C12')),  # Orange for totals
-                            ('TEXTCOLOR', (0, i), (-1, i), colors.whitesmoke),
-                            ('FONTNAME', (0, i), (-1, i), 'Helvetica-Bold'),
-                        ]))
-                    elif i % 2 == 0:
-                        sales_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, i), (-1, i), colors.HexColor('#F8F9FA')),  # Light gray
-                        ]))
-                    else:
-                        sales_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, i), (-1, i), colors.white),
-                        ]))
-                    
-                    # Set alignment for data rows
-                    sales_table.setStyle(TableStyle([
-                        ('ALIGN', (1, i), (1, i), 'CENTER'),  # Quantity center
-                        ('ALIGN', (2, i), (2, i), 'RIGHT'),   # Amount right
-                        ('ALIGN', (3, i), (3, i), 'RIGHT'),   # Price right
-                        ('FONTSIZE', (0, i), (-1, i), 9),
-                        ('PADDING', (0, i), (-1, i), (6, 4)),
-                    ]))
-                
-                elements.append(sales_table)
-                
-                # Add sales summary statistics
-                elements.append(Spacer(1, 10))
-                stats_text = f"""
-                <b>Sales Statistics:</b><br/>
-                • Total Products Sold: {total_quantity_sold}<br/>
-                • Total Sales Value: {float(total_sales_amount):,.2f} RWF<br/>
-                • Average Sale Value: {float(total_sales_amount/total_quantity_sold if total_quantity_sold > 0 else 0):,.2f} RWF per unit<br/>
-                • Number of Products Sold: {len(sorted_products)}<br/>
-                """
-                elements.append(Paragraph(stats_text, normal_style))
-                
-            else:
-                elements.append(Paragraph("No sales data found for the selected period.", normal_style))
-            
-            elements.append(Spacer(1, 20))
-            
-            # ================ SECTION 3: ORDERS SUMMARY ================
-            elements.append(Paragraph("3. ORDERS SUMMARY", section_style))
-            
-            # Get orders for this merchant
-            orders = Order.objects.filter(merchant_id=merchant.merchantid)
-            
-            if date_filter:
-                # Handle different date field names
-                try:
-                    orders = orders.filter(created_at__year=int(year))
-                    if month:
-                        orders = orders.filter(created_at__month=int(month))
-                    if day:
-                        orders = orders.filter(created_at__day=int(day))
-                except:
-                    pass  # If date filtering fails, show all orders
-            
-            orders = orders.order_by('-created_at')
-            
-            print(f"📦 Found {orders.count()} orders")
-            
-            if orders.exists():
-                order_summary = f"""
-                <b>Total Orders:</b> {orders.count()}<br/>
-                <b>Pending Orders:</b> {orders.filter(status='pending').count()}<br/>
-                <b>Completed Orders:</b> {orders.filter(status='delivered').count()}<br/>
-                <b>Cancelled Orders:</b> {orders.filter(status='cancelled').count()}<br/>
-                """
-                
-                # Calculate total order value
-                total_order_value = Decimal('0.00')
-                paid_orders_value = Decimal('0.00')
-                
-                for order in orders:
-                    if order.total_amount:
-                        total_order_value += Decimal(str(order.total_amount))
-                        if order.is_paid:
-                            paid_orders_value += Decimal(str(order.total_amount))
-                
-                order_summary += f"<b>Total Order Value:</b> {float(total_order_value):,.2f} RWF<br/>"
-                order_summary += f"<b>Paid Orders Value:</b> {float(paid_orders_value):,.2f} RWF<br/>"
-                order_summary += f"<b>Unpaid Orders Value:</b> {float(total_order_value - paid_orders_value):,.2f} RWF<br/>"
-                
-                elements.append(Paragraph(order_summary, normal_style))
-                
-                # Show recent orders in a table
-                if orders.count() <= 20:  # Only show if not too many
-                    order_data = [['Order #', 'Customer', 'Amount', 'Status', 'Paid']]
-                    
-                    for order in orders[:10]:  # Show first 10 orders
-                        order_data.append([
-                            order.order_number[:8] if order.order_number else 'N/A',
-                            order.customer_name[:15] if order.customer_name else 'N/A',
-                            f"{float(order.total_amount):,.2f}" if order.total_amount else '0.00',
-                            order.status or 'N/A',
-                            '✓' if order.is_paid else '✗'
-                        ])
-                    
-                    order_table = Table(order_data, colWidths=[1*inch, 1.5*inch, 1*inch, 1*inch, 0.5*inch])
-                    order_table.setStyle(TableStyle([
-                        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#27AE60')),
-                        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                        ('FONTSIZE', (0, 0), (-1, 0), 9),
-                        ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-                        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                        ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                        ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-                        ('ALIGN', (4, 1), (4, -1), 'CENTER'),
-                        ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                        ('FONTSIZE', (0, 1), (-1, -1), 8),
-                        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                    ]))
-                    
-                    elements.append(order_table)
-            else:
-                elements.append(Paragraph("No orders found for the selected period.", normal_style))
-            
-            elements.append(Spacer(1, 20))
-            
-            # ================ SECTION 4: PRODUCTS IN MENU ================
-            elements.append(Paragraph("4. PRODUCTS IN MENU", section_style))
-            
-            # Get products for this merchant
-            products = Product.objects.filter(merchantid=merchant.merchantid)
-            
-            if products.exists():
-                product_data = [['Product', 'Price (RWF)', 'In Stock', 'Category']]
-                
-                for product in products:
-                    product_data.append([
-                        product.productname[:25] if product.productname else 'N/A',
-                        f"{float(product.price):,.2f}" if product.price else '0.00',
-                        str(product.amountinstock) if product.amountinstock else '0',
-                        product.category[:15] if product.category else 'N/A'
-                    ])
-                
-                product_table = Table(product_data, colWidths=[2*inch, 1*inch, 0.8*inch, 1.2*inch])
-                product_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498DB')),
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 9),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 6),
-                    ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                    ('TEXTCOLOR', (0, 1), (-1, -1), colors.black),
-                    ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
-                    ('ALIGN', (2, 1), (2, -1), 'CENTER'),
-                    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-                    ('FONTSIZE', (0, 1), (-1, -1), 8),
-                    ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-                ]))
-                
-                elements.append(product_table)
-                
-                # Add product statistics
-                elements.append(Spacer(1, 10))
-                total_products = products.count()
-                total_stock = sum(p.amountinstock for p in products if p.amountinstock)
-                avg_price = sum(float(p.price) for p in products if p.price) / total_products if total_products > 0 else 0
-                
-                product_stats = f"""
-                <b>Product Statistics:</b><br/>
-                • Total Products in Menu: {total_products}<br/>
-                • Total Items in Stock: {total_stock}<br/>
-                • Average Product Price: {avg_price:,.2f} RWF<br/>
-                """
-                elements.append(Paragraph(product_stats, normal_style))
-                
-            else:
-                elements.append(Paragraph("No products found in menu.", normal_style))
-            
-            elements.append(Spacer(1, 20))
-            
-            # ================ SECTION 5: TOP PERFORMING PRODUCTS ================
-            if sales.exists() and len(sorted_products) > 0:
-                elements.append(Paragraph("5. TOP PERFORMING PRODUCTS", section_style))
-                
-                # Get top 5 products
-                top_products = sorted_products[:5]
-                
-                top_data = [['Rank', 'Product', 'Sales (RWF)', 'Quantity']]
-                
-                for idx, (product_name, data) in enumerate(top_products, 1):
-                    top_data.append([
-                        str(idx),
-                        product_name[:20] if product_name else 'N/A',
-                        f"{float(data['amount']):,.2f}",
-                        str(data['quantity'])
-                    ])
-                
-                top_table = Table(top_data, colWidths=[0.5*inch, 2.5*inch, 1.5*inch, 1*inch])
-                top_table.setStyle(TableStyle([
-                    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#E74C3C')),  # Red header
-                    ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-                    ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                    ('FONTSIZE', (0, 0), (-1, 0), 10),
-                    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-                    ('GRID', (0, 0), (-1, -1), 1, colors.black),
-                ]))
-                
-                # Add gold, silver, bronze colors for top 3
-                for i in range(1, len(top_data)):
-                    if i == 1:
-                        top_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, i), (-1, i), colors.HexColor('#FFD700')),  # Gold
-                        ]))
-                    elif i == 2:
-                        top_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, i), (-1, i), colors.HexColor('#C0C0C0')),  # Silver
-                        ]))
-                    elif i == 3:
-                        top_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, i), (-1, i), colors.HexColor('#CD7F32')),  # Bronze
-                        ]))
-                    else:
-                        top_table.setStyle(TableStyle([
-                            ('BACKGROUND', (0, i), (-1, i), colors.white),
-                        ]))
-                    
-                    # Set alignment
-                    top_table.setStyle(TableStyle([
-                        ('ALIGN', (0, i), (0, i), 'CENTER'),
-                        ('ALIGN', (2, i), (2, i), 'RIGHT'),
-                        ('ALIGN', (3, i), (3, i), 'CENTER'),
-                        ('FONTSIZE', (0, i), (-1, i), 9),
-                        ('PADDING', (0, i), (-1, i), (6, 4)),
-                    ]))
-                
-                elements.append(top_table)
-                elements.append(Spacer(1, 20))
-            
-            # ================ FOOTER ================
-            footer_text = f"""
-            <b>Report Generated:</b> {datetime.now().strftime('%d %B %Y %H:%M:%S')}<br/>
-            <b>For Internal Use Only</b><br/>
-            <i>This report provides a summary of {merchant.username}'s business performance.</i>
-            """
-            elements.append(Paragraph(footer_text, ParagraphStyle(
-                'Footer',
-                parent=styles['Normal'],
-                fontSize=8,
-                alignment=TA_CENTER,
-                textColor=colors.grey
-            )))
-            
-            # Build PDF
-            doc.build(elements)
-            
-            # Get PDF value from buffer
-            pdf = buffer.getvalue()
-            buffer.close()
-            
-            response.write(pdf)
-            print(f"✅ Report generated successfully: {filename}")
-            return response
-            
+            pdf = merchant_report.render(merchant, year, month, day)
+        except ValueError as e:
+            # e.g. day 31 of a 30 day month
+            return Response({"error": f"Invalid report period: {str(e)}"}, status=400)
         except Exception as e:
-            buffer.close()
             print(f"🔥 Error building PDF: {str(e)}")
             import traceback
             traceback.print_exc()
             return Response({"error": f"Error building PDF: {str(e)}"}, status=500)
+        
+        filename = f"merchant_report_{merchant.username}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"
+        print(f"✅ Report generated successfully: {filename}")
+        # FileResponse sends the spool in blocks and closes it when done
+        return FileResponse(pdf, as_attachment=True, filename=filename, content_type='application/pdf')
             
     except Exception as e:
         print(f"🔥 Error in generate_merchant_report: {str(e)}")
@@ -3620,7 +3189,7 @@ from decimal import Decimal
 import os
 from datetime import datetime
 from io import BytesIO
-from reportlab.lib.pagesizes import A4, letter, inch
+from reportlab.lib.pagesizes import letter, inch
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, HRFlowable
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
 from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT, TA_JUSTIFY
@@ -3,6 +3,9 @@ ASGI config for vubapay project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
 
+Serve through an ASGI server (e.g. ``uvicorn vubapay.asgi:application``)
+so the merchant order stream (SSE) can hold connections open cheaply.
+
 For more information on this file, see
 https://docs.djangoproject.com/en/5.2/howto/deployment/asgi/
 """
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
 from pathlib import Path
+from datetime import timedelta
 import os
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -90,6 +91,38 @@ DATABASES = {
     }
 }
 
+# Tests build the unmanaged api tables from the models, see api/test_runner.py
+TEST_RUNNER = 'api.test_runner.UnmanagedModelTestRunner'
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# Local memory is per process; point this at Redis/Memcached when running several workers
+# so menu invalidations reach every process.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'vubapay',
+    }
+}
+
+# Pub/sub used to push order changes to merchant-order-stream/ subscribers.
+# The in-process broker only reaches streams served by the same process.
+ORDER_EVENTS_BROKER = 'api.order_events.InProcessBroker'
+
+# How long responses to POSTs sent with an Idempotency-Key header are replayed
+IDEMPOTENCY_KEY_TTL = timedelta(hours=24)
+# A key still "in progress" after this long belonged to a request that died; it can be claimed again
+IDEMPOTENCY_CLAIM_LEASE = timedelta(minutes=2)
+
+# archive_notifications moves notifications older than this out of the live table,
+# into the notification_archive table or gzipped JSONL files under this directory
+NOTIFICATION_RETENTION_DAYS = 90
+NOTIFICATION_ARCHIVE_DIR = os.path.join(BASE_DIR, 'notification_archive')
+
+# Seconds the cached admin dashboard snapshot is served before it is rebuilt
+DASHBOARD_SNAPSHOT_INTERVAL = 60
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators